@@ -1,10 +1,15 @@
 from __future__ import annotations
 
 import collections
+import contextlib
 import functools
+import json
 import logging
 import random
 import secrets
+import threading
+import time
+import tracemalloc
 import warnings
 from argparse import Namespace
 from collections import Counter, deque, defaultdict
@@ -102,6 +107,13 @@ class MultiWorld():
     per_slot_randoms: Utils.DeprecateDict[int, random.Random]
     """Deprecated. Please use `self.random` instead."""
 
+    _spheres: Optional[Dict[bool, Spheres]]
+    """Logical spheres kept by sendable, None while placements can still change."""
+    _spheres_lock: threading.Lock
+
+    profile: Optional[GenerationProfile]
+    """Collects the measurements for --profile_report, None when no report is being made."""
+
     class AttributeProxy():
         def __init__(self, rule):
             self.rule = rule
@@ -168,6 +180,9 @@ class MultiWorld():
         self.indirect_connections = {}
         self.start_inventory_from_pool: Dict[int, Options.StartInventoryPool] = {}
         self.plando_item_blocks = {}
+        self._spheres = None
+        self._spheres_lock = threading.Lock()
+        self.profile = None
 
         for player in range(1, players + 1):
             def set_player_attr(attr: str, val) -> None:
@@ -180,6 +195,13 @@ class MultiWorld():
                                                     "world's random object instead (usually self.random)", True)
         self.plando_options = PlandoOptions.none
 
+    def measure(self, stage: str, player: Optional[int] = None,
+                game: Optional[str] = None) -> contextlib.AbstractContextManager[None]:
+        """Measure a generation step for the profile report, if one is being made."""
+        if self.profile:
+            return self.profile.measure(stage, player, game or (self.game[player] if player else None))
+        return contextlib.nullcontext()
+
     def get_all_ids(self) -> Tuple[int, ...]:
         return self.player_ids + tuple(self.groups)
 
@@ -581,6 +603,23 @@ class MultiWorld():
 
         return False
 
+    def cache_spheres(self) -> None:
+        """
+        Keeps the logical spheres once they are computed, so that get_spheres, get_sendable_spheres,
+        fulfills_accessibility and the spoiler share them. Only to be called once placements are final.
+        """
+        self._spheres = {}
+
+    def get_logical_spheres(self, sendable: bool = False) -> Spheres:
+        """Returns the logical spheres, computed anew for every call unless cache_spheres was called."""
+        if self._spheres is None:
+            return Spheres(self, sendable)
+        with self._spheres_lock:
+            spheres = self._spheres.get(sendable)
+            if spheres is None:
+                spheres = self._spheres[sendable] = Spheres(self, sendable)
+            return spheres
+
     def get_spheres(self) -> Iterator[Set[Location]]:
         """
         yields a set of locations for each logical sphere
@@ -589,24 +628,19 @@ class MultiWorld():
         locations is followed by an empty set, and then a set of all of the
         unreachable locations.
         """
-        state = CollectionState(self)
-        locations = set(self.get_filled_locations())
-
-        while locations:
-            sphere: Set[Location] = set()
-
-            for location in locations:
-                if location.can_reach(state):
-                    sphere.add(location)
-            yield sphere
-            if not sphere:
-                if locations:
-                    yield locations  # unreachable locations
+        spheres = self.get_logical_spheres()
+        unreachable: Set[Location] = {location for location in spheres.unreachable if location.item}
+        for index, sphere in enumerate(spheres.spheres):
+            filled_sphere = {location for location in sphere if location.item}
+            if not filled_sphere:
+                # only unfilled locations, so nothing further can be reached
+                unreachable.update(location for sphere in spheres.spheres[index + 1:]
+                                   for location in sphere if location.item)
                 break
-
-            for location in sphere:
-                state.collect(location.item, True, location)
-            locations -= sphere
+            yield filled_sphere
+        if unreachable:
+            yield set()
+            yield unreachable
 
     def get_sendable_spheres(self) -> Iterator[Set[Location]]:
         """
@@ -615,46 +649,15 @@ class MultiWorld():
         If there are unreachable locations, the last sphere of reachable locations is followed by an empty set,
         and then a set of all of the unreachable locations.
         """
-        state = CollectionState(self)
-        locations: Set[Location] = set()
-        events: Set[Location] = set()
-        for location in self.get_filled_locations():
-            if type(location.item.code) is int and type(location.address) is int:
-                locations.add(location)
-            else:
-                events.add(location)
-
-        while locations:
-            sphere: Set[Location] = set()
-
-            # cull events out
-            done_events: Set[Union[Location, None]] = {None}
-            while done_events:
-                done_events = set()
-                for event in events:
-                    if event.can_reach(state):
-                        state.collect(event.item, True, event)
-                        done_events.add(event)
-                events -= done_events
-
-            for location in locations:
-                if location.can_reach(state):
-                    sphere.add(location)
-
-            yield sphere
-            if not sphere:
-                if locations:
-                    yield locations  # unreachable locations
-                break
-
-            for location in sphere:
-                state.collect(location.item, True, location)
-            locations -= sphere
+        spheres = self.get_logical_spheres(sendable=True)
+        for sphere in spheres.spheres:
+            yield set(sphere)
+        if spheres.unreachable:
+            yield set()
+            yield set(spheres.unreachable)
 
     def fulfills_accessibility(self, state: Optional[CollectionState] = None):
         """Check if accessibility rules are fulfilled with current or supplied state."""
-        if not state:
-            state = CollectionState(self)
         players: Dict[str, Set[int]] = {
             "minimal": set(),
             "items": set(),
@@ -682,6 +685,31 @@ class MultiWorld():
                 return False  # still locations required to be collected
             return True
 
+        def inaccessible() -> bool:
+            if __debug__:
+                from Fill import FillError
+                raise FillError(
+                    f"Could not access required locations for accessibility check. Missing: {locations}",
+                    multiworld=self,
+                )
+            # ran out of places and did not finish yet, quit
+            logging.warning(f"Could not access required locations for accessibility check."
+                            f" Missing: {locations}")
+            return False
+
+        if not state and self._spheres is not None:
+            spheres = self.get_logical_spheres()
+            locations = [location for location in spheres.unreachable if location_relevant(location)]
+            if any(location_relevant(location) for sphere in spheres.spheres for location in sphere):
+                beatable_fulfilled = self.has_beaten_game(spheres.states[-1])
+                if all_done():
+                    return True
+            if locations:
+                return inaccessible()
+            return False
+
+        if not state:
+            state = CollectionState(self)
         locations = [location for location in self.get_locations() if location_relevant(location)]
 
         while locations:
@@ -691,16 +719,7 @@ class MultiWorld():
                     sphere.append(locations.pop(n))
 
             if not sphere:
-                if __debug__:
-                    from Fill import FillError
-                    raise FillError(
-                        f"Could not access required locations for accessibility check. Missing: {locations}",
-                        multiworld=self,
-                    )
-                # ran out of places and did not finish yet, quit
-                logging.warning(f"Could not access required locations for accessibility check."
-                                f" Missing: {locations}")
-                return False
+                return inaccessible()
 
             for location in sphere:
                 if location.item:
@@ -715,32 +734,188 @@ class MultiWorld():
         return False
 
 
+class Spheres:
+    """
+    The logical spheres of a multiworld, computed in a single pass from a new CollectionState.
+
+    Each sphere holds the locations that become reachable once the items of all previous spheres are collected.
+    Locations are kept grouped by their region, so the locations of regions that are still unreachable are not tested.
+    When sendable, only filled locations with an address and an item code make up the spheres, while the other filled
+    locations are collected as events as soon as they can be reached.
+    """
+    spheres: List[Set[Location]]
+    states: List[CollectionState]
+    """The state each sphere was reached with, followed by the state with all reachable items collected."""
+    unreachable: Set[Location]
+
+    def __init__(self, multiworld: MultiWorld, sendable: bool = False) -> None:
+        state = CollectionState(multiworld)
+        events: Set[Location] = set()
+        pending: Dict[Region, List[Location]] = defaultdict(list)
+        if sendable:
+            for location in multiworld.get_filled_locations():
+                if type(location.item.code) is int and type(location.address) is int:
+                    pending[location.parent_region].append(location)
+                else:
+                    events.add(location)
+        else:
+            for location in multiworld.get_locations():
+                pending[location.parent_region].append(location)
+
+        self.spheres = []
+        self.states = []
+        while pending:
+            # cull events out
+            done_events: Set[Union[Location, None]] = {None}
+            while done_events:
+                done_events = set()
+                for event in events:
+                    if event.can_reach(state):
+                        state.collect(event.item, True, event)
+                        done_events.add(event)
+                events -= done_events
+
+            sphere: Set[Location] = set()
+            for region, locations in pending.items():
+                if region.can_reach(state):
+                    sphere.update(location for location in locations if location.can_reach(state))
+            if not sphere:
+                break
+
+            self.spheres.append(sphere)
+            self.states.append(state.copy())
+            for location in sphere:
+                if location.item:
+                    state.collect(location.item, True, location)
+            for region in {location.parent_region for location in sphere}:
+                locations = [location for location in pending[region] if location not in sphere]
+                if locations:
+                    pending[region] = locations
+                else:
+                    del pending[region]
+
+        self.states.append(state)
+        self.unreachable = {location for locations in pending.values() for location in locations}
+
+
 PathValue = Tuple[str, Optional["PathValue"]]
 
 
+class PlayerContainers(Dict[int, Any]):
+    """
+    Per-player containers of a CollectionState, with copy-on-write structural sharing between copied states.
+
+    share() hands the same containers to a copy, after which neither mapping owns them any more. Looking a container
+    up with [] copies it first if it is not owned, as the caller may change it. Reads that never change a container
+    use peek() instead, so copying a state only costs copies of the containers that actually get changed afterward.
+    """
+    __slots__ = ("owned",)
+    owned: Set[int]
+    """Players whose containers are not shared with any other mapping, so they may be changed in place."""
+
+    def __init__(self, containers: Iterable[Tuple[int, Any]] = (), owned: Optional[Set[int]] = None) -> None:
+        super().__init__(containers)
+        self.owned = set(dict.keys(self)) if owned is None else owned
+
+    peek = dict.__getitem__
+    """Returns a player's container without taking ownership of it, so it must not be changed."""
+
+    def __getitem__(self, player: int) -> Any:
+        container = dict.__getitem__(self, player)
+        if player not in self.owned:
+            container = container.copy()
+            dict.__setitem__(self, player, container)
+            self.owned.add(player)
+        return container
+
+    def __setitem__(self, player: int, container: Any) -> None:
+        dict.__setitem__(self, player, container)
+        self.owned.add(player)
+
+    def share(self) -> PlayerContainers:
+        """Returns a copy that shares all containers with self, both copy a container before changing it."""
+        self.owned = set()
+        return PlayerContainers(dict.items(self), set())
+
+    def _own_all(self) -> None:
+        for player in dict.keys(self):
+            if player not in self.owned:
+                self[player]
+
+    def __delitem__(self, player: int) -> None:
+        dict.__delitem__(self, player)
+        self.owned.discard(player)
+
+    def __reduce__(self):
+        return self.__class__, (tuple(dict.items(self)),)
+
+    def get(self, player: int, default: Any = None) -> Any:
+        return self[player] if player in self else default
+
+    def values(self):
+        self._own_all()
+        return dict.values(self)
+
+    def items(self):
+        self._own_all()
+        return dict.items(self)
+
+    def copy(self) -> Dict[int, Any]:
+        self._own_all()
+        return dict.copy(self)
+
+    def pop(self, player: int, *default: Any) -> Any:
+        if player not in self:
+            return dict.pop(self, player, *default)
+        container = self[player]
+        del self[player]
+        return container
+
+    def popitem(self) -> Tuple[int, Any]:
+        self._own_all()
+        return dict.popitem(self)
+
+    def setdefault(self, player: int, default: Any = None) -> Any:
+        if player in self:
+            return self[player]
+        self[player] = default
+        return default
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for player, container in dict(*args, **kwargs).items():
+            self[player] = container
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self.owned.clear()
+
+
 class CollectionState():
-    prog_items: Dict[int, Counter[str]]
+    prog_items: PlayerContainers[int, Counter[str]]
     multiworld: MultiWorld
-    reachable_regions: Dict[int, Set[Region]]
-    blocked_connections: Dict[int, Set[Entrance]]
+    reachable_regions: PlayerContainers[int, Set[Region]]
+    blocked_connections: PlayerContainers[int, Set[Entrance]]
     advancements: Set[Location]
     path: Dict[Union[Region, Entrance], PathValue]
     locations_checked: Set[Location]
     stale: Dict[int, bool]
+    stale_items: PlayerContainers[int, Set[str]]
+    """item names changed per player since the last region update, used to only retest dependent entrances"""
     allow_partial_entrances: bool
     additional_init_functions: List[Callable[[CollectionState, MultiWorld], None]] = []
     additional_copy_functions: List[Callable[[CollectionState, CollectionState], CollectionState]] = []
 
     def __init__(self, parent: MultiWorld, allow_partial_entrances: bool = False):
         assert parent.worlds, "CollectionState created without worlds initialized in parent"
-        self.prog_items = {player: Counter() for player in parent.get_all_ids()}
+        self.prog_items = PlayerContainers((player, Counter()) for player in parent.get_all_ids())
         self.multiworld = parent
-        self.reachable_regions = {player: set() for player in parent.get_all_ids()}
-        self.blocked_connections = {player: set() for player in parent.get_all_ids()}
+        self.reachable_regions = PlayerContainers((player, set()) for player in parent.get_all_ids())
+        self.blocked_connections = PlayerContainers((player, set()) for player in parent.get_all_ids())
         self.advancements = set()
         self.path = {}
         self.locations_checked = set()
         self.stale = {player: True for player in parent.get_all_ids()}
+        self.stale_items = PlayerContainers((player, set()) for player in parent.get_all_ids())
         self.allow_partial_entrances = allow_partial_entrances
         for function in self.additional_init_functions:
             function(self, parent)
@@ -750,16 +925,26 @@ class CollectionState():
 
     def update_reachable_regions(self, player: int):
         self.stale[player] = False
+        stale_items = self.stale_items.peek(player)
+        self.stale_items[player] = set()
         world: AutoWorld.World = self.multiworld.worlds[player]
         reachable_regions = self.reachable_regions[player]
-        queue = deque(self.blocked_connections[player])
+        blocked_connections = self.blocked_connections[player]
         start: Region = world.get_region(world.origin_region_name)
 
         # init on first call - this can't be done on construction since the regions don't exist yet
         if start not in reachable_regions:
             reachable_regions.add(start)
-            self.blocked_connections[player].update(start.exits)
-            queue.extend(start.exits)
+            blocked_connections.update(start.exits)
+            queue = deque(blocked_connections)
+        elif stale_items:
+            # only retest connections that could have been unblocked by the changed items
+            queue = deque(connection for connection in blocked_connections
+                          if connection.item_dependencies is None
+                          or not connection.item_dependencies.isdisjoint(stale_items))
+        else:
+            # went stale without a known cause, so everything has to be retested
+            queue = deque(blocked_connections)
 
         if world.explicit_indirect_conditions:
             self._update_reachable_regions_explicit_indirect_conditions(player, queue)
@@ -813,19 +998,27 @@ class CollectionState():
                     self.path[new_region] = (new_region.name, self.path.get(connection, None))
                     new_connection = True
             # sweep for indirect connections, mostly Entrance.can_reach(unrelated_Region)
-            queue.extend(blocked_connections)
+            # connections with declared item dependencies can't be unblocked by newly reachable regions
+            queue.extend(connection for connection in blocked_connections if connection.item_dependencies is None)
 
     def copy(self) -> CollectionState:
-        ret = CollectionState(self.multiworld)
-        ret.prog_items = {player: counter.copy() for player, counter in self.prog_items.items()}
-        ret.reachable_regions = {player: region_set.copy() for player, region_set in
-                                 self.reachable_regions.items()}
-        ret.blocked_connections = {player: entrance_set.copy() for player, entrance_set in
-                                   self.blocked_connections.items()}
+        # skip __init__, everything it would set up is overwritten here anyway
+        ret = CollectionState.__new__(CollectionState)
+        if self.multiworld.profile:
+            self.multiworld.profile.count_copy()
+        ret.multiworld = self.multiworld
+        # per-player containers are shared with the copy, both states copy them on first use
+        ret.prog_items = self.prog_items.share()
+        ret.reachable_regions = self.reachable_regions.share()
+        ret.blocked_connections = self.blocked_connections.share()
+        ret.stale_items = self.stale_items.share()
         ret.advancements = self.advancements.copy()
         ret.path = self.path.copy()
         ret.locations_checked = self.locations_checked.copy()
+        ret.stale = self.stale.copy()
         ret.allow_partial_entrances = self.allow_partial_entrances
+        for function in self.additional_init_functions:
+            function(ret, self.multiworld)
         for function in self.additional_copy_functions:
             ret = function(self, ret)
         return ret
@@ -956,6 +1149,8 @@ class CollectionState():
         """
         if checked_locations is None:
             checked_locations = self.advancements
+        if self.multiworld.profile:
+            self.multiworld.profile.count_sweep()
 
         # Since the sweep loop usually performs many iterations, the locations are filtered in advance.
         # A list of tuples is used, instead of a dictionary, because it is faster to iterate.
@@ -990,14 +1185,14 @@ class CollectionState():
 
     # item name related
     def has(self, item: str, player: int, count: int = 1) -> bool:
-        return self.prog_items[player][item] >= count
+        return self.prog_items.peek(player)[item] >= count
 
     # for loops are specifically used in all/any/count methods, instead of all()/any()/sum(), to avoid the overhead of
     # creating and iterating generator instances. In `return all(player_prog_items[item] for item in items)`, the
     # argument to all() would be a new generator instance, for example.
     def has_all(self, items: Iterable[str], player: int) -> bool:
         """Returns True if each item name of items is in state at least once."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item in items:
             if not player_prog_items[item]:
                 return False
@@ -1005,7 +1200,7 @@ class CollectionState():
 
     def has_any(self, items: Iterable[str], player: int) -> bool:
         """Returns True if at least one item name of items is in state at least once."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item in items:
             if player_prog_items[item]:
                 return True
@@ -1013,7 +1208,7 @@ class CollectionState():
 
     def has_all_counts(self, item_counts: Mapping[str, int], player: int) -> bool:
         """Returns True if each item name is in the state at least as many times as specified."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item, count in item_counts.items():
             if player_prog_items[item] < count:
                 return False
@@ -1021,19 +1216,19 @@ class CollectionState():
 
     def has_any_count(self, item_counts: Mapping[str, int], player: int) -> bool:
         """Returns True if at least one item name is in the state at least as many times as specified."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item, count in item_counts.items():
             if player_prog_items[item] >= count:
                 return True
         return False
 
     def count(self, item: str, player: int) -> int:
-        return self.prog_items[player][item]
+        return self.prog_items.peek(player)[item]
 
     def has_from_list(self, items: Iterable[str], player: int, count: int) -> bool:
         """Returns True if the state contains at least `count` items matching any of the item names from a list."""
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item_name in items:
             found += player_prog_items[item_name]
             if found >= count:
@@ -1044,7 +1239,7 @@ class CollectionState():
         """Returns True if the state contains at least `count` items matching any of the item names from a list.
         Ignores duplicates of the same item."""
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item_name in items:
             found += player_prog_items[item_name] > 0
             if found >= count:
@@ -1053,7 +1248,7 @@ class CollectionState():
 
     def count_from_list(self, items: Iterable[str], player: int) -> int:
         """Returns the cumulative count of items from a list present in state."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         total = 0
         for item_name in items:
             total += player_prog_items[item_name]
@@ -1061,7 +1256,7 @@ class CollectionState():
 
     def count_from_list_unique(self, items: Iterable[str], player: int) -> int:
         """Returns the cumulative count of items from a list present in state. Ignores duplicates of the same item."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         total = 0
         for item_name in items:
             if player_prog_items[item_name] > 0:
@@ -1072,7 +1267,7 @@ class CollectionState():
     def has_group(self, item_name_group: str, player: int, count: int = 1) -> bool:
         """Returns True if the state contains at least `count` items present in a specified item group."""
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
             found += player_prog_items[item_name]
             if found >= count:
@@ -1084,7 +1279,7 @@ class CollectionState():
         Ignores duplicates of the same item.
         """
         found: int = 0
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]:
             found += player_prog_items[item_name] > 0
             if found >= count:
@@ -1093,7 +1288,7 @@ class CollectionState():
 
     def count_group(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         return sum(
             player_prog_items[item_name]
             for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
@@ -1102,7 +1297,7 @@ class CollectionState():
     def count_group_unique(self, item_name_group: str, player: int) -> int:
         """Returns the cumulative count of items from an item group present in state.
         Ignores duplicates of the same item."""
-        player_prog_items = self.prog_items[player]
+        player_prog_items = self.prog_items.peek(player)
         return sum(
             player_prog_items[item_name] > 0
             for item_name in self.multiworld.worlds[player].item_name_groups[item_name_group]
@@ -1116,6 +1311,7 @@ class CollectionState():
         changed = self.multiworld.worlds[item.player].collect(self, item)
 
         self.stale[item.player] = True
+        self.stale_items[item.player].add(item.name)
 
         if changed and not prevent_sweep:
             self.sweep_for_advancements()
@@ -1132,6 +1328,7 @@ class CollectionState():
         """
         assert count > 0
         self.prog_items[player][item] += count
+        self.stale_items[player].add(item)
 
     def remove(self, item: Item):
         changed = self.multiworld.worlds[item.player].remove(self, item)
@@ -1151,6 +1348,7 @@ class CollectionState():
         """
         assert count > 0
         self.prog_items[player][item] -= count
+        self.stale_items[player].add(item)
         if self.prog_items[player][item] < 1:
             del (self.prog_items[player][item])
 
@@ -1163,6 +1361,7 @@ class CollectionState():
         :param count: How many of the item to now have.
         """
         assert count >= 0
+        self.stale_items[player].add(item)
         if count == 0:
             del (self.prog_items[player][item])
         else:
@@ -1183,6 +1382,10 @@ class Entrance:
     connected_region: Optional[Region] = None
     randomization_group: int
     randomization_type: EntranceType
+    item_dependencies: Optional[AbstractSet[str]] = None
+    """Names of the state items access_rule depends on, besides reaching parent_region.
+    If set, the entrance is only retested while blocked when one of these items changes.
+    None means the dependencies are unknown and the entrance is retested on every region update."""
 
     def __init__(self, player: int, name: str = "", parent: Optional[Region] = None,
                  randomization_group: int = 0, randomization_type: EntranceType = EntranceType.ONE_WAY) -> None:
@@ -1333,7 +1536,7 @@ class Region:
     def can_reach(self, state: CollectionState) -> bool:
         if state.stale[self.player]:
             state.update_reachable_regions(self.player)
-        return self in state.reachable_regions[self.player]
+        return self in state.reachable_regions.peek(self.player)
 
     @property
     def hint_text(self) -> str:
@@ -1695,58 +1898,45 @@ class Spoiler:
         # get locations containing progress items
         multiworld = self.multiworld
         prog_locations = {location for location in multiworld.get_filled_locations() if location.item.advancement}
-        state_cache: List[Optional[CollectionState]] = [None]
+        state_cache: List[CollectionState] = []
         collection_spheres: List[Set[Location]] = []
-        state = CollectionState(multiworld)
+        logical_spheres = multiworld.get_logical_spheres()
         sphere_candidates = set(prog_locations)
         logging.debug('Building up collection spheres.')
-        while sphere_candidates:
+        for num, logical_sphere in enumerate(logical_spheres.spheres):
 
             # build up spheres of collection radius.
             # Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
 
-            sphere = {location for location in sphere_candidates if state.can_reach(location)}
-
-            for location in sphere:
-                state.collect(location.item, True, location)
+            sphere = {location for location in logical_sphere if location.advancement}
+            if not sphere:
+                # the items collected in this sphere may still open up later spheres
+                continue
 
             sphere_candidates -= sphere
             collection_spheres.append(sphere)
-            state_cache.append(state.copy())
+            state_cache.append(logical_spheres.states[num])
 
             logging.debug('Calculated sphere %i, containing %i of %i progress items.', len(collection_spheres),
                           len(sphere),
                           len(prog_locations))
-            if not sphere:
-                logging.debug('The following items could not be reached: %s', ['%s (Player %d) at %s (Player %d)' % (
-                    location.item.name, location.item.player, location.name, location.player) for location in
-                                                                               sphere_candidates])
-                if not multiworld.has_beaten_game(state):
-                    raise RuntimeError("During playthrough generation, the game was determined to be unbeatable. "
-                                       "Something went terribly wrong here. "
-                                       f"Unreachable progression items: {sphere_candidates}")
-                else:
-                    self.unreachables = sphere_candidates
-                    break
+        if sphere_candidates:
+            logging.debug('The following items could not be reached: %s', ['%s (Player %d) at %s (Player %d)' % (
+                location.item.name, location.item.player, location.name, location.player) for location in
+                                                                           sphere_candidates])
+            if not multiworld.has_beaten_game(logical_spheres.states[-1]):
+                raise RuntimeError("During playthrough generation, the game was determined to be unbeatable. "
+                                   "Something went terribly wrong here. "
+                                   f"Unreachable progression items: {sphere_candidates}")
+            else:
+                self.unreachables = sphere_candidates
 
         # in the second phase, we cull each sphere such that the game is still beatable,
         # reducing each range of influence to the bare minimum required inside it
         required_locations = {location for sphere in collection_spheres for location in sphere}
         for num, sphere in reversed(tuple(enumerate(collection_spheres))):
-            to_delete: Set[Location] = set()
-            for location in sphere:
-                # we remove the location from required_locations to sweep from, and check if the game is still beatable
-                logging.debug('Checking if %s (Player %d) is required to beat the game.', location.item.name,
-                              location.item.player)
-                required_locations.remove(location)
-                if multiworld.can_beat_game(state_cache[num], required_locations):
-                    to_delete.add(location)
-                else:
-                    # still required, got to keep it around
-                    required_locations.add(location)
-
             # cull entries in spheres for spoiler walkthrough at end
-            sphere -= to_delete
+            sphere -= self._cull_sphere(state_cache[num], list(sphere), required_locations)
 
         # second phase, sphere 0
         removed_precollected: List[Item] = []
@@ -1805,6 +1995,56 @@ class Spoiler:
         for item in removed_precollected:
             multiworld.push_precollected(item)
 
+    def _cull_sphere(self, state: CollectionState, sphere: List[Location],
+                     required_locations: Set[Location]) -> Set[Location]:
+        """
+        Removes the locations of sphere that are not required to beat the game from required_locations, checking them
+        one after another in order, and returns them.
+
+        The sweep result that all checks of the sphere have in common, everything reachable without the locations still
+        to be checked, is kept in a base state that is extended whenever a location turns out to be required. Each check
+        then only sweeps onwards from a copy of that base state. The sphere's locations are reachable from the starting
+        state, so the unchecked ones are collected directly. Once the base state beats the game, all remaining
+        locations can go at once.
+        """
+        multiworld = self.multiworld
+
+        def sweep_beats_game(sweep_state: CollectionState, locations: Iterable[Location]) -> bool:
+            if multiworld.has_beaten_game(sweep_state):
+                return True
+            for _ in sweep_state.sweep_for_advancements(locations, yield_each_sweep=True,
+                                                        checked_locations=sweep_state.locations_checked):
+                if multiworld.has_beaten_game(sweep_state):
+                    return True
+            return False
+
+        base_state = state.copy()
+        culled: Set[Location] = set()
+        unchecked = sphere
+        if sweep_beats_game(base_state, required_locations.difference(unchecked)):
+            culled.update(unchecked)
+        else:
+            for index, location in enumerate(sphere):
+                # we remove the location from required_locations to sweep from, and check if the game is still beatable
+                logging.debug('Checking if %s (Player %d) is required to beat the game.', location.item.name,
+                              location.item.player)
+                unchecked = sphere[index + 1:]
+                check_state = base_state.copy()
+                for other_location in unchecked:
+                    check_state.collect(other_location.item, True, other_location)
+                required_locations.remove(location)
+                if sweep_beats_game(check_state, required_locations):
+                    culled.add(location)
+                else:
+                    # still required, got to keep it around
+                    required_locations.add(location)
+                    base_state.collect(location.item, True, location)
+                    if sweep_beats_game(base_state, required_locations.difference(unchecked)):
+                        culled.update(unchecked)
+                        break
+        required_locations.difference_update(culled)
+        return culled
+
     def create_paths(self, state: CollectionState, collection_spheres: List[Set[Location]]) -> None:
         from itertools import zip_longest
         multiworld = self.multiworld
@@ -1927,6 +2167,97 @@ class Spoiler:
             AutoWorld.call_all(self.multiworld, "write_spoiler_end", outfile)
 
 
+class GenerationProfile:
+    """
+    Wall time, CPU time and peak memory of the steps of a generation, written out by --profile_report.
+
+    Steps run on the main thread are measured with the CPU time of the whole process, which includes the worker threads
+    they wait on. Steps run on worker threads are measured with the CPU time of their own thread and without memory,
+    as the traced memory of concurrently running steps can't be told apart. Peak memory is the most memory traced by
+    tracemalloc during a step, above what was traced when it started. Sweep and state copy counts include those made
+    by other threads during a step.
+    """
+    seed_name: Optional[str]
+    """None until the multiworld's seed is set"""
+    players: Dict[int, Tuple[str, str]]
+    steps: List[Dict[str, Any]]
+    copy_count: int
+    """CollectionStates copied so far in this generation"""
+    sweep_count: int
+    """sweeps started so far in this generation"""
+    _count_lock: threading.Lock
+    _memory_scopes: List[List[int]]
+    """start and peak traced memory of each main thread step in progress, innermost last"""
+
+    def __init__(self) -> None:
+        self.seed_name = None
+        self.players = {}
+        self.steps = []
+        self.copy_count = 0
+        self.sweep_count = 0
+        self._count_lock = threading.Lock()
+        self._memory_scopes = []
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def measure(self, stage: str, player: Optional[int] = None, game: Optional[str] = None) -> Iterator[None]:
+        main_thread = threading.current_thread() is threading.main_thread()
+        if main_thread:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._memory_scopes:
+                self._memory_scopes[-1][1] = max(self._memory_scopes[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._memory_scopes.append([current, current])
+        cpu_clock = time.process_time if main_thread else time.thread_time
+        copies = self.copy_count
+        sweeps = self.sweep_count
+        cpu_start = cpu_clock()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            step: Dict[str, Any] = {
+                "stage": stage,
+                "player": player,
+                "game": game,
+                "wall_time": time.perf_counter() - start,
+                "cpu_time": cpu_clock() - cpu_start,
+                "peak_memory": None,
+                "sweeps": self.sweep_count - sweeps,
+                "state_copies": self.copy_count - copies,
+            }
+            if main_thread:
+                start_memory, peak = self._memory_scopes.pop()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                if self._memory_scopes:
+                    self._memory_scopes[-1][1] = max(self._memory_scopes[-1][1], peak)
+                step["peak_memory"] = peak - start_memory
+            self.steps.append(step)
+
+    def count_copy(self) -> None:
+        with self._count_lock:
+            self.copy_count += 1
+
+    def count_sweep(self) -> None:
+        with self._count_lock:
+            self.sweep_count += 1
+
+    def stop(self) -> None:
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def to_file(self, filename: str) -> None:
+        report = {
+            "seed_name": self.seed_name,
+            "players": {player: {"name": name, "game": game} for player, (name, game) in self.players.items()},
+            "steps": self.steps,
+        }
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+
 class Tutorial(NamedTuple):
     """Class to build website tutorial pages from a .md file in the world's /docs folder. Order is as follows.
     Name of the tutorial as it will appear on the site. Concise description covering what the guide will entail.
@@ -4,7 +4,7 @@ import logging
 import typing
 from collections import Counter, deque
 
-from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, PlandoItemBlock
+from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld, PlandoItemBlock, Region
 from Options import Accessibility
 
 from worlds.AutoWorld import call_all
@@ -24,6 +24,10 @@ def _log_fill_progress(name: str, placed: int, total_items: int) -> None:
     logging.info(f"Current fill step ({name}) at {placed}/{total_items} items placed.")
 
 
+exploration_base_batches = 8
+"""number of fill_restrictive batches that sweep onwards from the same exploration base before it is rebuilt"""
+
+
 def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item] = tuple(),
                     locations: typing.Optional[typing.List[Location]] = None) -> CollectionState:
     new_state = base_state.copy()
@@ -33,6 +37,29 @@ def sweep_from_pool(base_state: CollectionState, itempool: typing.Sequence[Item]
     return new_state
 
 
+def _can_fill_cached(location: Location, state: CollectionState, item: Item, check_access: bool,
+                     reachability: typing.Dict[Location, bool]) -> bool:
+    """
+    Location.can_fill, remembering the access check of each location in reachability, which has to be discarded
+    whenever state changes. Locations overriding can_fill may depend on the item for access, so are always checked.
+    """
+    if not check_access or type(location).can_fill is not Location.can_fill:
+        return location.can_fill(state, item, check_access)
+    reachable = reachability.get(location)
+    if reachable is None:
+        if not location.can_fill(state, item, False):
+            return False
+        # only check access once the rules allow the item, as most rejections come from item rules
+        reachable = reachability[location] = location.can_reach(state)
+        if reachable:
+            return True
+    elif reachable:
+        return location.can_fill(state, item, False)
+    # unreachable, so only always_allow can let the item in
+    return location.always_allow(state, item) \
+        and item.name not in state.multiworld.worlds[item.player].options.non_local_items
+
+
 def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locations: typing.List[Location],
                      item_pool: typing.List[Item], single_player_placement: bool = False, lock: bool = False,
                      swap: bool = True, on_place: typing.Optional[typing.Callable[[Location], None]] = None,
@@ -63,6 +90,14 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
     total = min(len(item_pool), len(locations))
     placed = 0
 
+    # Instead of sweeping from base_state for every batch, the exploration state of a batch is swept onwards from
+    # exploration_base, which has base_state and every pool item except held_back_items collected and swept.
+    # Items are drawn from the end of each player's deque, so the pool items other than the last few of each deque stay
+    # in the pool for the next batches, until exploration_base is refreshed.
+    exploration_base: typing.Optional[CollectionState] = None
+    held_back_items: typing.List[Item] = []
+    batches_until_refresh = 0
+
     while any(reachable_items.values()) and locations:
         if one_item_per_player:
             # grab one item per player
@@ -82,11 +117,27 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
                     del item_pool[-p]
                     break
 
+        sweep_locations = multiworld.get_filled_locations(item.player) if single_player_placement else None
+        if exploration_base is None or not batches_until_refresh:
+            # the items of this batch are held back too, as the ones that cannot be placed return to the pool
+            held_back_items = items_to_place + [pool_item for items in reachable_items.values()
+                                                for pool_item in itertools.islice(reversed(items),
+                                                                                  exploration_base_batches)]
+            held_back = {id(pool_item) for pool_item in held_back_items}
+            exploration_base = sweep_from_pool(
+                base_state, [pool_item for pool_item in itertools.chain(item_pool, unplaced_items)
+                             if id(pool_item) not in held_back], sweep_locations)
+            batches_until_refresh = exploration_base_batches
+        batches_until_refresh -= 1
+        # held back items that were placed are now swept from their locations instead, if reachable
+        placing = {id(item_to_place) for item_to_place in items_to_place}
         maximum_exploration_state = sweep_from_pool(
-            base_state, item_pool + unplaced_items, multiworld.get_filled_locations(item.player)
-            if single_player_placement else None)
+            exploration_base, [pool_item for pool_item in held_back_items
+                               if pool_item.location is None and id(pool_item) not in placing], sweep_locations)
 
         has_beaten_game = multiworld.has_beaten_game(maximum_exploration_state)
+        # access checks only depend on maximum_exploration_state, so they are shared by all items of this batch
+        reachability: typing.Dict[Location, bool] = {}
 
         while items_to_place:
             # if we have run out of locations to fill,break out of this loop
@@ -107,7 +158,8 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
 
             for i, location in enumerate(locations):
                 if (not single_player_placement or location.player == item_to_place.player) \
-                        and location.can_fill(maximum_exploration_state, item_to_place, perform_access_check):
+                        and _can_fill_cached(location, maximum_exploration_state, item_to_place, perform_access_check,
+                                             reachability):
                     # popping by index is faster than removing by content,
                     spot_to_fill = locations.pop(i)
                     # skipping a scan for the element
@@ -183,6 +235,8 @@ def fill_restrictive(multiworld: MultiWorld, base_state: CollectionState, locati
 
                             # cleanup at the end to hopefully get better errors
                             cleanup_required = True
+                            # exploration_base may have swept placed_item from its old location
+                            exploration_base = None
 
                             break
 
@@ -499,7 +553,8 @@ def distribute_items_restrictive(multiworld: MultiWorld,
     itempool = sorted(multiworld.itempool)
     multiworld.random.shuffle(itempool)
 
-    fill_locations, itempool = distribute_early_items(multiworld, fill_locations, itempool)
+    with multiworld.measure("fill_early_items"):
+        fill_locations, itempool = distribute_early_items(multiworld, fill_locations, itempool)
 
     progitempool: typing.List[Item] = []
     usefulitempool: typing.List[Item] = []
@@ -535,84 +590,86 @@ def distribute_items_restrictive(multiworld: MultiWorld,
     single_player = multiworld.players == 1 and not multiworld.groups
 
     if prioritylocations:
-        regular_progression = []
-        deprioritized_progression = []
-        for item in progitempool:
-            if item.deprioritized:
-                deprioritized_progression.append(item)
-            else:
-                regular_progression.append(item)
-
-        # "priority fill"
-        # try without deprioritized items in the mix at all. This means they need to be collected into state first.
-        priority_fill_state = sweep_from_pool(multiworld.state, deprioritized_progression)
-        fill_restrictive(multiworld, priority_fill_state, prioritylocations, regular_progression,
-                         single_player_placement=single_player, swap=False, on_place=mark_for_locking,
-                         name="Priority", one_item_per_player=True, allow_partial=True)
-
-        if prioritylocations and regular_progression:
-            # retry with one_item_per_player off because some priority fills can fail to fill with that optimization
-            # deprioritized items are still not in the mix, so they need to be collected into state first.
-            # allow_partial should only be set if there is deprioritized progression to fall back on.
-            priority_retry_state = sweep_from_pool(multiworld.state, deprioritized_progression)
-            fill_restrictive(multiworld, priority_retry_state, prioritylocations, regular_progression,
-                             single_player_placement=single_player, swap=False, on_place=mark_for_locking,
-                             name="Priority Retry", one_item_per_player=False,
-                             allow_partial=bool(deprioritized_progression))
-
-        if prioritylocations and deprioritized_progression:
-            # There are no more regular progression items that can be placed on any priority locations.
-            # We'd still prefer to place deprioritized progression items on priority locations over filler items.
-            # Since we're leaving out the remaining regular progression now, we need to collect it into state first.
-            priority_retry_2_state = sweep_from_pool(multiworld.state, regular_progression)
-            fill_restrictive(multiworld, priority_retry_2_state, prioritylocations, deprioritized_progression,
-                             single_player_placement=single_player, swap=False, on_place=mark_for_locking,
-                             name="Priority Retry 2", one_item_per_player=True, allow_partial=True)
+        with multiworld.measure("fill_priority"):
+            regular_progression = []
+            deprioritized_progression = []
+            for item in progitempool:
+                if item.deprioritized:
+                    deprioritized_progression.append(item)
+                else:
+                    regular_progression.append(item)
 
-        if prioritylocations and deprioritized_progression:
-            # retry with deprioritized items AND without one_item_per_player optimisation
-            # Since we're leaving out the remaining regular progression now, we need to collect it into state first.
-            priority_retry_3_state = sweep_from_pool(multiworld.state, regular_progression)
-            fill_restrictive(multiworld, priority_retry_3_state, prioritylocations, deprioritized_progression,
+            # "priority fill"
+            # try without deprioritized items in the mix at all. This means they need to be collected into state first.
+            priority_fill_state = sweep_from_pool(multiworld.state, deprioritized_progression)
+            fill_restrictive(multiworld, priority_fill_state, prioritylocations, regular_progression,
                              single_player_placement=single_player, swap=False, on_place=mark_for_locking,
-                             name="Priority Retry 3", one_item_per_player=False)
-
-        # restore original order of progitempool
-        progitempool[:] = [item for item in progitempool if not item.location]
-        accessibility_corrections(multiworld, multiworld.state, prioritylocations, progitempool)
-        defaultlocations = prioritylocations + defaultlocations
+                             name="Priority", one_item_per_player=True, allow_partial=True)
+
+            if prioritylocations and regular_progression:
+                # retry with one_item_per_player off because some priority fills can fail to fill with that optimization
+                # deprioritized items are still not in the mix, so they need to be collected into state first.
+                # allow_partial should only be set if there is deprioritized progression to fall back on.
+                priority_retry_state = sweep_from_pool(multiworld.state, deprioritized_progression)
+                fill_restrictive(multiworld, priority_retry_state, prioritylocations, regular_progression,
+                                 single_player_placement=single_player, swap=False, on_place=mark_for_locking,
+                                 name="Priority Retry", one_item_per_player=False,
+                                 allow_partial=bool(deprioritized_progression))
+
+            if prioritylocations and deprioritized_progression:
+                # There are no more regular progression items that can be placed on any priority locations.
+                # We'd still prefer to place deprioritized progression items on priority locations over filler items.
+                # Since we're leaving out the remaining regular progression now, we need to collect it into state first.
+                priority_retry_2_state = sweep_from_pool(multiworld.state, regular_progression)
+                fill_restrictive(multiworld, priority_retry_2_state, prioritylocations, deprioritized_progression,
+                                 single_player_placement=single_player, swap=False, on_place=mark_for_locking,
+                                 name="Priority Retry 2", one_item_per_player=True, allow_partial=True)
+
+            if prioritylocations and deprioritized_progression:
+                # retry with deprioritized items AND without one_item_per_player optimisation
+                # Since we're leaving out the remaining regular progression now, we need to collect it into state first.
+                priority_retry_3_state = sweep_from_pool(multiworld.state, regular_progression)
+                fill_restrictive(multiworld, priority_retry_3_state, prioritylocations, deprioritized_progression,
+                                 single_player_placement=single_player, swap=False, on_place=mark_for_locking,
+                                 name="Priority Retry 3", one_item_per_player=False)
+
+            # restore original order of progitempool
+            progitempool[:] = [item for item in progitempool if not item.location]
+            accessibility_corrections(multiworld, multiworld.state, prioritylocations, progitempool)
+            defaultlocations = prioritylocations + defaultlocations
 
     if progitempool:
-        # "advancement/progression fill"
-        maximum_exploration_state = sweep_from_pool(multiworld.state)
-        if panic_method == "swap":
-            fill_restrictive(multiworld, maximum_exploration_state, defaultlocations, progitempool, swap=True,
-                             name="Progression", single_player_placement=single_player)
-        elif panic_method == "raise":
-            fill_restrictive(multiworld, maximum_exploration_state, defaultlocations, progitempool, swap=False,
-                             name="Progression", single_player_placement=single_player)
-        elif panic_method == "start_inventory":
-            fill_restrictive(multiworld, maximum_exploration_state, defaultlocations, progitempool, swap=False,
-                             allow_partial=True, name="Progression", single_player_placement=single_player)
-            if progitempool:
-                for item in progitempool:
-                    logging.debug(f"Moved {item} to start_inventory to prevent fill failure.")
-                    multiworld.push_precollected(item)
-                    filleritempool.append(multiworld.worlds[item.player].create_filler())
-                logging.warning(f"{len(progitempool)} items moved to start inventory,"
-                                f" due to failure in Progression fill step.")
-                progitempool[:] = []
+        with multiworld.measure("fill_progression"):
+            # "advancement/progression fill"
+            maximum_exploration_state = sweep_from_pool(multiworld.state)
+            if panic_method == "swap":
+                fill_restrictive(multiworld, maximum_exploration_state, defaultlocations, progitempool, swap=True,
+                                 name="Progression", single_player_placement=single_player)
+            elif panic_method == "raise":
+                fill_restrictive(multiworld, maximum_exploration_state, defaultlocations, progitempool, swap=False,
+                                 name="Progression", single_player_placement=single_player)
+            elif panic_method == "start_inventory":
+                fill_restrictive(multiworld, maximum_exploration_state, defaultlocations, progitempool, swap=False,
+                                 allow_partial=True, name="Progression", single_player_placement=single_player)
+                if progitempool:
+                    for item in progitempool:
+                        logging.debug(f"Moved {item} to start_inventory to prevent fill failure.")
+                        multiworld.push_precollected(item)
+                        filleritempool.append(multiworld.worlds[item.player].create_filler())
+                    logging.warning(f"{len(progitempool)} items moved to start inventory,"
+                                    f" due to failure in Progression fill step.")
+                    progitempool[:] = []
 
-        else:
-            raise ValueError(f"Generator Panic Method {panic_method} not recognized.")
-        if progitempool:
-            raise FillError(
-                f"Not enough locations for progression items. "
-                f"There are {len(progitempool)} more progression items than there are available locations.\n"
-                f"Unfilled locations:\n{multiworld.get_unfilled_locations()}.",
-                multiworld=multiworld,
-            )
-        accessibility_corrections(multiworld, multiworld.state, defaultlocations)
+            else:
+                raise ValueError(f"Generator Panic Method {panic_method} not recognized.")
+            if progitempool:
+                raise FillError(
+                    f"Not enough locations for progression items. "
+                    f"There are {len(progitempool)} more progression items than there are available locations.\n"
+                    f"Unfilled locations:\n{multiworld.get_unfilled_locations()}.",
+                    multiworld=multiworld,
+                )
+            accessibility_corrections(multiworld, multiworld.state, defaultlocations)
 
     for location in lock_later:
         if location.item:
@@ -621,8 +678,9 @@ def distribute_items_restrictive(multiworld: MultiWorld,
 
     inaccessible_location_rules(multiworld, multiworld.state, defaultlocations)
 
-    remaining_fill(multiworld, excludedlocations, filleritempool, "Remaining Excluded",
-                   move_unplaceable_to_start_inventory=panic_method=="start_inventory")
+    with multiworld.measure("fill_excluded"):
+        remaining_fill(multiworld, excludedlocations, filleritempool, "Remaining Excluded",
+                       move_unplaceable_to_start_inventory=panic_method=="start_inventory")
 
     if excludedlocations:
         raise FillError(
@@ -633,8 +691,9 @@ def distribute_items_restrictive(multiworld: MultiWorld,
 
     restitempool = filleritempool + usefulitempool
 
-    remaining_fill(multiworld, defaultlocations, restitempool,
-                   move_unplaceable_to_start_inventory=panic_method=="start_inventory")
+    with multiworld.measure("fill_remaining"):
+        remaining_fill(multiworld, defaultlocations, restitempool,
+                       move_unplaceable_to_start_inventory=panic_method=="start_inventory")
 
     unplaced = restitempool
     unfilled = defaultlocations
@@ -749,7 +808,10 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
         logging.debug(balanceable_players)
         state: CollectionState = CollectionState(multiworld)
         checked_locations: typing.Set[Location] = set()
-        unchecked_locations: typing.Set[Location] = set(multiworld.get_locations())
+        # unchecked locations are kept grouped by their region, so the locations of unreachable regions are not tested
+        unchecked_locations: typing.Dict[Region, typing.Set[Location]] = {}
+        for location in multiworld.get_locations():
+            unchecked_locations.setdefault(location.parent_region, set()).add(location)
 
         total_locations_count: typing.Counter[int] = Counter(
             location.player
@@ -768,10 +830,20 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
         }
         sphere_num: int = 1
         moved_item_count: int = 0
+        reducing_batch_size = 8
+        # the spheres after the current one that were found while checking for balancing, valid until items are moved
+        next_spheres: typing.Deque[typing.Set[Location]] = deque()
 
         def get_sphere_locations(sphere_state: CollectionState,
-                                 locations: typing.Set[Location]) -> typing.Set[Location]:
-            return {loc for loc in locations if sphere_state.can_reach(loc)}
+                                 locations: typing.Dict[Region, typing.Set[Location]]) -> typing.Set[Location]:
+            return {loc for region, region_locations in locations.items() if region.can_reach(sphere_state)
+                    for loc in region_locations if loc.can_reach(sphere_state)}
+
+        def remove_location(locations: typing.Dict[Region, typing.Set[Location]], location: Location) -> None:
+            region_locations = locations[location.parent_region]
+            region_locations.remove(location)
+            if not region_locations:
+                del locations[location.parent_region]
 
         def item_percentage(player: int, num: int) -> float:
             return num / total_locations_count[player]
@@ -784,9 +856,10 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
             # Gather non-locked locations.
             # This ensures that only shuffled locations get counted for progression balancing,
             #   i.e. the items the players will be checking.
-            sphere_locations = get_sphere_locations(state, unchecked_locations)
+            sphere_locations = next_spheres.popleft() if next_spheres \
+                else get_sphere_locations(state, unchecked_locations)
             for location in sphere_locations:
-                unchecked_locations.remove(location)
+                remove_location(unchecked_locations, location)
                 if not location.locked:
                     reachable_locations_count[location.player] += 1
 
@@ -815,10 +888,12 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                 }
                 if balancing_players:
                     balancing_state = state.copy()
-                    balancing_unchecked_locations = unchecked_locations.copy()
+                    balancing_unchecked_locations = {region: region_locations.copy()
+                                                     for region, region_locations in unchecked_locations.items()}
                     balancing_reachables = reachable_locations_count.copy()
                     balancing_sphere = sphere_locations.copy()
                     candidate_items: typing.Dict[int, typing.Set[Location]] = collections.defaultdict(set)
+                    balancing_sphere_num = 0
                     while True:
                         # Check locations in the current sphere and gather progression items to swap earlier
                         for location in balancing_sphere:
@@ -832,9 +907,14 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                                         location.progress_type != LocationProgressType.PRIORITY):
                                     candidate_items[player].add(location)
                                     logging.debug(f"Candidate item: {location.name}, {location.item.name}")
-                        balancing_sphere = get_sphere_locations(balancing_state, balancing_unchecked_locations)
+                        if balancing_sphere_num < len(next_spheres):
+                            balancing_sphere = next_spheres[balancing_sphere_num]
+                        else:
+                            balancing_sphere = get_sphere_locations(balancing_state, balancing_unchecked_locations)
+                            next_spheres.append(balancing_sphere)
+                        balancing_sphere_num += 1
                         for location in balancing_sphere:
-                            balancing_unchecked_locations.remove(location)
+                            remove_location(balancing_unchecked_locations, location)
                             if not location.locked:
                                 balancing_reachables[location.player] += 1
                         if multiworld.has_beaten_game(balancing_state) or all(
@@ -845,35 +925,53 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
                         elif not balancing_sphere:
                             raise RuntimeError("Not all required items reachable. Something went terribly wrong here.")
                     # Gather a set of locations which we can swap items into
-                    unlocked_locations: typing.Dict[int, typing.Set[Location]] = collections.defaultdict(set)
-                    for l in unchecked_locations:
-                        if l not in balancing_unchecked_locations:
-                            unlocked_locations[l.player].add(l)
+                    unlocked_locations: typing.Dict[int, typing.Dict[Region, typing.Set[Location]]] = \
+                        collections.defaultdict(dict)
+                    for region, region_locations in unchecked_locations.items():
+                        for l in region_locations.difference(balancing_unchecked_locations.get(region, ())):
+                            unlocked_locations[l.player].setdefault(region, set()).add(l)
                     items_to_replace: typing.List[Location] = []
                     for player in balancing_players:
                         locations_to_test = unlocked_locations[player]
+                        sweep_locations = list(itertools.chain.from_iterable(locations_to_test.values()))
                         items_to_test = list(candidate_items[player])
                         items_to_test.sort()
                         multiworld.random.shuffle(items_to_test)
+                        # Each test collects the candidates other than the tested one, on top of those already chosen
+                        # for replacement. Candidates are tested from the end of items_to_test, so reducing_base has all
+                        # of those collected and swept, except for reducing_items, the next few candidates to be tested,
+                        # which are collected into a copy of it for each test.
+                        reducing_base: typing.Optional[CollectionState] = None
+                        reducing_items: typing.List[Location] = []
                         while items_to_test:
                             testing = items_to_test.pop()
-                            reducing_state = state.copy()
-                            for location in itertools.chain((
-                                    l for l in items_to_replace
-                                    if l.item.player == player
-                            ), items_to_test):
+                            if testing in reducing_items:
+                                reducing_items.remove(testing)
+                            else:
+                                reducing_items = items_to_test[-reducing_batch_size:]
+                                reducing_base = state.copy()
+                                for location in itertools.chain((
+                                        l for l in items_to_replace
+                                        if l.item.player == player
+                                ), items_to_test[:-reducing_batch_size]):
+                                    reducing_base.collect(location.item, True, location)
+                                reducing_base.sweep_for_advancements(locations=sweep_locations)
+                            reducing_state = reducing_base.copy()
+                            for location in reducing_items:
                                 reducing_state.collect(location.item, True, location)
 
-                            reducing_state.sweep_for_advancements(locations=locations_to_test)
+                            reducing_state.sweep_for_advancements(locations=sweep_locations)
 
                             if multiworld.has_beaten_game(balancing_state):
                                 if not multiworld.has_beaten_game(reducing_state):
                                     items_to_replace.append(testing)
+                                    reducing_items.append(testing)
                             else:
                                 reduced_sphere = get_sphere_locations(reducing_state, locations_to_test)
                                 p = item_percentage(player, reachable_locations_count[player] + len(reduced_sphere))
                                 if p < threshold_percentages[player]:
                                     items_to_replace.append(testing)
+                                    reducing_items.append(testing)
 
                     old_moved_item_count = moved_item_count
 
@@ -902,9 +1000,13 @@ def balance_multiworld_progression(multiworld: MultiWorld) -> None:
 
                     if old_moved_item_count < moved_item_count:
                         logging.debug(f"Moved {moved_item_count} items so far\n")
-                        unlocked = {fresh for player in balancing_players for fresh in unlocked_locations[player]}
+                        next_spheres.clear()
+                        unlocked: typing.Dict[Region, typing.Set[Location]] = {}
+                        for player in balancing_players:
+                            for region, region_locations in unlocked_locations[player].items():
+                                unlocked.setdefault(region, set()).update(region_locations)
                         for location in get_sphere_locations(state, unlocked):
-                            unchecked_locations.remove(location)
+                            remove_location(unchecked_locations, location)
                             if not location.locked:
                                 reachable_locations_count[location.player] += 1
                             sphere_locations.add(location)
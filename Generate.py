@@ -51,6 +51,13 @@ def mystery_argparse(argv: list[str] | None = None):
                         help="List of options that can be set manually. Can be combined, for example \"bosses, items\"")
     parser.add_argument("--skip_prog_balancing", action="store_true",
                         help="Skip progression balancing step during generation.")
+    parser.add_argument("--profile_report", "--profile-report", action="store_true",
+                        help="Writes the wall time, CPU time and peak memory of every generation step per world, and "
+                             "the sweeps and state copies it made, to AP_<seed>_profile.json in the output folder. "
+                             "Memory tracing slows down generation.")
+    parser.add_argument("--check_determinism", action="store_true",
+                        help="Generates the seed twice without output and reports any item placement that differs "
+                             "between the two runs. Intended for debugging and testing purposes.")
     parser.add_argument("--skip_output", action="store_true",
                         help="Skips generation assertion and output stages and skips multidata and spoiler output. "
                              "Intended for debugging and testing purposes.")
@@ -653,6 +660,11 @@ if __name__ == '__main__':
     import atexit
     confirmation = atexit.register(input, "Press enter to close.")
     erargs, seed = main()
+    if erargs.check_determinism:
+        from Main import check_determinism
+        deterministic = not check_determinism(erargs, seed)
+        atexit.unregister(confirmation)
+        sys.exit(0 if deterministic else 1)
     from Main import main as ERmain
     multiworld = ERmain(erargs, seed)
     if __debug__:
@@ -1,16 +1,20 @@
 import collections
-from collections.abc import Mapping
+from collections.abc import Iterator, Mapping
 import concurrent.futures
+import contextlib
+import copy
+import functools
 import logging
 import os
 import tempfile
+import threading
 import time
-from typing import Any
+from typing import Any, Callable, TypeVar
 import zipfile
 import zlib
 
 import worlds
-from BaseClasses import CollectionState, Item, Location, LocationProgressType, MultiWorld
+from BaseClasses import CollectionState, GenerationProfile, Item, Location, LocationProgressType, MultiWorld
 from Fill import FillError, balance_multiworld_progression, distribute_items_restrictive, flood_items, \
     parse_planned_blocks, distribute_planned_blocks, resolve_early_locations_for_planned
 from NetUtils import convert_to_base_types
@@ -20,10 +24,30 @@ from settings import get_settings
 from worlds import AutoWorld
 from worlds.generic.Rules import exclusion_rules, locality_rules
 
-__all__ = ["main"]
+__all__ = ["main", "check_determinism"]
+
+T = TypeVar("T")
 
 
 def main(args, seed=None, baked_server_options: dict[str, object] | None = None):
+    if not args.profile_report:
+        return _generate(args, seed, baked_server_options)
+
+    profile = GenerationProfile()
+    try:
+        with profile.measure("generation"):
+            return _generate(args, seed, baked_server_options, profile)
+    finally:
+        profile.stop()
+        # nothing worth reporting was measured if generation failed before the seed was set
+        if profile.seed_name:
+            report_path = output_path(f"AP_{profile.seed_name}_profile.json")
+            profile.to_file(report_path)
+            logging.info(f"Wrote profile report to {report_path}")
+
+
+def _generate(args, seed=None, baked_server_options: dict[str, object] | None = None,
+              profile: GenerationProfile | None = None):
     if not baked_server_options:
         baked_server_options = get_settings().server_options.as_dict()
     assert isinstance(baked_server_options, dict)
@@ -42,6 +66,11 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     multiworld.player_name = args.name.copy()
     multiworld.sprite = args.sprite.copy()
     multiworld.sprite_pool = args.sprite_pool.copy()
+    if profile:
+        multiworld.profile = profile
+        profile.seed_name = multiworld.seed_name
+        profile.players = {player: (multiworld.player_name[player], multiworld.game[player])
+                           for player in multiworld.player_ids}
 
     multiworld.set_options(args)
     if args.csv_output:
@@ -185,9 +214,10 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
         multiworld._all_state = None
 
     logger.info("Running Item Plando.")
-    resolve_early_locations_for_planned(multiworld)
-    distribute_planned_blocks(multiworld, [x for player in multiworld.plando_item_blocks
-                                           for x in multiworld.plando_item_blocks[player]])
+    with multiworld.measure("item_plando"):
+        resolve_early_locations_for_planned(multiworld)
+        distribute_planned_blocks(multiworld, [x for player in multiworld.plando_item_blocks
+                                               for x in multiworld.plando_item_blocks[player]])
 
     logger.info('Running Pre Main Fill.')
 
@@ -195,20 +225,25 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
     logger.info(f'Filling the multiworld with {len(multiworld.itempool)} items.')
 
-    if multiworld.algorithm == 'flood':
-        flood_items(multiworld)  # different algo, biased towards early game progress items
-    elif multiworld.algorithm == 'balanced':
-        distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
+    with multiworld.measure("fill"):
+        if multiworld.algorithm == 'flood':
+            flood_items(multiworld)  # different algo, biased towards early game progress items
+        elif multiworld.algorithm == 'balanced':
+            distribute_items_restrictive(multiworld, get_settings().generator.panic_method)
 
     AutoWorld.call_all(multiworld, 'post_fill')
 
     if multiworld.players > 1 and not args.skip_prog_balancing:
-        balance_multiworld_progression(multiworld)
+        with multiworld.measure("progression_balancing"):
+            balance_multiworld_progression(multiworld)
     else:
         logger.info("Progression balancing skipped.")
 
     # we're about to output using multithreading, so we're removing the global random state to prevent accidental use
     multiworld.random.passthrough = False
+    # placements are final from here on, so the logical spheres can be shared by everything that needs them
+    with multiworld.measure("spheres"):
+        multiworld.cache_spheres()
 
     if args.skip_output:
         logger.info('Done. Skipped output/spoiler generation. Total Time: %s', time.perf_counter() - start)
@@ -220,24 +255,33 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
     if args.spoiler_only:
         if args.spoiler > 1:
             logger.info('Calculating playthrough.')
-            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
+            with multiworld.measure("playthrough"):
+                multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
 
-        multiworld.spoiler.to_file(output_path('%s_Spoiler.txt' % outfilebase))
+        with multiworld.measure("spoiler"):
+            multiworld.spoiler.to_file(output_path('%s_Spoiler.txt' % outfilebase))
         logger.info('Done. Skipped multidata modification. Total time: %s', time.perf_counter() - start)
         return multiworld
 
-    output = tempfile.TemporaryDirectory()
-    with output as temp_dir:
+    zipfilename = output_path(f"AP_{multiworld.seed_name}.zip")
+    logger.info(f"Creating final archive at {zipfilename}")
+    with _output_archive(zipfilename) as archive:
+        archive_lock = threading.Lock()
         output_players = [player for player in multiworld.player_ids if AutoWorld.World.generate_output.__code__
                           is not multiworld.worlds[player].generate_output.__code__]
         with concurrent.futures.ThreadPoolExecutor(len(output_players) + 2) as pool:
-            check_accessibility_task = pool.submit(multiworld.fulfills_accessibility)
+            check_accessibility_task = pool.submit(_measured, multiworld, "accessibility_check",
+                                                   multiworld.fulfills_accessibility)
 
-            output_file_futures = [pool.submit(AutoWorld.call_stage, multiworld, "generate_output", temp_dir)]
+            # every output task writes its own files into the archive as soon as it is done
+            output_file_futures = [pool.submit(_archived_output, archive, archive_lock,
+                                               functools.partial(AutoWorld.call_stage, multiworld, "generate_output"))]
             for player in output_players:
+                multiworld.worlds[player].seed_random("generate_output")
                 # skip starting a thread for methods that say "pass".
-                output_file_futures.append(
-                    pool.submit(AutoWorld.call_single, multiworld, "generate_output", player, temp_dir))
+                output_file_futures.append(pool.submit(
+                    _archived_output, archive, archive_lock,
+                    functools.partial(AutoWorld.call_single, multiworld, "generate_output", player)))
 
             # collect ER hint info
             er_hint_data: dict[int, dict[int, str]] = {}
@@ -352,11 +396,13 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
                 serialized_multidata = zlib.compress(restricted_dumps(multidata), 9)
 
-                with open(os.path.join(temp_dir, f'{outfilebase}.archipelago'), 'wb') as f:
-                    f.write(bytes([3]))  # version of format
-                    f.write(serialized_multidata)
+                multidata_info = zipfile.ZipInfo(f'{outfilebase}.archipelago', time.localtime()[:6])
+                with archive_lock:
+                    # first byte is the version of format
+                    archive.writestr(multidata_info, bytes([3]) + serialized_multidata,
+                                     archive.compression, archive.compresslevel)
 
-            output_file_futures.append(pool.submit(write_multidata))
+            output_file_futures.append(pool.submit(_measured, multiworld, "write_multidata", write_multidata))
             if not check_accessibility_task.result():
                 if not multiworld.can_beat_game():
                     raise FillError("Game appears as unbeatable. Aborting.", multiworld=multiworld)
@@ -371,17 +417,81 @@ def main(args, seed=None, baked_server_options: dict[str, object] | None = None)
 
         if args.spoiler > 1:
             logger.info('Calculating playthrough.')
-            multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
+            with multiworld.measure("playthrough"):
+                multiworld.spoiler.create_playthrough(create_paths=args.spoiler > 2)
 
         if args.spoiler:
-            multiworld.spoiler.to_file(os.path.join(temp_dir, '%s_Spoiler.txt' % outfilebase))
-
-        zipfilename = output_path(f"AP_{multiworld.seed_name}.zip")
-        logger.info(f"Creating final archive at {zipfilename}")
-        with zipfile.ZipFile(zipfilename, mode="w", compression=zipfile.ZIP_DEFLATED,
-                             compresslevel=9) as zf:
-            for file in os.scandir(temp_dir):
-                zf.write(file.path, arcname=file.name)
+            with multiworld.measure("spoiler"):
+                _archived_output(archive, archive_lock, lambda output_directory: multiworld.spoiler.to_file(
+                    os.path.join(output_directory, '%s_Spoiler.txt' % outfilebase)))
 
     logger.info('Done. Enjoy. Total Time: %s', time.perf_counter() - start)
     return multiworld
+
+
+def _measured(multiworld: MultiWorld, stage: str, function: Callable[[], T]) -> T:
+    with multiworld.measure(stage):
+        return function()
+
+
+@contextlib.contextmanager
+def _output_archive(filename: str) -> Iterator[zipfile.ZipFile]:
+    """Opens the final archive for writing and removes it again if generating its contents fails."""
+    try:
+        with zipfile.ZipFile(filename, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+            yield archive
+    except BaseException:
+        os.remove(filename)
+        raise
+
+
+def _archived_output(archive: zipfile.ZipFile, archive_lock: threading.Lock,
+                     generate: Callable[[str], object]) -> None:
+    """Runs generate with an output directory of its own and writes the files it wrote there into the archive."""
+    with tempfile.TemporaryDirectory() as output_directory:
+        generate(output_directory)
+        for file in os.scandir(output_directory):
+            with archive_lock:
+                archive.write(file.path, file.name)
+
+
+def _placements(multiworld: MultiWorld) -> dict[tuple[int, str], tuple[int, str] | None]:
+    placements: dict[tuple[int, str], tuple[int, str] | None] = {
+        (location.player, location.name): (location.item.player, location.item.name) if location.item else None
+        for location in multiworld.get_locations()
+    }
+    for player, items in multiworld.precollected_items.items():
+        for index, item in enumerate(items):
+            placements[(player, f"<start inventory {index}>")] = (item.player, item.name)
+    return placements
+
+
+def check_determinism(args, seed=None) -> list[str]:
+    """
+    Generates the same seed twice without output and compares where every item ended up.
+    Returns a description of every location that differs between the two runs; an empty list means deterministic.
+    """
+    if args.race:
+        raise ValueError("Race mode uses secure randomness, so its generation is never reproducible.")
+    logger = logging.getLogger()
+    runs: list[dict[tuple[int, str], tuple[int, str] | None]] = []
+    for run in (1, 2):
+        logger.info(f"Determinism check: generation run {run} of 2.")
+        run_args = copy.deepcopy(args)
+        run_args.skip_output = True
+        run_args.spoiler_only = False
+        multiworld = main(run_args, seed)
+        runs.append(_placements(multiworld))
+        del multiworld
+
+    first, second = runs
+    differences = [f"{args.name[player]}'s {location}: {first.get((player, location))} != "
+                   f"{second.get((player, location))}"
+                   for player, location in sorted(first.keys() | second.keys())
+                   if first.get((player, location)) != second.get((player, location))]
+    if differences:
+        logger.warning(f"Determinism check found {len(differences)} differing placements:\n" +
+                       "\n".join(differences))
+    else:
+        logger.info("Determinism check passed: both runs placed every item identically.")
+    return differences
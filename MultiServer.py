@@ -3,8 +3,10 @@ from __future__ import annotations
 import argparse
 import asyncio
 import collections
+import concurrent.futures
 import contextlib
 import copy
+import dataclasses
 import datetime
 import functools
 import hashlib
@@ -16,6 +18,7 @@ import operator
 import pickle
 import random
 import shlex
+import struct
 import threading
 import time
 import typing
@@ -33,12 +36,7 @@ if typing.TYPE_CHECKING:
 import colorama
 import websockets
 from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
-try:
-    # ponyorm is a requirement for webhost, not default server, so may not be importable
-    from pony.orm.dbapiprovider import OperationalError
-except ImportError:
-    OperationalError = ConnectionError
-
+from websockets.frames import Frame, OP_TEXT
 import NetUtils
 import Utils
 from Utils import version_tuple, restricted_loads, Version, async_start, get_intended_text
@@ -53,7 +51,87 @@ colorama.just_fix_windows_console()
 no_version = Version(0, 0, 0)
 assert isinstance(no_version, tuple)  # assert immutable
 
-server_per_message_deflate_factory = ServerPerMessageDeflateFactory(
+
+
+class SharedCompression:
+    """
+    Messages broadcast to many clients, so they can be compressed once per compression settings instead of once per
+    connection. Entries only have to live until every recipient sent them, and on a miss a message is compressed as
+    usual.
+    """
+    min_size: int = 4096
+    """Shorter messages are merged with other queued messages instead, see Context.write_outbox."""
+    max_messages: int = 64
+    _messages: "collections.OrderedDict[bytes, typing.Dict[typing.Tuple[typing.Any, ...], bytes]]"
+
+    def __init__(self) -> None:
+        self._messages = collections.OrderedDict()
+        self._lock = threading.Lock()  # WebHost runs its rooms in multiple threads
+
+    def add(self, data: bytes) -> None:
+        with self._lock:
+            self._messages[data] = {}
+            while len(self._messages) > self.max_messages:
+                self._messages.popitem(last=False)
+
+    def get(self, data: bytes, wbits: int, compress_settings: typing.Dict[str, typing.Any]) -> typing.Optional[bytes]:
+        """
+        Returns data compressed with a new compressor using wbits and compress_settings,
+        or None if data is not a shared message.
+        """
+        if len(data) < self.min_size:
+            return None
+        with self._lock:
+            compressed_by_settings = self._messages.get(data)
+            if compressed_by_settings is None:
+                return None
+            settings_key = (wbits, *sorted(compress_settings.items()))
+            compressed = compressed_by_settings.get(settings_key)
+        if compressed is None:
+            encoder = zlib.compressobj(wbits=-wbits, **compress_settings)
+            compressed = encoder.compress(data) + encoder.flush(zlib.Z_SYNC_FLUSH)
+            if compressed.endswith(b"\x00\x00\xff\xff"):
+                compressed = compressed[:-4]
+            with self._lock:
+                compressed_by_settings[settings_key] = compressed
+        return compressed
+
+
+shared_compression = SharedCompression()
+
+
+class SharedPerMessageDeflate(PerMessageDeflate):
+    """
+    PerMessageDeflate that sends messages of shared_compression as they were compressed for all connections.
+    That is valid deflate even with context takeover, as a new compressor does not refer to earlier messages. Afterwards
+    the connection's compressor starts over with the message as its dictionary, which is what the client's window ends
+    with, so later messages can still refer to it.
+    """
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode is OP_TEXT and frame.fin:
+            data = shared_compression.get(frame.data, self.local_max_window_bits, self.compress_settings)
+            if data is not None:
+                if not self.local_no_context_takeover:
+                    self.encoder = zlib.compressobj(wbits=-self.local_max_window_bits,
+                                                    zdict=frame.data[-(1 << self.local_max_window_bits):],
+                                                    **self.compress_settings)
+                return dataclasses.replace(frame, rsv1=True, data=data)
+        return super().encode(frame)
+
+
+class SharedServerPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, SharedPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+        )
+
+
+server_per_message_deflate_factory = SharedServerPerMessageDeflateFactory(
     server_max_window_bits=11,
     client_max_window_bits=11,
     compress_settings={"memLevel": 4},
@@ -139,6 +217,175 @@ def get_saving_second(seed_name: str, interval: int = 60) -> int:
     return int(hashlib.sha256(seed_name.encode()).hexdigest(), 16) % interval
 
 
+class SaveMetrics(typing.NamedTuple):
+    """Timings of a single save, in seconds."""
+    snapshot: bool
+    """Whether a full snapshot was written, rather than a journaled delta."""
+    size: int
+    copy_time: float
+    """Time spent copying the state on the event loop."""
+    encode_time: float
+    """Time spent diffing, pickling and compressing, off the event loop."""
+    write_time: float
+
+
+class SaveSnapshot(typing.NamedTuple):
+    """A copy of the savegame taken on the event loop, to be written by Context._write_save."""
+    save_data: typing.Dict[str, typing.Any]
+    changed_stored_data: typing.Set[str]
+    """Datastore keys that were set between the previous snapshot and this one."""
+    copy_time: float
+    """Time spent copying the state on the event loop."""
+
+
+class SaveJournal:
+    """
+    Tracks which parts of a savegame changed since it was last written, so a save can be stored as a full snapshot
+    followed by an append-only journal of deltas, instead of rewriting everything on every autosave.
+
+    Deltas replace whole entries (per slot, per datastore key or per section), so replaying one more than once is
+    harmless. Each snapshot starts a new journal generation and deltas of other generations are ignored on replay.
+    """
+    compact_after: int = 100
+    """Deltas to journal before writing a full snapshot again."""
+    # sections of get_save() that are diffed per key, everything else is compared and journaled as a whole
+    keyed_sections: typing.ClassVar[typing.FrozenSet[str]] = frozenset(
+        {"received_items", "location_checks", "hints", "stored_data", "journal_generation"})
+    _header = struct.Struct("!I")
+
+    def __init__(self) -> None:
+        self.generation = 0
+        self.changed_stored_data: typing.Set[str] = set()
+        """Datastore keys that were set since the last save snapshot was taken."""
+        self._marks: typing.Optional[typing.Dict[str, typing.Any]] = None
+        self._deltas = 0
+        self._journal_size = 0
+        self._snapshot_size = 0
+
+    @classmethod
+    def _get_marks(cls, savedata: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        return {
+            # received items and location checks only ever grow
+            "received_items": {key: len(items) for key, items in savedata["received_items"].items()},
+            "location_checks": {key: len(checks) for key, checks in savedata["location_checks"].items()},
+            "hints": {key: frozenset(hints) for key, hints in savedata["hints"].items()},
+            "sections": copy.deepcopy({key: value for key, value in savedata.items()
+                                       if key not in cls.keyed_sections}),
+        }
+
+    def get_delta(self, savedata: typing.Dict[str, typing.Any], changed_stored_data: typing.AbstractSet[str],
+                  compact: bool = False
+                  ) -> typing.Tuple[typing.Optional[typing.Dict[str, typing.Any]], typing.Dict[str, typing.Any]]:
+        """
+        Returns the delta to journal for savedata, and the marks to pass to delta_written once it is stored.
+        changed_stored_data are the datastore keys set since the previous savedata was copied.
+        Returns None instead of a delta when a full snapshot should be written, in which case savedata is tagged with
+        the new generation and the marks should be passed to snapshot_written.
+        """
+        marks = self._get_marks(savedata)
+        old_marks = self._marks
+        if compact or old_marks is None or self._deltas >= self.compact_after or \
+                self._journal_size > self._snapshot_size:
+            savedata["journal_generation"] = self.generation + 1
+            return None, marks
+
+        received_items: typing.Dict[typing.Any, typing.Tuple[int, typing.List[NetworkItem]]] = {}
+        for key, count in marks["received_items"].items():
+            start = old_marks["received_items"].get(key, 0)
+            if count != start:
+                start = min(start, count)
+                received_items[key] = start, savedata["received_items"][key][start:]
+        stored_data = savedata["stored_data"]
+        delta = {
+            "generation": self.generation,
+            "received_items": received_items,
+            "location_checks": {key: set(savedata["location_checks"][key])
+                                for key, count in marks["location_checks"].items()
+                                if old_marks["location_checks"].get(key) != count},
+            "hints": {key: set(hints) for key, hints in marks["hints"].items()
+                      if old_marks["hints"].get(key) != hints},
+            "stored_data": {key: stored_data[key] for key in changed_stored_data if key in stored_data},
+            "sections": {key: value for key, value in marks["sections"].items()
+                         if key not in old_marks["sections"] or old_marks["sections"][key] != value},
+        }
+        return delta, marks
+
+    def snapshot_written(self, marks: typing.Dict[str, typing.Any], size: int) -> None:
+        self.generation += 1
+        self._marks = marks
+        self._deltas = 0
+        self._journal_size = 0
+        self._snapshot_size = size
+
+    def delta_written(self, marks: typing.Dict[str, typing.Any], size: int) -> None:
+        self._marks = marks
+        self._deltas += 1
+        self._journal_size += size
+
+    def reset(self) -> None:
+        """Forget what was written, so the next save is a full snapshot."""
+        self._marks = None
+
+    @classmethod
+    def encode(cls, delta: typing.Dict[str, typing.Any]) -> bytes:
+        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+        data = zlib.compress(pickle.dumps(delta))
+        return cls._header.pack(len(data)) + data
+
+    @classmethod
+    def replay(cls, savedata: typing.Dict[str, typing.Any], journal: bytes) -> int:
+        """Applies the deltas of savedata's generation in the encoded journal to savedata. Returns how many applied."""
+        applied = 0
+        generation = savedata.get("journal_generation", 0)
+        offset = 0
+        while offset + cls._header.size <= len(journal):
+            size, = cls._header.unpack_from(journal, offset)
+            offset += cls._header.size
+            if offset + size > len(journal):
+                break  # partially written delta, e.g. from a crash during save
+            delta = restricted_loads(zlib.decompress(journal[offset:offset + size]))
+            offset += size
+            if delta["generation"] != generation:
+                continue
+
+            for key, (start, items) in delta["received_items"].items():
+                received_items = savedata["received_items"].setdefault(key, [])
+                del received_items[start:]
+                received_items.extend(items)
+            savedata["location_checks"].update(delta["location_checks"])
+            savedata["hints"].update(delta["hints"])
+            savedata.setdefault("stored_data", {}).update(delta["stored_data"])
+            savedata.update(delta["sections"])
+            applied += 1
+        return applied
+
+
+class DataPackageFragments(Utils.SizedLRUCache[typing.Tuple[typing.Callable[[typing.Any], str], str], str]):
+    """
+    Least recently used cache of encoded game data packages by dumper and checksum, shared by all contexts in the
+    process, so DataPackage responses can be assembled without encoding the same name tables for every client again.
+    Packages with the same checksum have the same contents, so cached fragments never go stale.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__(max_size, len)
+
+    def get(self, game_package: typing.Dict[str, typing.Any], dumper: typing.Callable[[typing.Any], str]) -> str:
+        """Returns game_package encoded with dumper. Packages without a checksum are encoded on every call."""
+        checksum = game_package.get("checksum")
+        if checksum is None:
+            return dumper(game_package)
+        return self.get_or_load((dumper, checksum), lambda: dumper(game_package))
+
+
+data_package_fragments = DataPackageFragments(64 * 1024 * 1024)
+
+
+class SharedMsg(typing.NamedTuple):
+    """An encoded message in a Client's outbox that was added to shared_compression, so it is sent on its own."""
+    msg: str
+
+
 class Client(Endpoint):
     __slots__ = (
         "__weakref__",
@@ -155,6 +402,9 @@ class Client(Endpoint):
         "no_items",
         "no_locations",
         "no_text",
+        "outbox",
+        "outbox_size",
+        "writing",
     )
 
     version: Version
@@ -170,6 +420,10 @@ class Client(Endpoint):
     no_items: bool
     no_locations: bool
     no_text: bool
+    outbox: collections.deque[str | SharedMsg | dict[str, typing.Any]]
+    """encoded messages and pending RoomUpdate packets, waiting to be written by Context.write_outbox"""
+    outbox_size: int
+    writing: bool
 
     def __init__(self, socket: "ServerConnection", ctx: Context) -> None:
         super().__init__(socket)
@@ -186,6 +440,9 @@ class Client(Endpoint):
         self.no_items = False
         self.no_locations = False
         self.no_text = False
+        self.outbox = collections.deque()
+        self.outbox_size = 0
+        self.writing = False
 
     @property
     def items_handling(self):
@@ -215,6 +472,10 @@ team_slot = typing.Tuple[int, int]
 class Context:
     dumper = staticmethod(encode)
     loader = staticmethod(decode)
+    max_frame_size: int = 64 * 1024
+    """Queued messages are merged into frames up to this length, close to the compression window."""
+    max_outbox_size: int = 32 * 1024 * 1024
+    """Clients that fall behind by more than this are disconnected, instead of buffering without limit."""
 
     simple_options = {"hint_cost": int,
                       "location_check_points": int,
@@ -261,6 +522,12 @@ class Context:
         self.log_network = log_network
         self.endpoints = []
         self.clients = {}
+        # (team, tag/game/slot) -> authenticated clients, for routing Bounce
+        self.tag_clients: typing.Dict[typing.Tuple[int, str], typing.Set[Client]] = collections.defaultdict(set)
+        self.game_clients: typing.Dict[typing.Tuple[int, str], typing.Set[Client]] = collections.defaultdict(set)
+        self.slot_clients: typing.Dict[team_slot, typing.Set[Client]] = collections.defaultdict(set)
+        self.slots_with_new_items: typing.Set[team_slot] = set()
+        """(team, slot)s that received items since send_new_items last ran"""
         self.compatibility: int = compatibility
         self.shutdown_task = None
         self.data_filename = None
@@ -284,6 +551,15 @@ class Context:
         self.location_check_points = location_check_points
         self.hints_used = collections.defaultdict(int)
         self.hints: typing.Dict[team_slot, typing.Set[Hint]] = collections.defaultdict(set)
+        # (team, finding player, location) -> slots whose hints may contain an unfound hint for that location
+        self.hinted_locations: typing.Dict[typing.Tuple[int, int, int], typing.Set[int]] = \
+            collections.defaultdict(set)
+        # encoded parts of Connected, reused until what they encode changes
+        self.players_fragment: typing.Optional[str] = None
+        self.slot_info_fragment: typing.Optional[str] = None
+        self.slot_data_fragments: typing.Dict[int, str] = {}
+        self.checks_fragments: typing.Dict[team_slot, str] = {}
+        """missing_locations and checked_locations of (team, slot), dropped when its checks change"""
         self.release_mode: str = release_mode
         self.remaining_mode: str = remaining_mode
         self.collect_mode: str = collect_mode
@@ -303,6 +579,13 @@ class Context:
         self.auto_save_interval = 60  # in seconds
         self.auto_saver_thread: typing.Optional[threading.Thread] = None
         self.save_dirty = False
+        self.save_journal = SaveJournal()
+        self.save_loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self.save_requested = threading.Event()
+        self.pending_save: typing.Optional[typing.Tuple[SaveSnapshot, concurrent.futures.Future]] = None
+        self.save_lock = threading.Lock()  # the exit save can run while the saving thread is still writing
+        self.pending_save_lock = threading.Lock()
+        self.save_metrics: typing.Deque[SaveMetrics] = collections.deque(maxlen=100)
         self.tags = ['AP']
         self.games: typing.Dict[int, str] = {}
         self.minimum_client_versions: typing.Dict[int, Version] = {}
@@ -367,6 +650,12 @@ class Context:
             self.item_names[game].update(archipelago_item_names)
             self.location_names[game].update(archipelago_location_names)
 
+    def get_data_package_msg(self, games: typing.Iterable[str]) -> str:
+        """Returns the encoded DataPackage message for games, assembled from shared, already encoded packages."""
+        fragments = ",".join(f"{self.dumper(game)}:{data_package_fragments.get(self.gamespackage[game], self.dumper)}"
+                             for game in games)
+        return '[{"cmd":"DataPackage","data":{"games":{' + fragments + '}}}]'
+
     def item_names_for_game(self, game: str) -> typing.Optional[typing.Dict[str, int]]:
         return self.gamespackage[game]["item_name_to_id"] if game in self.gamespackage else None
 
@@ -374,49 +663,114 @@ class Context:
         return self.gamespackage[game]["location_name_to_id"] if game in self.gamespackage else None
 
     # General networking
-    async def send_msgs(self, endpoint: Endpoint, msgs: typing.Iterable[dict]) -> bool:
-        if not endpoint.socket or not endpoint.socket.open:
-            return False
-        msg = self.dumper(msgs)
-        try:
-            await endpoint.socket.send(msg)
-        except websockets.ConnectionClosed:
-            self.logger.exception(f"Exception during send_msgs, could not send {msg}")
-            await self.disconnect(endpoint)
-            return False
-        else:
-            if self.log_network:
-                self.logger.info(f"Outgoing message: {msg}")
-            return True
+    # Everything sent to a client goes through its outbox, which a single writer task per client drains. Messages
+    # queued while the writer is busy, or within the same event loop iteration, are merged into one frame.
+    async def send_msgs(self, endpoint: Client, msgs: typing.Iterable[dict]) -> bool:
+        return self.queue_encoded_msgs(endpoint, self.dumper(msgs))
+
+    async def send_encoded_msgs(self, endpoint: Client, msg: str) -> bool:
+        return self.queue_encoded_msgs(endpoint, msg)
+
+    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Client], msg: str) -> bool:
+        return self.queue_broadcast(endpoints, msg)
+
+    def queue_broadcast(self, endpoints: typing.Iterable[Client], msg: str) -> bool:
+        """Queues msg for all of endpoints. Long messages are compressed once for all of them, see SharedCompression."""
+        endpoints = list(endpoints)
+        queued_msg: str | SharedMsg = msg
+        if len(endpoints) > 1 and len(msg) >= shared_compression.min_size:
+            shared_compression.add(msg.encode())
+            queued_msg = SharedMsg(msg)
+        queued = False
+        for endpoint in endpoints:
+            queued |= self.queue_encoded_msgs(endpoint, queued_msg)
+        return queued
 
-    async def send_encoded_msgs(self, endpoint: Endpoint, msg: str) -> bool:
+    def queue_encoded_msgs(self, endpoint: Client, msg: str | SharedMsg) -> bool:
+        """Queues msg, an encoded list of packets, to be sent to endpoint. Returns False if it is not connected."""
         if not endpoint.socket or not endpoint.socket.open:
             return False
-        try:
-            await endpoint.socket.send(msg)
-        except websockets.ConnectionClosed:
-            self.logger.exception("Exception during send_encoded_msgs")
-            await self.disconnect(endpoint)
+        if endpoint.outbox_size + len(msg.msg if isinstance(msg, SharedMsg) else msg) > self.max_outbox_size:
+            self.logger.warning(f"Disconnecting client of team {endpoint.team} slot {endpoint.slot}, "
+                                f"as it is not receiving messages as fast as they are sent.")
+            endpoint.outbox.clear()
+            endpoint.outbox_size = 0
+            async_start(endpoint.socket.close(1013, "Falling behind"))
             return False
-        else:
-            if self.log_network:
-                self.logger.info(f"Outgoing message: {msg}")
-            return True
+        endpoint.outbox.append(msg)
+        endpoint.outbox_size += len(msg.msg if isinstance(msg, SharedMsg) else msg)
+        self._start_writing(endpoint)
+        return True
 
-    async def broadcast_send_encoded_msgs(self, endpoints: typing.Iterable[Endpoint], msg: str) -> bool:
-        sockets = []
+    def queue_room_update(self, endpoints: typing.Iterable[Client], update: typing.Dict[str, typing.Any]) -> None:
+        """
+        Queues a RoomUpdate packet for endpoints. Consecutive RoomUpdates that were not written yet are merged,
+        where the checked_locations of both are combined and other keys of the later one replace the earlier one.
+        """
+        checked_locations = set(update["checked_locations"]) if "checked_locations" in update else None
         for endpoint in endpoints:
-            if endpoint.socket and endpoint.socket.open:
-                sockets.append(endpoint.socket)
+            if not endpoint.socket or not endpoint.socket.open:
+                continue
+            pending = endpoint.outbox[-1] if endpoint.outbox else None
+            if not isinstance(pending, dict):
+                pending = {"cmd": "RoomUpdate"}
+                endpoint.outbox.append(pending)
+                self._start_writing(endpoint)
+            pending_checked_locations = pending.get("checked_locations", set())
+            pending.update(update)
+            if checked_locations is not None:
+                pending["checked_locations"] = pending_checked_locations | checked_locations
+
+    def _start_writing(self, endpoint: Client) -> None:
+        if not endpoint.writing:
+            endpoint.writing = True
+            async_start(self.write_outbox(endpoint))
+
+    async def write_outbox(self, endpoint: Client) -> None:
+        """Sends the messages queued for endpoint until there are none left, merging them into as few frames as fit."""
         try:
-            websockets.broadcast(sockets, msg)
-        except RuntimeError:
-            self.logger.exception("Exception during broadcast_send_encoded_msgs")
-            return False
-        else:
-            if self.log_network:
-                self.logger.info(f"Outgoing broadcast: {msg}")
-            return True
+            while endpoint.outbox and endpoint.socket.open:
+                frame = self._next_frame(endpoint)
+                if not frame:
+                    continue
+                try:
+                    await endpoint.socket.send(frame)
+                except websockets.ConnectionClosed:
+                    self.logger.exception("Exception during write_outbox")
+                    endpoint.outbox.clear()
+                    endpoint.outbox_size = 0
+                    await self.disconnect(endpoint)
+                    return
+                if self.log_network:
+                    self.logger.info(f"Outgoing message: {frame}")
+        finally:
+            endpoint.writing = False
+            if not endpoint.socket.open:
+                endpoint.outbox.clear()
+                endpoint.outbox_size = 0
+
+    def _next_frame(self, endpoint: Client) -> str:
+        """Takes the next frame from endpoint's outbox, either a shared message or as many other messages as fit."""
+        if isinstance(endpoint.outbox[0], SharedMsg):
+            msg = endpoint.outbox.popleft().msg
+            endpoint.outbox_size -= len(msg)
+            return msg
+        parts: typing.List[str] = []
+        size = 0
+        while endpoint.outbox:
+            msg = endpoint.outbox[0]
+            if isinstance(msg, SharedMsg):
+                break
+            if isinstance(msg, dict):
+                msg = self.dumper([msg])
+            if parts and size + len(msg) > self.max_frame_size:
+                break
+            if isinstance(endpoint.outbox.popleft(), str):
+                endpoint.outbox_size -= len(msg)
+            if len(msg) > 2:  # skip empty lists
+                parts.append(msg[1:-1])
+                size += len(msg)
+        return f"[{','.join(parts)}]" if parts else ""
 
     def broadcast_all(self, msgs: typing.List[dict]):
         msg_is_text = all(msg["cmd"] == "PrintJSON" for msg in msgs)
@@ -426,7 +780,7 @@ class Context:
             for endpoint in self.endpoints
             if endpoint.auth and not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        self.queue_broadcast(endpoints, data)
 
     def broadcast_text_all(self, text: str, additional_arguments: dict = {}):
         self.logger.info("Notice (all): %s" % text)
@@ -440,15 +794,45 @@ class Context:
             for endpoint in itertools.chain.from_iterable(self.clients[team].values())
             if not (msg_is_text and endpoint.no_text)
         )
-        async_start(self.broadcast_send_encoded_msgs(endpoints, data))
+        self.queue_broadcast(endpoints, data)
 
     def broadcast(self, endpoints: typing.Iterable[Client], msgs: typing.List[dict]):
-        msgs = self.dumper(msgs)
-        async_start(self.broadcast_send_encoded_msgs(endpoints, msgs))
+        self.queue_broadcast(endpoints, self.dumper(msgs))
+
+    def index_client(self, client: Client) -> None:
+        """Registers client under its current team, slot, game and tags, so Bounce can find it."""
+        self.slot_clients[client.team, client.slot].add(client)
+        self.game_clients[client.team, self.games[client.slot]].add(client)
+        for tag in client.tags:
+            self.tag_clients[client.team, tag].add(client)
+
+    def unindex_client(self, client: Client) -> None:
+        """Reverts index_client, has to be called before client's team, slot or tags change."""
+        keys = [(self.slot_clients, client.slot), (self.game_clients, self.games.get(client.slot))]
+        keys.extend((self.tag_clients, tag) for tag in client.tags)
+        for index, key in keys:
+            clients = index.get((client.team, key))
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del index[client.team, key]
+
+    def get_bounce_targets(self, team: int, games: typing.Iterable[str], tags: typing.Iterable[str],
+                           slots: typing.Iterable[int]) -> typing.Set[Client]:
+        """Returns the clients of team that play one of games, have one of tags or are connected to one of slots."""
+        targets: typing.Set[Client] = set()
+        for index, keys in ((self.game_clients, games), (self.tag_clients, tags), (self.slot_clients, slots)):
+            for key in keys:
+                clients = index.get((team, key))
+                if clients:
+                    targets |= clients
+        return targets
 
     async def disconnect(self, endpoint: Client):
         if endpoint in self.endpoints:
             self.endpoints.remove(endpoint)
+        if endpoint.team is not None:
+            self.unindex_client(endpoint)
         if endpoint.slot and endpoint in self.clients[endpoint.team][endpoint.slot]:
             self.clients[endpoint.team][endpoint.slot].remove(endpoint)
         await on_client_disconnected(self, endpoint)
@@ -457,14 +841,14 @@ class Context:
         if not client.auth or client.no_text:
             return
         self.logger.info("Notice (Player %s in team %d): %s" % (client.name, client.team + 1, text))
-        async_start(self.send_msgs(client, [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}]))
+        self.queue_encoded_msgs(client, self.dumper([{"cmd": "PrintJSON", "data": [{ "text": text }],
+                                                      **additional_arguments}]))
 
     def notify_client_multiple(self, client: Client, texts: typing.List[str], additional_arguments: dict = {}):
         if not client.auth or client.no_text:
             return
-        async_start(self.send_msgs(client,
-                                   [{"cmd": "PrintJSON", "data": [{ "text": text }], **additional_arguments}
-                                    for text in texts]))
+        self.queue_encoded_msgs(client, self.dumper([{"cmd": "PrintJSON", "data": [{ "text": text }],
+                                                      **additional_arguments} for text in texts]))
 
     # loading
     def load(self, multidatapath: str, use_embedded_server_options: bool = False):
@@ -535,6 +919,9 @@ class Context:
         self.connect_names = decoded_obj['connect_names']
         self.locations = LocationStore(decoded_obj.pop("locations"))  # pre-emptively free memory
         self.slot_data = decoded_obj['slot_data']
+        self.players_fragment = None
+        self.slot_info_fragment = None
+        self.slot_data_fragments.clear()
         for slot, data in self.slot_data.items():
             self.read_data[f"slot_data_{slot}"] = lambda data=data: data
         self.er_hint_data = {int(player): {int(address): name for address, name in loc_data.items()}
@@ -546,6 +933,7 @@ class Context:
 
         for slot, hints in decoded_obj["precollected_hints"].items():
             self.hints[0, slot].update(hints)
+            self.index_hints(0, slot, hints)
 
         # declare slots that aren't players as done
         for slot, slot_info in self.slot_info.items():
@@ -590,17 +978,134 @@ class Context:
 
         return False
 
+    def save_now(self) -> concurrent.futures.Future:
+        """
+        Saves right away, or hands a copy to the saving thread if it runs. The returned future is done once the save
+        is written, with whether saving succeeded.
+        """
+        if self.auto_saver_thread and self.auto_saver_thread.is_alive():
+            # copy now, but leave serializing and writing to the saving thread
+            # a save that is still waiting is written as part of this one, and reports through the same future
+            snapshot, written = self._replace_pending_save(self.take_save_snapshot())
+            if not written:
+                written = concurrent.futures.Future()
+            with self.pending_save_lock:
+                self.pending_save = snapshot, written
+            self.save_requested.set()
+            return written
+        written = concurrent.futures.Future()
+        written.set_result(self._save())
+        return written
+
+    def _replace_pending_save(self, snapshot: SaveSnapshot
+                              ) -> typing.Tuple[SaveSnapshot, typing.Optional[concurrent.futures.Future]]:
+        """
+        Takes the save waiting for the saving thread, if any, to write snapshot in its place.
+        Returns snapshot with the changed datastore keys of the replaced save added, and the future of the replaced save,
+        which has to be resolved once snapshot is written.
+        """
+        with self.pending_save_lock:
+            pending_save, self.pending_save = self.pending_save, None
+        if not pending_save:
+            return snapshot, None
+        replaced, written = pending_save
+        return snapshot._replace(changed_stored_data=replaced.changed_stored_data | snapshot.changed_stored_data), written
+
+    def take_save_snapshot(self) -> SaveSnapshot:
+        """
+        Returns get_save() with its mutable containers copied, so it can be serialized while the server keeps
+        running, together with the datastore keys set since the previous snapshot. Has to run on the event loop, as it
+        rechecks hints and datastore keys are marked as changed there.
+        """
+        start = time.perf_counter()
+        save_data = self.get_save()
+        save_data["received_items"] = {key: items.copy() for key, items in save_data["received_items"].items()}
+        save_data["location_checks"] = {key: checks.copy() for key, checks in save_data["location_checks"].items()}
+        save_data["hints"] = {key: hints.copy() for key, hints in save_data["hints"].items()}
+        save_data["group_collected"] = {key: slots.copy() for key, slots in save_data["group_collected"].items()}
+        save_data["name_aliases"] = save_data["name_aliases"].copy()
+        # Set replaces values instead of modifying them, so a shallow copy is enough
+        save_data["stored_data"] = save_data["stored_data"].copy()
+        changed_stored_data, self.save_journal.changed_stored_data = self.save_journal.changed_stored_data, set()
+        return SaveSnapshot(save_data, changed_stored_data, time.perf_counter() - start)
+
+    def _take_save_snapshot_from_loop(self) -> typing.Optional[SaveSnapshot]:
+        loop = self.save_loop
+        if not loop or not loop.is_running():
+            return self.take_save_snapshot()
+
+        async def snapshot() -> SaveSnapshot:
+            return self.take_save_snapshot()
+
+        try:
+            return asyncio.run_coroutine_threadsafe(snapshot(), loop).result(self.auto_save_interval)
+        except concurrent.futures.TimeoutError:
+            # the snapshot may still be taken later and take the changed datastore keys with it
+            with self.save_lock:
+                self.save_journal.reset()
+            return None
+
     def _save(self, exit_save: bool = False) -> bool:
+        written: typing.Optional[concurrent.futures.Future] = None
         try:
-            # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
-            encoded_save = pickle.dumps(self.get_save())
-            with open(self.save_filename, "wb") as f:
-                f.write(zlib.compress(encoded_save))
+            snapshot, written = self._replace_pending_save(self.take_save_snapshot())
+            self._write_save(snapshot, exit_save)
         except Exception as e:
             self.logger.exception(e)
-            return False
+            success = False
         else:
-            return True
+            success = True
+        if written:
+            written.set_result(success)
+        return success
+
+    def _write_save(self, snapshot: SaveSnapshot, exit_save: bool = False) -> None:
+        """
+        Journals or snapshots a copy made by take_save_snapshot. Safe to call off the event loop, concurrent calls
+        are written one after another.
+        """
+        save_data = snapshot.save_data
+        with self.save_lock:
+            try:
+                start = time.perf_counter()
+                delta, marks = self.save_journal.get_delta(save_data, snapshot.changed_stored_data, compact=exit_save)
+                # zlib releases the GIL while compressing
+                encoded = self._encode_save(save_data) if delta is None else SaveJournal.encode(delta)
+                encoded_time = time.perf_counter()
+                self._store_save(encoded, delta is None, exit_save, save_data)
+            except BaseException:
+                self.save_journal.reset()
+                raise
+
+            if delta is None:
+                self.save_journal.snapshot_written(marks, len(encoded))
+            else:
+                self.save_journal.delta_written(marks, len(encoded))
+        metrics = SaveMetrics(delta is None, len(encoded), snapshot.copy_time, encoded_time - start,
+                              time.perf_counter() - encoded_time)
+        self.save_metrics.append(metrics)
+        self.logger.debug(f"Saved {'snapshot' if metrics.snapshot else 'delta'} of {metrics.size} bytes: "
+                          f"copy {metrics.copy_time * 1000:.1f}ms, encode {metrics.encode_time * 1000:.1f}ms, "
+                          f"write {metrics.write_time * 1000:.1f}ms")
+
+    def _encode_save(self, save_data: dict) -> bytes:
+        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+        return zlib.compress(pickle.dumps(save_data))
+
+    def _store_save(self, data: bytes, snapshot: bool, exit_save: bool, save_data: dict) -> None:
+        """Writes an encoded full snapshot, or appends an encoded delta to the journal, both made from save_data."""
+        if snapshot:
+            with open(self.save_filename, "wb") as f:
+                f.write(data)
+            with open(self.save_journal_filename, "wb"):
+                pass  # deltas of the previous generation are now part of the snapshot
+        else:
+            with open(self.save_journal_filename, "ab") as f:
+                f.write(data)
+
+    @property
+    def save_journal_filename(self) -> str:
+        return self.save_filename + ".journal"
 
     def init_save(self, enabled: bool = True):
         self.saving = enabled
@@ -613,7 +1118,12 @@ class Context:
             try:
                 with open(self.save_filename, 'rb') as f:
                     save_data = restricted_loads(zlib.decompress(f.read()))
-                    self.set_save(save_data)
+                try:
+                    with open(self.save_journal_filename, 'rb') as f:
+                        SaveJournal.replay(save_data, f.read())
+                except FileNotFoundError:
+                    pass
+                self.set_save(save_data)
             except FileNotFoundError:
                 self.logger.error('No save data found, starting a new game')
             except Exception as e:
@@ -622,6 +1132,11 @@ class Context:
 
     def _start_async_saving(self, atexit_save: bool = True):
         if not self.auto_saver_thread:
+            try:
+                self.save_loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.save_loop = None
+
             def save_regularly():
                 # time.time() is platform dependent, so using the expensive datetime method instead
                 def get_datetime_second():
@@ -630,17 +1145,33 @@ class Context:
 
                 second = get_saving_second(self.seed_name, self.auto_save_interval)
                 while not self.exit_event.is_set():
+                    next_wakeup = (second - get_datetime_second()) % self.auto_save_interval
+                    self.save_requested.wait(max(1.0, next_wakeup))
+                    self.save_requested.clear()
+                    with self.pending_save_lock:
+                        pending_save, self.pending_save = self.pending_save, None
                     try:
-                        next_wakeup = (second - get_datetime_second()) % self.auto_save_interval
-                        time.sleep(max(1.0, next_wakeup))
-                        if self.save_dirty:
+                        if pending_save:
+                            snapshot, written = pending_save
+                            try:
+                                self._write_save(snapshot)
+                            except Exception as e:
+                                written.set_exception(e)
+                                raise
+                            written.set_result(True)
+                        elif self.save_dirty:
                             self.logger.debug("Saving via thread.")
-                            self._save()
-                    except OperationalError as e:
+                            self.save_dirty = False
+                            snapshot = self._take_save_snapshot_from_loop()
+                            if snapshot:
+                                self._write_save(snapshot)
+                            else:
+                                self.save_dirty = True
+                                self.logger.info(f"Saving timed out. Retry in {self.auto_save_interval} seconds.")
+                    except Exception as e:
+                        self.save_dirty = True
                         self.logger.exception(e)
                         self.logger.info(f"Saving failed. Retry in {self.auto_save_interval} seconds.")
-                    else:
-                        self.save_dirty = False
                 if not atexit_save:  # if atexit is used, that keeps a reference anyway
                     queue_gc()
 
@@ -686,10 +1217,14 @@ class Context:
         if savedata["version"] > self.save_version:
             raise Exception("This savegame is newer than the server.")
         self.received_items = savedata["received_items"]
+        self.save_journal.generation = savedata.get("journal_generation", 0)
         self.hints_used.update(savedata["hints_used"])
         self.hints.update(savedata["hints"])
+        for (team, slot), hints in savedata["hints"].items():
+            self.index_hints(team, slot, hints)
 
         self.name_aliases.update(savedata["name_aliases"])
+        self.players_fragment = None
         self.client_game_state.update(savedata["client_game_state"])
         self.client_connection_timers.update(
             {tuple(key): datetime.datetime.fromtimestamp(value, datetime.timezone.utc) for key, value
@@ -698,6 +1233,7 @@ class Context:
             {tuple(key): datetime.datetime.fromtimestamp(value, datetime.timezone.utc) for key, value
              in savedata["client_activity_timers"]})
         self.location_checks.update(savedata["location_checks"])
+        self.checks_fragments.clear()
         self.random.setstate(savedata["random_state"])
 
         if "game_options" in savedata:
@@ -753,6 +1289,30 @@ class Context:
                         self.replace_hint(hint_team, player, hint, new_hint)
             self.hints[hint_team, hint_slot] = new_hints
 
+    def recheck_location_hints(self, team: int, finding_player: int, locations: typing.Iterable[int],
+                               changed: typing.Optional[typing.Set[team_slot]] = None) -> None:
+        """Refreshes only the hints for the given locations of finding_player, which have just been checked.
+        If a set is passed for 'changed', each (team,slot) pair that has at least one hint modified will be added to
+        the set.
+        """
+        for location in locations:
+            # once checked, hints for this location are found and don't need rechecking anymore
+            for hint_slot in self.hinted_locations.pop((team, finding_player, location), ()):
+                for hint in [hint for hint in self.hints[team, hint_slot]
+                             if hint.finding_player == finding_player and hint.location == location]:
+                    new_hint = hint.re_check(self, team)
+                    if hint == new_hint:
+                        continue
+                    self.replace_hint(team, hint_slot, hint, new_hint)
+                    if changed is not None:
+                        changed.add((team, hint_slot))
+
+    def index_hints(self, team: int, slot: int, hints: typing.Iterable[Hint]) -> None:
+        """Registers hints added to the hints of team and slot, so recheck_location_hints can find them."""
+        for hint in hints:
+            if not hint.found:
+                self.hinted_locations[team, hint.finding_player, hint.location].add(slot)
+
     def get_rechecked_hints(self, team: int, slot: int):
         self.recheck_hints(team, slot)
         return self.hints[team, slot]
@@ -770,6 +1330,30 @@ class Context:
     def get_players_package(self):
         return [NetworkPlayer(t, p, self.get_aliased_name(t, p), n) for (t, p), n in self.player_names.items()]
 
+    def get_players_fragment(self) -> str:
+        """Returns get_players_package encoded, has to be reset through players_fragment when aliases change."""
+        if self.players_fragment is None:
+            self.players_fragment = self.dumper(self.get_players_package())
+        return self.players_fragment
+
+    def get_connected_msg(self, team: int, slot: int, slot_data: bool) -> str:
+        """Returns the encoded Connected packet of team and slot, assembled from already encoded parts."""
+        checks = self.checks_fragments.get((team, slot))
+        if checks is None:
+            checks = self.checks_fragments[team, slot] = \
+                f'"missing_locations":{self.dumper(get_missing_checks(self, team, slot))},' \
+                f'"checked_locations":{self.dumper(get_checked_checks(self, team, slot))}'
+        if self.slot_info_fragment is None:
+            self.slot_info_fragment = self.dumper(self.slot_info)
+        msg = f'{{"cmd":"Connected","team":{team},"slot":{slot},"players":{self.get_players_fragment()},' \
+              f'{checks},"slot_info":{self.slot_info_fragment},"hint_points":{get_slot_points(self, team, slot)}'
+        if slot_data:
+            fragment = self.slot_data_fragments.get(slot)
+            if fragment is None:
+                fragment = self.slot_data_fragments[slot] = self.dumper(self.slot_data[slot])
+            msg += f',"slot_data":{fragment}'
+        return msg + "}"
+
     def slot_set(self, slot) -> typing.Set[int]:
         """Returns the slot IDs that concern that slot,
         as in expands groups out and returns back the input for solo."""
@@ -823,9 +1407,11 @@ class Context:
                 # we can check once if hint already exists
                 if hint not in self.hints[team, hint.finding_player]:
                     self.hints[team, hint.finding_player].add(hint)
+                    self.index_hints(team, hint.finding_player, (hint,))
                     new_hint_events.add(hint.finding_player)
                     for player in self.slot_set(hint.receiving_player):
                         self.hints[team, player].add(hint)
+                        self.index_hints(team, player, (hint,))
                         new_hint_events.add(player)
 
             self.logger.info("Notice (Team #%d): %s" % (team + 1, format_hint(self, team, hint)))
@@ -837,8 +1423,9 @@ class Context:
                 if not clients:
                     continue
                 client_hints = [datum[1] for datum in sorted(hint_data, key=lambda x: x[0].finding_player != slot)]
+                msg = self.dumper(client_hints)
                 for client in clients:
-                    async_start(self.send_msgs(client, client_hints))
+                    self.queue_encoded_msgs(client, msg)
 
     def get_hint(self, team: int, finding_player: int, seeked_location: int) -> typing.Optional[Hint]:
         for hint in self.hints[team, finding_player]:
@@ -865,10 +1452,7 @@ class Context:
 
     def on_new_hint(self, team: int, slot: int):
         self.on_changed_hints(team, slot)
-        self.broadcast(self.clients[team][slot], [{
-            "cmd": "RoomUpdate",
-            "hint_points": get_slot_points(self, team, slot)
-        }])
+        self.queue_room_update(self.clients[team][slot], {"hint_points": get_slot_points(self, team, slot)})
 
     def on_changed_hints(self, team: int, slot: int):
         key: str = f"_read_hints_{team}_{slot}"
@@ -884,12 +1468,10 @@ class Context:
 
 
 def update_aliases(ctx: Context, team: int):
-    cmd = ctx.dumper([{"cmd": "RoomUpdate",
-                       "players": ctx.get_players_package()}])
+    ctx.players_fragment = None
+    cmd = f'[{{"cmd":"RoomUpdate","players":{ctx.get_players_fragment()}}}]'
 
-    for clients in ctx.clients[team].values():
-        for client in clients:
-            async_start(ctx.send_encoded_msgs(client, cmd))
+    ctx.queue_broadcast(itertools.chain.from_iterable(ctx.clients[team].values()), cmd)
 
 
 async def server(websocket: "ServerConnection", path: str = "/", ctx: Context = None) -> None:
@@ -1066,25 +1648,25 @@ def get_start_inventory(ctx: Context, player: int, remote_start_inventory: bool)
 
 
 def send_new_items(ctx: Context):
-    for team, clients in ctx.clients.items():
-        for slot, clients in clients.items():
-            for client in clients:
-                if client.no_items:
-                    continue
-                start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
-                items = get_received_items(ctx, team, slot, client.remote_items)
-                if len(start_inventory) + len(items) > client.send_index:
-                    first_new_item = max(0, client.send_index - len(start_inventory))
-                    async_start(ctx.send_msgs(client, [{
-                        "cmd": "ReceivedItems",
-                        "index": client.send_index,
-                        "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
-                    client.send_index = len(start_inventory) + len(items)
+    """Sends items to the clients of slots that received items since the last call."""
+    slots, ctx.slots_with_new_items = ctx.slots_with_new_items, set()
+    for team, slot in slots:
+        for client in ctx.clients.get(team, {}).get(slot, ()):
+            if client.no_items:
+                continue
+            start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
+            items = get_received_items(ctx, team, slot, client.remote_items)
+            if len(start_inventory) + len(items) > client.send_index:
+                first_new_item = max(0, client.send_index - len(start_inventory))
+                ctx.queue_encoded_msgs(client, ctx.dumper([{
+                    "cmd": "ReceivedItems",
+                    "index": client.send_index,
+                    "items": start_inventory[client.send_index:] + items[first_new_item:]}]))
+                client.send_index = len(start_inventory) + len(items)
 
 
 def update_checked_locations(ctx: Context, team: int, slot: int):
-    ctx.broadcast(ctx.clients[team][slot],
-                  [{"cmd": "RoomUpdate", "checked_locations": get_checked_checks(ctx, team, slot)}])
+    ctx.queue_room_update(ctx.clients[team][slot], {"checked_locations": get_checked_checks(ctx, team, slot)})
 
 
 def release_player(ctx: Context, team: int, slot: int):
@@ -1127,6 +1709,7 @@ def send_items_to(ctx: Context, team: int, target_slot: int, *items: NetworkItem
             if item.player != target_slot:
                 get_received_items(ctx, team, target, False).append(item)
             get_received_items(ctx, team, target, True).append(item)
+        ctx.slots_with_new_items.add((team, target))
 
 
 def register_location_checks(ctx: Context, team: int, slot: int, locations: typing.Iterable[int],
@@ -1164,14 +1747,14 @@ def register_location_checks(ctx: Context, team: int, slot: int, locations: typi
         del sortable
 
         ctx.location_checks[team, slot] |= new_locations
+        ctx.checks_fragments.pop((team, slot), None)
         send_new_items(ctx)
-        ctx.broadcast(ctx.clients[team][slot], [{
-            "cmd": "RoomUpdate",
+        ctx.queue_room_update(ctx.clients[team][slot], {
             "hint_points": get_slot_points(ctx, team, slot),
             "checked_locations": new_locations,  # send back new checks only
-        }])
+        })
         updated_slots: typing.Set[tuple[int, int]] = set()
-        ctx.recheck_hints(team, slot, updated_slots)
+        ctx.recheck_location_hints(team, slot, new_locations, updated_slots)
         for hint_team, hint_slot in updated_slots:
             ctx.on_changed_hints(hint_team, hint_slot)
         ctx.save()
@@ -1663,6 +2246,7 @@ class ClientMessageProcessor(CommonCommandProcessor):
                 new_item = NetworkItem(names[item_name], -1, self.client.slot)
                 get_received_items(self.ctx, self.client.team, self.client.slot, False).append(new_item)
                 get_received_items(self.ctx, self.client.team, self.client.slot, True).append(new_item)
+                self.ctx.slots_with_new_items.add((self.client.team, self.client.slot))
                 self.ctx.broadcast_text_all(
                     'Cheat console: sending "' + item_name + '" to ' + self.ctx.get_aliased_name(self.client.team,
                                                                                                  self.client.slot),
@@ -1891,6 +2475,8 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             await ctx.send_msgs(client, [{"cmd": "ConnectionRefused", "errors": list(errors)}])
         else:
             team, slot = ctx.connect_names[args['name']]
+            if client.team is not None:
+                ctx.unindex_client(client)
             if client.auth and client.team is not None and client.slot in ctx.clients[client.team]:
                 ctx.clients[team][slot].remove(client)  # re-auth, remove old entry
                 if client.team != team or client.slot != slot:
@@ -1905,48 +2491,30 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             client.no_locations = bool(client.tags & _non_game_messages.keys())
             # set NoText for old PopTracker clients that predate the tag to save traffic
             client.no_text = "NoText" in client.tags or ("PopTracker" in client.tags and client.version < (0, 5, 1))
-            connected_packet = {
-                "cmd": "Connected",
-                "team": client.team, "slot": client.slot,
-                "players": ctx.get_players_package(),
-                "missing_locations": get_missing_checks(ctx, team, slot),
-                "checked_locations": get_checked_checks(ctx, team, slot),
-                "slot_info": ctx.slot_info,
-                "hint_points": get_slot_points(ctx, team, slot),
-            }
-            reply = [connected_packet]
+            ctx.index_client(client)
+            reply = [ctx.get_connected_msg(team, slot, args.get("slot_data", True))]
             start_inventory = get_start_inventory(ctx, slot, client.remote_start_inventory)
             items = get_received_items(ctx, client.team, client.slot, client.remote_items)
             if (start_inventory or items) and not client.no_items:
-                reply.append({"cmd": 'ReceivedItems', "index": 0, "items": start_inventory + items})
+                reply.append(ctx.dumper({"cmd": 'ReceivedItems', "index": 0, "items": start_inventory + items}))
                 client.send_index = len(start_inventory) + len(items)
             if not client.auth:  # if this was a Re-Connect, don't print to console
                 client.auth = True
                 await on_client_joined(ctx, client)
-            if args.get("slot_data", True):
-                connected_packet["slot_data"] = ctx.slot_data[client.slot]
-            await ctx.send_msgs(client, reply)
+            await ctx.send_encoded_msgs(client, f"[{','.join(reply)}]")
 
     elif cmd == "GetDataPackage":
         exclusions = args.get("exclusions", [])
         if "games" in args:
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
-                     if name in set(args.get("games", []))}
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": {"games": games}}])
+            requested = set(args.get("games", []))
+            games = [name for name in ctx.gamespackage if name in requested]
         # TODO: remove exclusions behaviour around 0.5.0
         elif exclusions:
             exclusions = set(exclusions)
-            games = {name: game_data for name, game_data in ctx.gamespackage.items()
-                     if name not in exclusions}
-
-            package = {"games": games}
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": package}])
-
+            games = [name for name in ctx.gamespackage if name not in exclusions]
         else:
-            await ctx.send_msgs(client, [{"cmd": "DataPackage",
-                                          "data": {"games": ctx.gamespackage}}])
+            games = list(ctx.gamespackage)
+        await ctx.send_encoded_msgs(client, ctx.get_data_package_msg(games))
 
     elif client.auth:
         if cmd == "ConnectUpdate":
@@ -1974,7 +2542,9 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
 
             if "tags" in args:
                 old_tags = client.tags
+                ctx.unindex_client(client)
                 client.tags = args["tags"]
+                ctx.index_client(client)
                 if set(old_tags) != set(client.tags):
                     client.no_locations = bool(client.tags & _non_game_messages.keys())
                     client.no_text = "NoText" in client.tags or (
@@ -2135,17 +2705,13 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
             client.messageprocessor(args["text"])
 
         elif cmd == "Bounce":
-            games = set(args.get("games", []))
-            tags = set(args.get("tags", []))
-            slots = set(args.get("slots", []))
+            targets = ctx.get_bounce_targets(client.team, set(args.get("games", [])), set(args.get("tags", [])),
+                                             set(args.get("slots", [])))
             args["cmd"] = "Bounced"
             msg = ctx.dumper([args])
 
-            for bounceclient in ctx.endpoints:
-                if client.team == bounceclient.team and (ctx.games[bounceclient.slot] in games or
-                                                         set(bounceclient.tags) & tags or
-                                                         bounceclient.slot in slots):
-                    await ctx.send_encoded_msgs(bounceclient, msg)
+            for bounceclient in targets:
+                await ctx.send_encoded_msgs(bounceclient, msg)
 
         elif cmd == "Get":
             if "keys" not in args or type(args["keys"]) != list:
@@ -2168,13 +2734,16 @@ async def process_client_cmd(ctx: Context, client: Client, args: dict):
                                               "text": 'Set', "original_cmd": cmd}])
                 return
             args["cmd"] = "SetReply"
-            value = ctx.stored_data.get(args["key"], args.get("default", 0))
-            args["original_value"] = copy.copy(value)
+            args["original_value"] = ctx.stored_data.get(args["key"], args.get("default", 0))
+            # operations may modify the value in place, so work on a copy to leave the stored value untouched for
+            # save snapshots that still reference it
+            value = copy.copy(args["original_value"])
             args["slot"] = client.slot
             for operation in args["operations"]:
                 func = modify_functions[operation["operation"]]
                 value = func(value, operation["value"])
             ctx.stored_data[args["key"]] = args["value"] = value
+            ctx.save_journal.changed_stored_data.add(args["key"])
             targets = set(ctx.stored_data_notification_clients[args["key"]])
             if args.get("want_reply", False):
                 targets.add(client)
@@ -2223,8 +2792,11 @@ class ServerCommandProcessor(CommonCommandProcessor):
     def _cmd_save(self) -> bool:
         """Save current state to multidata"""
         if self.ctx.saving:
-            self.ctx.save(True)
-            self.output("Game saved")
+            def report(written: concurrent.futures.Future) -> None:
+                self.output("Game saved" if not written.exception() and written.result() else "Saving failed")
+
+            self.ctx.save_dirty = False
+            self.ctx.save_now().add_done_callback(report)
             return True
         else:
             self.output("Saving is disabled.")
@@ -427,20 +427,34 @@ class _LocationStore(dict, typing.MutableMapping[int, typing.Dict[int, typing.Tu
         if len(self.get(0, {})):
             raise ValueError("Invalid player id 0 for location")
 
+        # receiving player -> item id -> (finding player, location id, item id, receiving player, flags),
+        # built on first use
+        self._receiver_index: typing.Optional[
+            typing.Dict[int, typing.Dict[int, typing.List[typing.Tuple[int, int, int, int, int]]]]] = None
+
+    def _get_receiver_index(self) -> typing.Dict[int, typing.Dict[int, typing.List[typing.Tuple[int, int, int, int, int]]]]:
+        if self._receiver_index is None:
+            receiver_index: typing.Dict[int, typing.Dict[int, typing.List[typing.Tuple[int, int, int, int, int]]]] = {}
+            for finding_player, check_data in sorted(self.items()):
+                for location_id, (item_id, receiving_player, item_flags) in sorted(check_data.items()):
+                    receiver_index.setdefault(receiving_player, {}).setdefault(item_id, []).append(
+                        (finding_player, location_id, item_id, receiving_player, item_flags))
+            self._receiver_index = receiver_index
+        return self._receiver_index
+
     def find_item(self, slots: typing.Set[int], seeked_item_id: int
                   ) -> typing.Generator[typing.Tuple[int, int, int, int, int], None, None]:
-        for finding_player, check_data in self.items():
-            for location_id, (item_id, receiving_player, item_flags) in check_data.items():
-                if receiving_player in slots and item_id == seeked_item_id:
-                    yield finding_player, location_id, item_id, receiving_player, item_flags
+        receiver_index = self._get_receiver_index()
+        found = [hint_data for slot in slots for hint_data in receiver_index.get(slot, {}).get(seeked_item_id, ())]
+        if len(slots) > 1:
+            found.sort()
+        yield from found
 
     def get_for_player(self, slot: int) -> typing.Dict[int, typing.Set[int]]:
-        import collections
-        all_locations: typing.Dict[int, typing.Set[int]] = collections.defaultdict(set)
-        for source_slot, location_data in self.items():
-            for location_id, values in location_data.items():
-                if values[1] == slot:
-                    all_locations[source_slot].add(location_id)
+        all_locations: typing.Dict[int, typing.Set[int]] = {}
+        for hint_data in self._get_receiver_index().get(slot, {}).values():
+            for finding_player, location_id, *_ in hint_data:
+                all_locations.setdefault(finding_player, set()).add(location_id)
         return all_locations
 
     def get_checked(self, state: typing.Dict[typing.Tuple[int, int], typing.Set[int]], team: int, slot: int
@@ -15,6 +15,7 @@ import io
 import collections
 import importlib
 import logging
+import threading
 import warnings
 
 from argparse import Namespace
@@ -524,6 +525,50 @@ class KeyedDefaultDict(collections.defaultdict):
         return value
 
 
+class SizedLRUCache(typing.Generic[S, T]):
+    """
+    Thread safe least recently used cache, which evicts entries once their total size_of exceeds max_size.
+    An entry that was just loaded is kept, even if it is larger than the whole cache on its own.
+    """
+    max_size: int
+    size: int
+    size_of: typing.Callable[[T], int]
+    _entries: collections.OrderedDict[S, T]
+
+    def __init__(self, max_size: int, size_of: typing.Callable[[T], int]) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.size_of = size_of
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_load(self, key: S, load: typing.Callable[[], Optional[T]]) -> Optional[T]:
+        """
+        Returns the entry for key, or loads it with load, outside the lock, and caches its result.
+        A result of None is returned without being cached.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = load()
+        if value is None:
+            return None
+        with self._lock:
+            if key in self._entries:  # another thread may have loaded it in the meantime
+                return self._entries[key]
+            self._entries[key] = value
+            self.size += self.size_of(value)
+            while self.size > self.max_size and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self.size_of(evicted)
+        return value
+
+
 def get_text_between(text: str, start: str, end: str) -> str:
     return text[text.index(start) + len(start): text.rindex(end)]
 
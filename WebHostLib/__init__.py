@@ -47,6 +47,8 @@ app.config["JOB_THRESHOLD"] = 1
 app.config["JOB_TIME"] = 600
 # memory limit for generator processes in bytes
 app.config["GENERATOR_MEMORY_LIMIT"] = 4294967296
+# size in bytes of stored data packages each process keeps decoded, see WebHostLib.datapackage
+app.config["DATA_PACKAGE_CACHE_SIZE"] = 64 * 1024 * 1024
 
 # waitress uses one thread for I/O, these are for processing of views that then get sent
 # archipelago.gg uses gunicorn + nginx; ignoring this option
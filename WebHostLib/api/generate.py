@@ -49,7 +49,10 @@ def generate_api():
         if len(options) > app.config["MAX_ROLL"]:
             return {"text": "Max size of multiworld exceeded",
                     "detail": app.config["MAX_ROLL"]}, 409
-        meta = get_meta(meta_options_source, race)
+        try:
+            meta = get_meta(meta_options_source, race)
+        except ValueError as e:
+            return {"text": str(e)}, 400
         results, gen_options = roll_options(options, set(meta["plando_options"]))
         if any(type(result) == str for result in results.values()):
             return {"text": str(results),
@@ -82,4 +85,11 @@ def wait_seed_api(seed: UUID):
         return {"text": "Generation not found"}, 404
     elif generation.state == STATE_ERROR:
         return {"text": "Generation failed"}, 500
+    meta = json.loads(generation.meta)
+    if "cached_seed" in meta:
+        cached_seed = UUID(meta["cached_seed"])
+        return {"text": "Generation done",
+                "detail": cached_seed,
+                "encoded": app.url_map.converters["suuid"].to_url(None, cached_seed),
+                "url": url_for("view_seed", seed=cached_seed, _external=True)}, 201
     return {"text": "Generation running"}, 202
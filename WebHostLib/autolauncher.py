@@ -163,7 +163,8 @@ def autogen(config: dict):
                                     launch_generator(generator_pool, generation, timeout=job_time)
 
                             commit()
-                        select(generation for generation in Generation if generation.state == STATE_ERROR).delete()
+                        select(generation for generation in Generation
+                               if generation.state in (STATE_ERROR, STATE_FINISHED)).delete()
 
                     while not stop_event.wait(0.1):
                         with db_session:
@@ -196,7 +197,7 @@ class MultiworldInstance():
             return False
 
         process = multiprocessing.Process(group=None, target=run_server_process,
-                                          args=(self.name, self.ponyconfig, get_static_server_data(),
+                                          args=(self.name, self.ponyconfig, get_static_server_data_file(),
                                                 self.cert, self.key, self.host,
                                                 self.rooms_to_start, self.rooms_shutting_down),
                                           name=self.name)
@@ -225,6 +226,6 @@ class MultiworldInstance():
         self.process = None
 
 
-from .models import Room, Generation, STATE_QUEUED, STATE_STARTED, STATE_ERROR, db, Seed, Slot
-from .customserver import run_server_process, get_static_server_data
+from .models import Room, Generation, STATE_QUEUED, STATE_STARTED, STATE_ERROR, STATE_FINISHED, db, Seed, Slot
+from .customserver import run_server_process, get_static_server_data_file
 from .generate import gen_game
@@ -5,14 +5,20 @@ import collections
 import datetime
 import functools
 import logging
+import hashlib
+import mmap
 import multiprocessing
+import os
 import pickle
 import random
 import socket
+import struct
 import threading
 import time
 import typing
 import sys
+import weakref
+import zlib
 
 import websockets
 from pony.orm import commit, db_session, select
@@ -20,12 +26,13 @@ from pony.orm import commit, db_session, select
 import Utils
 
 from MultiServer import (
-    Context, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert,
+    Context, SaveJournal, server, auto_shutdown, ServerCommandProcessor, ClientMessageProcessor, load_server_cert,
     server_per_message_deflate_factory,
 )
 from Utils import restricted_loads, cache_argsless
+from .datapackage import get_data_package_cache
 from .locker import Locker
-from .models import Command, GameDataPackage, Room, db
+from .models import Command, Room, SaveDelta, TRACKER_SNAPSHOT_VERSION, TrackerSlot, TrackerSnapshot, db
 
 
 class CustomClientMessageProcessor(ClientMessageProcessor):
@@ -60,20 +67,32 @@ class DBCommandProcessor(ServerCommandProcessor):
         self.ctx.logger.info(text)
 
 
+class TrackerSlotState(typing.NamedTuple):
+    checked: int
+    received: int
+    inventory: collections.Counter
+
+
+TrackerSlotStates = typing.Dict[typing.Tuple[int, int], TrackerSlotState]
+
+
 class WebHostContext(Context):
     room_id: int
 
-    def __init__(self, static_server_data: dict, logger: logging.Logger):
-        # static server data is used during _load_game_data to load required data,
+    def __init__(self, static_server_data: StaticServerData, logger: logging.Logger):
+        # static server data is used during _load_game_data and load to load required data,
         # without needing to import worlds system, which takes quite a bit of memory
         self.static_server_data = static_server_data
+        self.static_games: typing.List[StaticGameData] = []  # keeps the static data of this room's games loaded
         super(WebHostContext, self).__init__("", 0, "", "", 1,
                                              40, True, "enabled", "enabled",
                                              "enabled", 0, 2, logger=logger)
-        del self.static_server_data
         self.main_loop = asyncio.get_running_loop()
         self.video = {}
         self.tags = ["AP", "WebHost"]
+        self.tracker_multidata: typing.Dict[str, typing.Any] = {}
+        self.tracker_slots: typing.Optional[TrackerSlotStates] = None
+        """Per team and slot, what the room's tracker snapshot holds. None until this server wrote the snapshot."""
 
     def __del__(self):
         try:
@@ -84,10 +103,24 @@ class WebHostContext(Context):
             self.logger.debug("Context destroyed")
 
     def _load_game_data(self):
-        for key, value in self.static_server_data.items():
-            # NOTE: attributes are mutable and shared, so they will have to be copied before being modified
-            setattr(self, key, value)
-        self.non_hintable_names = collections.defaultdict(frozenset, self.non_hintable_names)
+        # games are added by load, as only the games of this room are needed
+        self.gamespackage = {}
+        self.item_name_groups = {}
+        self.location_name_groups = {}
+        self.non_hintable_names = collections.defaultdict(frozenset, self.static_server_data.non_hintable_names)
+
+    def _add_static_game(self, game: str) -> None:
+        # NOTE: static game data is shared between rooms, so it will have to be copied before being modified
+        game_data = self.static_server_data.get_game(game)
+        if game_data:
+            self.static_games.append(game_data)
+            self.gamespackage[game] = game_data.package
+            self.item_name_groups[game] = game_data.item_name_groups
+            self.location_name_groups[game] = game_data.location_name_groups
+        else:
+            self.gamespackage[game] = {}
+            self.item_name_groups[game] = {}
+            self.location_name_groups[game] = {}
 
     def listen_to_db_commands(self):
         cmdprocessor = DBCommandProcessor(self)
@@ -113,62 +146,138 @@ class WebHostContext(Context):
             self.port = get_random_port()
 
         multidata = self.decompress(room.seed.multidata)
+        self.tracker_multidata = self.get_tracker_multidata(multidata)
         game_data_packages = {}
 
-        static_gamespackage = self.gamespackage  # this is shared across all rooms
-        static_item_name_groups = self.item_name_groups
-        static_location_name_groups = self.location_name_groups
-        self.gamespackage = {"Archipelago": static_gamespackage.get("Archipelago", {})}  # this may be modified by _load
-        self.item_name_groups = {"Archipelago": static_item_name_groups.get("Archipelago", {})}
-        self.location_name_groups = {"Archipelago": static_location_name_groups.get("Archipelago", {})}
-        missing_checksum = False
+        self._add_static_game("Archipelago")
+        if "datapackage" not in multidata:
+            # rolled before data packages were embedded, so any game could be in it
+            for game in self.static_server_data.games:
+                self._add_static_game(game)
 
         for game in list(multidata.get("datapackage", {})):
             game_data = multidata["datapackage"][game]
             if "checksum" in game_data:
-                if static_gamespackage.get(game, {}).get("checksum") == game_data["checksum"]:
+                if self.static_server_data.checksums.get(game) == game_data["checksum"]:
                     # non-custom. remove from multidata and use static data
                     # games package could be dropped from static data once all rooms embed data package
                     del multidata["datapackage"][game]
                 else:
-                    row = GameDataPackage.get(checksum=game_data["checksum"])
-                    if row:  # None if rolled on >= 0.3.9 but uploaded to <= 0.3.8. multidata should be complete
-                        game_data_packages[game] = restricted_loads(row.data)
+                    decoded = get_data_package_cache().get(game_data["checksum"])
+                    if decoded:  # None if rolled on >= 0.3.9 but uploaded to <= 0.3.8. multidata should be complete
+                        # _load removes the name groups from the package, so the shared one has to be copied
+                        game_data_packages[game] = dict(decoded.package)
                         continue
                     else:
                         self.logger.warning(f"Did not find game_data_package for {game}: {game_data['checksum']}")
-            else:
-                missing_checksum = True  # Game rolled on old AP and will load data package from multidata
-            self.gamespackage[game] = static_gamespackage.get(game, {})
-            self.item_name_groups[game] = static_item_name_groups.get(game, {})
-            self.location_name_groups[game] = static_location_name_groups.get(game, {})
-
-        if not game_data_packages and not missing_checksum:
-            # all static -> use the static dicts directly
-            self.gamespackage = static_gamespackage
-            self.item_name_groups = static_item_name_groups
-            self.location_name_groups = static_location_name_groups
+            # else: Game rolled on old AP and will load data package from multidata
+            self._add_static_game(game)
         return self._load(multidata, game_data_packages, True)
 
     def init_save(self, enabled: bool = True):
         self.saving = enabled
         if self.saving:
             with db_session:
-                savegame_data = Room.get(id=self.room_id).multisave
+                room = Room.get(id=self.room_id)
+                savegame_data = room.multisave
                 if savegame_data:
-                    self.set_save(restricted_loads(Room.get(id=self.room_id).multisave))
+                    save_data = restricted_loads(savegame_data)
+                    SaveJournal.replay(save_data, b"".join(delta.data for delta in
+                                                           room.save_deltas.order_by(SaveDelta.id)))
+                    self.set_save(save_data)
             self._start_async_saving(atexit_save=False)
         threading.Thread(target=self.listen_to_db_commands, daemon=True).start()
 
+    def _encode_save(self, save_data: dict) -> bytes:
+        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
+        return pickle.dumps(save_data)
+
+    @staticmethod
+    def get_tracker_multidata(multidata: dict) -> typing.Dict[str, typing.Any]:
+        """The parts of multidata that are stored in tracker snapshots, see WebHostLib.tracker.TrackerData"""
+        return {
+            "seed_name": multidata["seed_name"],
+            "slot_info": multidata["slot_info"],
+            "precollected_items": multidata["precollected_items"],
+            # only the version and checksum are left of embedded data packages after upload
+            "datapackage": {game: {key: value for key, value in game_data.items() if key in {"version", "checksum"}}
+                            for game, game_data in multidata.get("datapackage", {}).items()},
+            "location_counts": {player: len(locations) for player, locations in multidata["locations"].items()},
+        }
+
+    def get_tracker_slot_updates(self, save_data: dict, tracker_slots: TrackerSlotStates) -> TrackerSlotStates:
+        """
+        Returns the states of the slots whose checks or received items changed in save_data compared to tracker_slots.
+        Inventories are updated with the items received since then instead of being recounted.
+        """
+        precollected_items = self.tracker_multidata["precollected_items"]
+        location_checks = save_data["location_checks"]
+        received_items = save_data["received_items"]
+        updates: TrackerSlotStates = {}
+        for team, slot in set(save_data["connect_names"].values()):
+            checked = len(location_checks.get((team, slot), ()))
+            items = received_items.get((team, slot, True), ())
+            state = tracker_slots.get((team, slot))
+            if state and state.checked == checked and state.received == len(items):
+                continue
+            if state and state.received <= len(items):
+                counted, inventory = state.received, state.inventory.copy()
+            else:
+                counted, inventory = 0, collections.Counter(precollected_items.get(slot, ()))
+            inventory.update(item.item for item in items[counted:])
+            updates[team, slot] = TrackerSlotState(checked, len(items), inventory)
+        return updates
+
+    def _store_tracker_snapshot(self, room: Room, save_data: dict) -> TrackerSlotStates:
+        """
+        Writes the slots that changed since the last save into the room's tracker snapshot, or all of them if this
+        server did not write the snapshot yet. Returns the new slot states, which apply once the save is committed.
+        """
+        tracker_slots = self.tracker_slots
+        snapshot = room.tracker_snapshot
+        # Does not use Utils.restricted_dumps for the same reason as _encode_save, but is read with restricted_loads
+        new_snapshot = not snapshot
+        if new_snapshot:
+            snapshot = TrackerSnapshot(room=room, version=TRACKER_SNAPSHOT_VERSION,
+                                       data=zlib.compress(pickle.dumps(self.tracker_multidata)))
+            tracker_slots = {}
+        elif tracker_slots is None or snapshot.version != TRACKER_SNAPSHOT_VERSION:
+            # rows of the previous snapshot are overwritten below, as every slot counts as changed
+            snapshot.set(version=TRACKER_SNAPSHOT_VERSION, data=zlib.compress(pickle.dumps(self.tracker_multidata)))
+            tracker_slots = {}
+
+        location_counts = self.tracker_multidata["location_counts"]
+        updates = self.get_tracker_slot_updates(save_data, tracker_slots)
+        for (team, slot), state in updates.items():
+            values = {"checked": state.checked, "missing": location_counts.get(slot, 0) - state.checked,
+                      "inventory": pickle.dumps(state.inventory)}
+            tracker_slot = None if new_snapshot else TrackerSlot.get(snapshot=snapshot, team=team, slot=slot)
+            if tracker_slot:
+                tracker_slot.set(**values)
+            else:
+                TrackerSlot(snapshot=snapshot, team=team, slot=slot, **values)
+        return {**tracker_slots, **updates}
+
     @db_session
-    def _save(self, exit_save: bool = False) -> bool:
+    def _store_save(self, data: bytes, snapshot: bool, exit_save: bool, save_data: dict) -> None:
         room = Room.get(id=self.room_id)
-        # Does not use Utils.restricted_dumps because we'd rather make a save than not make one
-        room.multisave = pickle.dumps(self.get_save())
+        if snapshot:
+            room.multisave = data
+            room.save_deltas.select().delete(bulk=True)
+        else:
+            SaveDelta(room=room, data=data)
+        try:
+            tracker_slots = self._store_tracker_snapshot(room, save_data)
+        except Exception as e:
+            self.logger.exception(e)
+            tracker_slots = None
+            if room.tracker_snapshot:
+                room.tracker_snapshot.delete()  # outdated, so trackers have to load multidata and multisave instead
         # saving only occurs on activity, so we can "abuse" this information to mark this as last_activity
         if not exit_save:  # we don't want to count a shutdown as activity, which would restart the server again
             room.last_activity = datetime.datetime.utcnow()
-        return True
+        commit()
+        self.tracker_slots = tracker_slots
 
     def get_save(self) -> dict:
         d = super(WebHostContext, self).get_save()
@@ -209,6 +318,98 @@ def get_static_server_data() -> dict:
     return data
 
 
+class StaticGameData:
+    """A game's static data package and name groups, shared by all rooms of a process that host the game."""
+    __slots__ = ("package", "item_name_groups", "location_name_groups", "__weakref__")
+
+    def __init__(self, package: dict, item_name_groups: dict, location_name_groups: dict) -> None:
+        self.package = package
+        self.item_name_groups = item_name_groups
+        self.location_name_groups = location_name_groups
+
+
+class StaticServerData:
+    """
+    Read-only view of static server data written by write_static_server_data.
+    The file is memory mapped, so all hosting processes share the same pages, and a game's data is only unpickled
+    while a room of this process is hosting that game.
+    """
+    _footer = struct.Struct("!Q")
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, = self._footer.unpack_from(self._data, len(self._data) - self._footer.size)
+        index = pickle.loads(self._data[index_offset:len(self._data) - self._footer.size])
+        self._games: typing.Dict[str, typing.Tuple[int, int]] = index["games"]
+        self.checksums: typing.Dict[str, typing.Optional[str]] = index["checksums"]
+        self.non_hintable_names: typing.Dict[str, typing.AbstractSet[str]] = index["non_hintable_names"]
+        self._loaded: weakref.WeakValueDictionary[str, StaticGameData] = weakref.WeakValueDictionary()
+
+    @property
+    def games(self) -> typing.KeysView[str]:
+        return self._games.keys()
+
+    def get_game(self, game: str) -> typing.Optional[StaticGameData]:
+        """Returns the data of game, which stays loaded for as long as a reference to it is kept."""
+        game_data = self._loaded.get(game)
+        if game_data is None and game in self._games:
+            offset, size = self._games[game]
+            game_data = StaticGameData(*pickle.loads(self._data[offset:offset + size]))
+            self._loaded[game] = game_data
+        return game_data
+
+
+def write_static_server_data(data: dict, directory: typing.Optional[str] = None) -> str:
+    """
+    Writes data from get_static_server_data to a file for StaticServerData and returns its path.
+    Files of previously written data in directory, the webhost cache by default, are deleted.
+    """
+    blobs: typing.List[bytes] = []
+    games: typing.Dict[str, typing.Tuple[int, int]] = {}
+    offset = 0
+    for game, package in data["gamespackage"].items():
+        blob = pickle.dumps((package, data["item_name_groups"].get(game, {}),
+                             data["location_name_groups"].get(game, {})))
+        games[game] = offset, len(blob)
+        offset += len(blob)
+        blobs.append(blob)
+    blobs.append(pickle.dumps({
+        "games": games,
+        "checksums": {game: package.get("checksum") for game, package in data["gamespackage"].items()},
+        "non_hintable_names": data["non_hintable_names"],
+    }))
+    blobs.append(StaticServerData._footer.pack(offset))
+    content = b"".join(blobs)
+
+    if directory is None:
+        directory = Utils.cache_path("webhost")
+    # content addressed, so hosts of the same version share the file and it never changes while mapped
+    file_name = f"static_server_data_{hashlib.sha256(content).hexdigest()[:16]}.bin"
+    path = os.path.join(directory, file_name)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+        # the data changed, so the files of older versions are stale. Processes that already mapped one keep reading it,
+        # and on Windows a mapped file can't be deleted, so it is left for the next time.
+        for stale_file in os.scandir(directory):
+            if stale_file.name.startswith("static_server_data_") and stale_file.name.endswith(".bin") \
+                    and stale_file.name != file_name:
+                try:
+                    os.remove(stale_file.path)
+                except OSError:
+                    pass
+    return path
+
+
+@cache_argsless
+def get_static_server_data_file() -> str:
+    return write_static_server_data(get_static_server_data())
+
+
 def set_up_logging(room_id) -> logging.Logger:
     import os
     # logger setup
@@ -229,7 +430,7 @@ def set_up_logging(room_id) -> logging.Logger:
     return logger
 
 
-def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
+def run_server_process(name: str, ponyconfig: dict, static_server_data_file: str,
                        cert_file: typing.Optional[str], cert_key_file: typing.Optional[str],
                        host: str, rooms_to_run: multiprocessing.Queue, rooms_shutting_down: multiprocessing.Queue):
     from setproctitle import setproctitle
@@ -272,6 +473,7 @@ def run_server_process(name: str, ponyconfig: dict, static_server_data: dict,
             return ssl_context
 
     del ponyconfig
+    static_server_data = StaticServerData(static_server_data_file)
     gc.collect()  # free intermediate objects used during setup
 
     loop = asyncio.get_event_loop()
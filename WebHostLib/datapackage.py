@@ -0,0 +1,84 @@
+from typing import Callable, Dict, Iterator, Mapping, NamedTuple, Optional
+
+from NetUtils import GamesPackage
+from Utils import SizedLRUCache, cache_argsless, restricted_loads
+from . import app
+from .models import GameDataPackage
+
+
+class DecodedDataPackage(NamedTuple):
+    package: GamesPackage
+    item_id_to_name: Dict[int, str]
+    """Shared between threads, wrap it in a NameLookup to name unknown ids."""
+    location_id_to_name: Dict[int, str]
+    """Shared between threads, wrap it in a NameLookup to name unknown ids."""
+    size: int
+    """Size of the stored package, which is what the cache size is accounted in."""
+
+
+class NameLookup(Mapping[int, str]):
+    """
+    Read-only view of an id to name dict that names unknown ids with default_factory instead of raising KeyError.
+    Unlike KeyedDefaultDict it does not store those names, so the viewed dict can be shared.
+    """
+    __slots__ = ("names", "default_factory")
+
+    names: Dict[int, str]
+    default_factory: Callable[[int], str]
+
+    def __init__(self, names: Dict[int, str], default_factory: Callable[[int], str]) -> None:
+        self.names = names
+        self.default_factory = default_factory
+
+    def __getitem__(self, code: int) -> str:
+        try:
+            return self.names[code]
+        except KeyError:
+            return self.default_factory(code)
+
+    def __contains__(self, code: object) -> bool:
+        return code in self.names
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get(self, code: int, default: Optional[str] = None) -> Optional[str]:
+        return self.names.get(code, default)
+
+
+class DataPackageCache(SizedLRUCache[str, DecodedDataPackage]):
+    """
+    Least recently used cache of decoded GameDataPackage rows by checksum, shared by everything in the process.
+    Rows are never changed once stored, so cached packages never go stale.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__(max_size, lambda decoded: decoded.size)
+
+    def get(self, checksum: str) -> Optional[DecodedDataPackage]:
+        """
+        Returns the decoded data package with checksum, or None if there is no such package.
+        Has to be called in a db_session. The result is shared, so it must not be modified.
+        """
+        return self.get_or_load(checksum, lambda: self._load(checksum))
+
+    @staticmethod
+    def _load(checksum: str) -> Optional[DecodedDataPackage]:
+        row = GameDataPackage.get(checksum=checksum)
+        if not row:
+            return None
+        package: GamesPackage = restricted_loads(row.data)
+        return DecodedDataPackage(
+            package,
+            {id: name for name, id in package["item_name_to_id"].items()},
+            {id: name for name, id in package["location_name_to_id"].items()},
+            len(row.data),
+        )
+
+
+@cache_argsless
+def get_data_package_cache() -> DataPackageCache:
+    return DataPackageCache(app.config["DATA_PACKAGE_CACHE_SIZE"])
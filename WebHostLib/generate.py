@@ -1,4 +1,6 @@
 import concurrent.futures
+import dataclasses
+import hashlib
 import json
 import os
 import random
@@ -9,16 +11,18 @@ from pickle import PicklingError
 from typing import Any
 
 from flask import flash, redirect, render_template, request, session, url_for
-from pony.orm import commit, db_session
+from pony.orm import TransactionIntegrityError, commit, db_session
 
 from BaseClasses import get_seed, seeddigits
 from Generate import PlandoOptions, handle_name, mystery_argparse
 from Main import main as ERmain
+from Options import Option
 from Utils import __version__, restricted_dumps, DaemonThreadPoolExecutor
 from WebHostLib import app
 from settings import ServerOptions, GeneratorOptions
+from worlds import AutoWorldRegister, network_data_package
 from .check import get_yaml_data, roll_options
-from .models import Generation, STATE_ERROR, STATE_QUEUED, Seed, UUID
+from .models import Generation, GenerationResult, STATE_ERROR, STATE_FINISHED, STATE_QUEUED, Seed, UUID
 from .upload import upload_zip_to_db
 
 
@@ -46,6 +50,11 @@ def get_meta(options_source: dict, race: bool = False) -> dict[str, list[str] |
         server_options["item_cheat"] = False
         server_options["remaining_mode"] = "disabled"
         generator_options["spoiler"] = 0
+    elif options_source.get("seed"):
+        try:
+            generator_options["seed"] = int(options_source["seed"])
+        except ValueError:
+            raise ValueError(f"Invalid seed {options_source['seed']!r}, it has to be a number.") from None
 
     return {
         "server_options": server_options,
@@ -67,8 +76,12 @@ def generate(race=False):
             if isinstance(options, str):
                 flash(options)
             else:
-                meta = get_meta(request.form, race)
-                return start_generation(options, meta)
+                try:
+                    meta = get_meta(request.form, race)
+                except ValueError as e:
+                    flash(str(e))
+                else:
+                    return start_generation(options, meta)
 
     return render_template("generate.html", race=race, version=__version__)
 
@@ -118,6 +131,42 @@ def start_generation(options: dict[str, dict | str], meta: dict[str, Any]):
         return redirect(url_for("view_seed", seed=seed_id))
 
 
+def _normalize(value: Any) -> Any:
+    """Turns rolled option values into json-compatible data that does not depend on set or dict ordering."""
+    if isinstance(value, Option):
+        return [type(value).__name__, _normalize(value.value)]
+    if isinstance(value, dict):
+        return sorted(([_normalize(key), _normalize(val)] for key, val in value.items()), key=json.dumps)
+    if isinstance(value, (set, frozenset)):
+        return sorted((_normalize(val) for val in value), key=json.dumps)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(val) for val in value]
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return [type(value).__name__, _normalize(dataclasses.asdict(value))]
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return repr(value)
+
+
+def get_generation_hash(gen_options: dict[str, dict[str, Any]], meta: dict[str, Any], owner: UUID | int) -> str:
+    """
+    Hash of everything that goes into generating a seed, so the same request by the same owner can reuse a previous
+    result. Only used for requests that set a seed, as without one every request is expected to roll a new seed.
+    """
+    games = sorted({settings["game"] for settings in gen_options.values()})
+    data = {
+        "version": __version__,
+        "owner": str(owner if isinstance(owner, UUID) else UUID(int=owner)),
+        "server_options": _normalize(meta["server_options"]),
+        "generator_options": _normalize(meta["generator_options"]),
+        "plando_options": sorted(meta["plando_options"]),
+        "worlds": [[game, AutoWorldRegister.world_types[game].world_version,
+                    network_data_package["games"][game]["checksum"]] for game in games],
+        "options": [[playerfile, _normalize(settings)] for playerfile, settings in gen_options.items()],
+    }
+    return hashlib.sha256(json.dumps(data).encode()).hexdigest()
+
+
 def gen_game(gen_options: dict, meta: dict[str, Any] | None = None, owner=None, sid=None, timeout: int|None = None):
     if meta is None:
         meta = {}
@@ -125,10 +174,20 @@ def gen_game(gen_options: dict, meta: dict[str, Any] | None = None, owner=None,
     meta.setdefault("server_options", {}).setdefault("hint_cost", 10)
     race = meta.setdefault("generator_options", {}).setdefault("race", False)
 
+    # without a seed every request is expected to roll a new one, so only requests for a seed can reuse a result
+    generation_hash = None
+    if not race and owner is not None and "seed" in meta["generator_options"]:
+        generation_hash = get_generation_hash(gen_options, meta, owner)
+        with db_session:
+            result = GenerationResult.get(hash=generation_hash)
+            cached_seed_id = result.seed.id if result else None
+        if cached_seed_id:
+            return use_generation_result(sid, cached_seed_id)
+
     def task():
         target = tempfile.TemporaryDirectory()
         playercount = len(gen_options)
-        seed = get_seed()
+        seed = get_seed(None if race else meta["generator_options"].get("seed"))
 
         if race:
             random.seed()  # use time-based random source
@@ -169,9 +228,10 @@ def gen_game(gen_options: dict, meta: dict[str, Any] | None = None, owner=None,
             args.name[player] = handle_name(args.name[player], player, name_counter)
         if len(set(args.name.values())) != len(args.name):
             raise Exception(f"Names have to be unique. Names: {Counter(args.name.values())}")
-        ERmain(args, seed, baked_server_options=meta["server_options"])
+        multiworld = ERmain(args, seed, baked_server_options=meta["server_options"])
 
-        return upload_to_db(target.name, sid, owner, race)
+        return upload_to_db(os.path.join(target.name, f"AP_{multiworld.seed_name}.zip"), sid, owner, race,
+                            generation_hash)
 
     thread_pool = DaemonThreadPoolExecutor(max_workers=1)
     thread = thread_pool.submit(task)
@@ -221,26 +281,55 @@ def wait_seed(seed: UUID):
 
     if not generation:
         return "Generation not found."
-    elif generation.state == STATE_ERROR:
-        meta = json.loads(generation.meta)
+    meta = json.loads(generation.meta)
+    if generation.state == STATE_ERROR:
         details = json.dumps(meta, indent=4).strip()
         return render_template("seedError.html", seed_error=meta["error"], details=details)
+    elif "cached_seed" in meta:
+        return redirect(url_for("view_seed", seed=UUID(meta["cached_seed"])))
     return render_template("waitSeed.html", seed_id=seed_id)
 
 
-def upload_to_db(folder, sid, owner, race):
-    for file in os.listdir(folder):
-        file = os.path.join(folder, file)
-        if file.endswith(".zip"):
-            with db_session:
-                with zipfile.ZipFile(file) as zfile:
-                    res = upload_zip_to_db(zfile, owner, {"race": race}, sid)
-                if type(res) == "str":
-                    raise Exception(res)
-                elif res:
-                    seed = res
-                    gen = Generation.get(id=seed.id)
-                    if gen is not None:
-                        gen.delete()
-                    return seed.id
-    raise Exception("Generation zipfile not found.")
+def use_generation_result(sid, seed_id):
+    """Points the Generation with sid, if any, to the previously generated seed_id instead of a new seed."""
+    if sid:
+        with db_session:
+            gen = Generation.get(id=sid)
+            if gen is not None:
+                gen.state = STATE_FINISHED
+                meta = json.loads(gen.meta)
+                meta["cached_seed"] = str(seed_id)
+                gen.meta = json.dumps(meta)
+                commit()
+    return seed_id
+
+
+def upload_to_db(zip_path, sid, owner, race, generation_hash=None):
+    if not os.path.exists(zip_path):
+        raise Exception("Generation zipfile not found.")
+    with db_session:
+        with zipfile.ZipFile(zip_path) as zfile:
+            res = upload_zip_to_db(zfile, owner, {"race": race}, sid)
+        if type(res) == "str":
+            raise Exception(res)
+        elif res:
+            seed = res
+            gen = Generation.get(id=seed.id)
+            if gen is not None:
+                gen.delete()
+            seed_id = seed.id
+        else:
+            raise Exception("Generation zipfile could not be uploaded.")
+    if generation_hash:
+        store_generation_result(generation_hash, seed_id)
+    return seed_id
+
+
+def store_generation_result(generation_hash: str, seed_id) -> None:
+    """Remembers seed_id as the result for generation_hash, unless a concurrent generation stored one first."""
+    try:
+        with db_session:
+            if not GenerationResult.exists(hash=generation_hash):
+                GenerationResult(hash=generation_hash, seed=Seed[seed_id])
+    except TransactionIntegrityError:
+        pass
@@ -1,12 +1,16 @@
 from datetime import datetime
 from uuid import UUID, uuid4
-from pony.orm import Database, PrimaryKey, Required, Set, Optional, buffer, LongStr
+from pony.orm import Database, PrimaryKey, Required, Set, Optional, buffer, composite_key, LongStr
 
 db = Database()
 
 STATE_QUEUED = 0
 STATE_STARTED = 1
 STATE_ERROR = -1
+STATE_FINISHED = 2  # reused the seed of an earlier generation, see meta["cached_seed"]
+
+# format of TrackerSnapshot and its slots, snapshots of other versions are ignored until the room server saves again
+TRACKER_SNAPSHOT_VERSION = 2
 
 
 class Slot(db.Entity):
@@ -26,6 +30,8 @@ class Room(db.Entity):
     commands = Set('Command')
     seed = Required('Seed', index=True)
     multisave = Optional(buffer, lazy=True)
+    save_deltas = Set('SaveDelta')  # journaled changes on top of multisave, see MultiServer.SaveJournal
+    tracker_snapshot = Optional('TrackerSnapshot', cascade_delete=True)
     show_spoiler = Required(int, default=0)  # 0 -> never, 1 -> after completion, -> 2 always
     timeout = Required(int, default=lambda: 2 * 60 * 60)  # seconds since last activity to shutdown
     tracker = Optional(UUID, index=True)
@@ -42,6 +48,7 @@ class Seed(db.Entity):
     slots = Set(Slot)
     spoiler = Optional(LongStr, lazy=True)
     meta = Required(LongStr, default=lambda: "{\"race\": false}")  # additional meta information/tags
+    generation_results = Set('GenerationResult', cascade_delete=True)
 
 
 class Command(db.Entity):
@@ -50,6 +57,31 @@ class Command(db.Entity):
     commandtext = Required(str)
 
 
+class SaveDelta(db.Entity):
+    id = PrimaryKey(int, auto=True)
+    room = Required(Room, index=True)
+    data = Required(bytes, lazy=True)
+
+
+class TrackerSnapshot(db.Entity):
+    room = PrimaryKey(Room)
+    version = Required(int)
+    data = Required(bytes, lazy=True)  # what trackers need from multidata, written on the first save of a room server
+    slots = Set('TrackerSlot', cascade_delete=True)
+
+
+class TrackerSlot(db.Entity):
+    # counts of a player, written by room saves that changed them
+    id = PrimaryKey(int, auto=True)
+    snapshot = Required(TrackerSnapshot, index=True)
+    team = Required(int)
+    slot = Required(int)
+    checked = Required(int)
+    missing = Required(int)
+    inventory = Required(bytes)  # pickled Counter of received item ids, including starting items
+    composite_key(snapshot, team, slot)
+
+
 class Generation(db.Entity):
     id = PrimaryKey(UUID, default=uuid4)
     owner = Required(UUID)
@@ -58,6 +90,11 @@ class Generation(db.Entity):
     state = Required(int, default=0, index=True)
 
 
+class GenerationResult(db.Entity):
+    hash = PrimaryKey(str)  # see generate.get_generation_hash
+    seed = Required(Seed)
+
+
 class GameDataPackage(db.Entity):
     checksum = PrimaryKey(str)
     data = Required(bytes)
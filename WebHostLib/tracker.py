@@ -1,6 +1,8 @@
 import datetime
 import collections
+import zlib
 from dataclasses import dataclass
+from functools import cached_property
 from typing import Any, Callable, Dict, List, Optional, Set, Tuple, NamedTuple, Counter
 from uuid import UUID
 from email.utils import parsedate_to_datetime
@@ -8,11 +10,12 @@ from email.utils import parsedate_to_datetime
 from flask import make_response, render_template, request, Request, Response
 from werkzeug.exceptions import abort
 
-from MultiServer import Context, get_saving_second
+from MultiServer import Context, SaveJournal, get_saving_second
 from NetUtils import ClientStatus, Hint, NetworkItem, NetworkSlot, SlotType
 from Utils import restricted_loads, KeyedDefaultDict
 from . import app, cache
-from .models import GameDataPackage, Room
+from .datapackage import DecodedDataPackage, NameLookup, get_data_package_cache
+from .models import Room, SaveDelta, TRACKER_SNAPSHOT_VERSION, TrackerSlot
 
 # Multisave is currently updated, at most, every minute.
 TRACKER_CACHE_TIMEOUT_IN_SECONDS = 60
@@ -48,41 +51,92 @@ class TrackerData:
     subsequent helper method calls do not need to recompute results during the lifetime of this instance.
     """
     room: Room
-    _multidata: Dict[str, Any]
-    _multisave: Dict[str, Any]
+    _snapshot: Optional[Dict[str, Any]]
+    _snapshot_slots: Dict[TeamPlayer, TrackerSlot]
     _tracker_cache: Dict[str, Any]
 
     def __init__(self, room: Room):
-        """Initialize a new RoomMultidata object for the current room."""
+        """Initialize a new RoomMultidata object for the current room.
+
+        Uses the room's tracker snapshot if it has an up-to-date one, in which case multidata and multisave are only
+        loaded for data that is not part of the snapshot, such as slot data or hints.
+        """
         self.room = room
-        self._multidata = Context.decompress(room.seed.multidata)
-        self._multisave = restricted_loads(room.multisave) if room.multisave else {}
+        snapshot = room.tracker_snapshot
+        if snapshot and snapshot.version == TRACKER_SNAPSHOT_VERSION:
+            self._snapshot = restricted_loads(zlib.decompress(snapshot.data))
+            self._snapshot_slots = {(slot.team, slot.slot): slot for slot in snapshot.slots}
+        else:
+            self._snapshot = None
+            self._snapshot_slots = {}
         self._tracker_cache = {}
 
-        self.item_name_to_id: Dict[str, Dict[str, int]] = {}
-        self.location_name_to_id: Dict[str, Dict[str, int]] = {}
-
-        # Generate inverse lookup tables from data package, useful for trackers.
-        self.item_id_to_name: Dict[str, Dict[int, str]] = KeyedDefaultDict(lambda game_name: {
+    @cached_property
+    def _multidata(self) -> Dict[str, Any]:
+        return Context.decompress(self.room.seed.multidata)
+
+    @cached_property
+    def _multisave(self) -> Dict[str, Any]:
+        multisave = restricted_loads(self.room.multisave) if self.room.multisave else {}
+        if multisave:
+            SaveJournal.replay(multisave, b"".join(delta.data for delta in
+                                                   self.room.save_deltas.order_by(SaveDelta.id)))
+        return multisave
+
+    def _get_multidata(self, key: str) -> Any:
+        """Retrieves a multidata entry from the tracker snapshot, or from the multidata if there is no snapshot."""
+        if self._snapshot:
+            return self._snapshot[key]
+        return self._multidata[key]
+
+    @cached_property
+    def _game_packages(self) -> Dict[str, DecodedDataPackage]:
+        data_package_cache = get_data_package_cache()
+        game_packages = {}
+        for game, game_package in self.get_data_packages().items():
+            decoded = data_package_cache.get(game_package["checksum"])
+            if decoded:
+                game_packages[game] = decoded
+        return game_packages
+
+    @cached_property
+    def item_id_to_name(self) -> Dict[str, Dict[int, str]]:
+        """Inverse item lookup tables from the data packages, useful for trackers."""
+        item_id_to_name: Dict[str, Dict[int, str]] = KeyedDefaultDict(lambda game_name: {
             game_name: KeyedDefaultDict(lambda code: f"Unknown Game {game_name} - Item (ID: {code})")
         })
-        self.location_id_to_name: Dict[str, Dict[int, str]] = KeyedDefaultDict(lambda game_name: {
+        for game, game_package in self._game_packages.items():
+            item_id_to_name[game] = NameLookup(game_package.item_id_to_name,
+                                               lambda code: f"Unknown Item (ID: {code})")
+        return item_id_to_name
+
+    @cached_property
+    def location_id_to_name(self) -> Dict[str, Dict[int, str]]:
+        """Inverse location lookup tables from the data packages, useful for trackers."""
+        location_id_to_name: Dict[str, Dict[int, str]] = KeyedDefaultDict(lambda game_name: {
             game_name: KeyedDefaultDict(lambda code: f"Unknown Game {game_name} - Location (ID: {code})")
         })
-        for game, game_package in self._multidata["datapackage"].items():
-            game_package = restricted_loads(GameDataPackage.get(checksum=game_package["checksum"]).data)
-            self.item_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Item (ID: {code})", {
-                id: name for name, id in game_package["item_name_to_id"].items()})
-            self.location_id_to_name[game] = KeyedDefaultDict(lambda code: f"Unknown Location (ID: {code})", {
-                id: name for name, id in game_package["location_name_to_id"].items()})
+        for game, game_package in self._game_packages.items():
+            location_id_to_name[game] = NameLookup(game_package.location_id_to_name,
+                                                   lambda code: f"Unknown Location (ID: {code})")
+        return location_id_to_name
 
-            # Normal lookup tables as well.
-            self.item_name_to_id[game] = game_package["item_name_to_id"]
-            self.location_name_to_id[game] = game_package["location_name_to_id"]
+    @cached_property
+    def item_name_to_id(self) -> Dict[str, Dict[str, int]]:
+        return {game: game_package.package["item_name_to_id"] for game, game_package in self._game_packages.items()}
+
+    @cached_property
+    def location_name_to_id(self) -> Dict[str, Dict[str, int]]:
+        return {game: game_package.package["location_name_to_id"]
+                for game, game_package in self._game_packages.items()}
 
     def get_seed_name(self) -> str:
         """Retrieves the seed name."""
-        return self._multidata["seed_name"]
+        return self._get_multidata("seed_name")
+
+    def get_data_packages(self) -> Dict[str, Dict[str, Any]]:
+        """Retrieves the version and checksum of each game's data package."""
+        return self._get_multidata("datapackage")
 
     def get_slot_data(self, player: int) -> Dict[str, Any]:
         """Retrieves the slot data for a given player."""
@@ -90,7 +144,7 @@ class TrackerData:
 
     def get_slot_info(self, player: int) -> NetworkSlot:
         """Retrieves the NetworkSlot data for a given player."""
-        return self._multidata["slot_info"][player]
+        return self._get_multidata("slot_info")[player]
 
     def get_player_name(self, player: int) -> str:
         """Retrieves the slot name for a given player."""
@@ -104,19 +158,39 @@ class TrackerData:
         """Retrieves all locations with their containing item's metadata for a given player."""
         return self._multidata["locations"][player]
 
+    def get_player_locations_count(self, player: int) -> int:
+        """Retrieves the number of locations of a given player."""
+        if self._snapshot:
+            return self._snapshot["location_counts"][player]
+        return len(self.get_player_locations(player))
+
     def get_player_starting_inventory(self, player: int) -> List[int]:
         """Retrieves a list of all item codes a given slot starts with."""
-        return self._multidata["precollected_items"][player]
+        return self._get_multidata("precollected_items")[player]
 
     def get_player_checked_locations(self, team: int, player: int) -> Set[int]:
         """Retrieves the set of all locations marked complete by this player."""
         return self._multisave.get("location_checks", {}).get((team, player), set())
 
+    def get_player_checked_locations_count(self, team: int, player: int) -> int:
+        """Retrieves the number of locations marked complete by this player."""
+        tracker_slot = self._snapshot_slots.get((team, player))
+        if tracker_slot:
+            return tracker_slot.checked
+        return len(self.get_player_checked_locations(team, player))
+
     @_cache_results
     def get_player_missing_locations(self, team: int, player: int) -> Set[int]:
         """Retrieves the set of all locations not marked complete by this player."""
         return set(self.get_player_locations(player)) - self.get_player_checked_locations(team, player)
 
+    def get_player_missing_locations_count(self, team: int, player: int) -> int:
+        """Retrieves the number of locations not marked complete by this player."""
+        tracker_slot = self._snapshot_slots.get((team, player))
+        if tracker_slot:
+            return tracker_slot.missing
+        return len(self.get_player_missing_locations(team, player))
+
     def get_player_received_items(self, team: int, player: int) -> List[NetworkItem]:
         """Returns all items received to this player in order of received."""
         return self._multisave.get("received_items", {}).get((team, player, True), [])
@@ -124,6 +198,10 @@ class TrackerData:
     @_cache_results
     def get_player_inventory_counts(self, team: int, player: int) -> collections.Counter:
         """Retrieves a dictionary of all items received by their id and their received count."""
+        tracker_slot = self._snapshot_slots.get((team, player))
+        if tracker_slot:
+            # counted by the room server
+            return restricted_loads(tracker_slot.inventory)
         received_items = self.get_player_received_items(team, player)
         starting_items = self.get_player_starting_inventory(player)
         inventory = collections.Counter()
@@ -178,7 +256,7 @@ class TrackerData:
     def get_team_locations_total_count(self) -> Dict[int, int]:
         """Retrieves a dictionary of total player locations each team has."""
         return {
-            team: sum(len(self.get_player_locations(player)) for player in players)
+            team: sum(self.get_player_locations_count(player) for player in players)
             for team, players in self.get_all_players().items()
         }
 
@@ -186,7 +264,7 @@ class TrackerData:
     def get_team_locations_checked_count(self) -> Dict[int, int]:
         """Retrieves a dictionary of checked player locations each team has."""
         return {
-            team: sum(len(self.get_player_checked_locations(team, player)) for player in players)
+            team: sum(self.get_player_checked_locations_count(team, player) for player in players)
             for team, players in self.get_all_players().items()
         }
 
@@ -197,7 +275,7 @@ class TrackerData:
         """Retrieves a dictionary of all players ids on each team."""
         return {
             0: [
-                player for player, slot_info in self._multidata["slot_info"].items()
+                player for player, slot_info in self._get_multidata("slot_info").items()
             ]
         }
 
@@ -208,7 +286,7 @@ class TrackerData:
         """Retrieves a dictionary of all player slot-type players ids on each team."""
         return {
             0: [
-                player for player, slot_info in self._multidata["slot_info"].items()
+                player for player, slot_info in self._get_multidata("slot_info").items()
                 if self.get_slot_info(player).type == SlotType.player
             ]
         }
@@ -229,6 +307,14 @@ class TrackerData:
             for team, players in self.get_all_players().items() for player in players
         }
 
+    @_cache_results
+    def get_room_locations_count(self) -> Dict[TeamPlayer, int]:
+        """Retrieves a dictionary of the number of locations per player."""
+        return {
+            (team, player): self.get_player_locations_count(player)
+            for team, players in self.get_all_players().items() for player in players
+        }
+
     @_cache_results
     def get_room_games(self) -> Dict[TeamPlayer, str]:
         """Retrieves a dictionary of games for each player."""
@@ -241,7 +327,7 @@ class TrackerData:
     def get_room_locations_complete(self) -> Dict[TeamPlayer, int]:
         """Retrieves a dictionary of all locations complete per player."""
         return {
-            (team, player): len(self.get_player_checked_locations(team, player))
+            (team, player): self.get_player_checked_locations_count(team, player)
             for team, players in self.get_all_players().items() for player in players
         }
 
@@ -449,7 +535,7 @@ def render_generic_multiworld_tracker(tracker_data: TrackerData, enabled_tracker
         get_slot_info=tracker_data.get_slot_info,
         all_slots=tracker_data.get_all_slots(),
         room_players=tracker_data.get_all_players(),
-        locations=tracker_data.get_room_locations(),
+        locations_count=tracker_data.get_room_locations_count(),
         locations_complete=tracker_data.get_room_locations_complete(),
         total_team_locations=tracker_data.get_team_locations_total_count(),
         total_team_locations_complete=tracker_data.get_team_locations_checked_count(),
@@ -510,7 +596,7 @@ if "Factorio" in network_data_package["games"]:
             get_slot_info=tracker_data.get_slot_info,
             all_slots=tracker_data.get_all_slots(),
             room_players=tracker_data.get_all_players(),
-            locations=tracker_data.get_room_locations(),
+            locations_count=tracker_data.get_room_locations_count(),
             locations_complete=tracker_data.get_room_locations_complete(),
             total_team_locations=tracker_data.get_team_locations_total_count(),
             total_team_locations_complete=tracker_data.get_team_locations_checked_count(),
@@ -643,7 +729,7 @@ if "A Link to the Past" in network_data_package["games"]:
             get_slot_info=tracker_data.get_slot_info,
             all_slots=tracker_data.get_all_slots(),
             room_players=tracker_data.get_all_players(),
-            locations=tracker_data.get_room_locations(),
+            locations_count=tracker_data.get_room_locations_count(),
             locations_complete=tracker_data.get_room_locations_complete(),
             total_team_locations=tracker_data.get_team_locations_total_count(),
             total_team_locations_complete=tracker_data.get_team_locations_checked_count(),
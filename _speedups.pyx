@@ -96,6 +96,11 @@ cdef class LocationStore:
     cdef list _items  # ~64KB/1000 players, speed up items (56 per tuple + 8 per list entry)
     cdef list _proxies  # ~92KB/1000 players, speed up self[player] (56 per struct + 28 per len + 8 per list entry)
     cdef PyObject** _raw_proxies  # 8K/1000 players, faster access to _proxies, but does not keep a ref
+    # Secondary index for receiver lookups, built on first use:
+    # entry indices sorted by (receiver, item, sender, location) and the range of each receiver in it.
+    cdef size_t* receiver_order  # 800KB/100k items
+    cdef IndexEntry* receiver_index  # 16KB/1000 players
+    cdef size_t receiver_index_size
 
     def get_size(self):
         from sys import getsizeof
@@ -106,6 +111,8 @@ cdef class LocationStore:
         size += sum(sizeof(item) for item in self._items)
         size += sum(sizeof(proxy) for proxy in self._proxies)
         size += sizeof(self._raw_proxies[0]) * self.sender_index_size
+        if self.receiver_index:
+            size += sizeof(size_t) * self.entry_count + sizeof(IndexEntry) * self.receiver_index_size
         return size
 
     def __init__(self, locations_dict: Dict[int, Dict[int, Sequence[int]]]) -> None:
@@ -215,47 +222,93 @@ cdef class LocationStore:
         return self._items
 
     # specialized accessors
+    cdef int _build_receiver_index(self) except -1:
+        cdef LocationEntry* entry
+        cdef size_t i
+        cdef size_t max_receiver = 0
+        for entry in self.entries[:self.entry_count]:
+            max_receiver = max(max_receiver, entry.receiver)
+        # entries are sorted by sender and location, so sorting by index keeps that order within each item
+        order = sorted([(self.entries[i].receiver, self.entries[i].item, i) for i in range(self.entry_count)])
+        if self.entry_count:
+            self.receiver_order = <size_t*>self._mem.alloc(self.entry_count, sizeof(size_t))
+        self.receiver_index = <IndexEntry*>self._mem.alloc(max_receiver + 1, sizeof(IndexEntry))
+        for i in range(self.entry_count):
+            self.receiver_order[i] = order[i][2]
+            entry = self.entries + self.receiver_order[i]
+            if not self.receiver_index[entry.receiver].count:
+                self.receiver_index[entry.receiver].start = i
+            self.receiver_index[entry.receiver].count += 1
+        self.receiver_index_size = max_receiver + 1
+        return 0
+
+    cdef size_t _find_first(self, ap_player_t receiver, ap_id_t item):
+        """Returns the position of the first entry for receiver and item in receiver_order, or INVALID_SIZE."""
+        if receiver >= self.receiver_index_size:
+            return INVALID_SIZE
+        # binary search
+        cdef size_t l = self.receiver_index[receiver].start
+        cdef size_t e = l + self.receiver_index[receiver].count
+        cdef size_t r = e
+        cdef size_t m
+        while l < r:
+            m = (l + r) // 2
+            if self.entries[self.receiver_order[m]].item < item:
+                l = m + 1
+            else:
+                r = m
+        if l < e and self.entries[self.receiver_order[l]].item == item:
+            return l
+        return INVALID_SIZE
+
     def find_item(self, slots: Set[int], seeked_item_id: int) -> Generator[Tuple[int, int, int, int, int], None, None]:
         cdef ap_id_t item = seeked_item_id
         cdef ap_player_t receiver
-        cdef ap_player_set* receivers
-        cdef size_t slot_count = len(slots)
-        if slot_count == 1:
-            # specialized implementation for single slot
-            receiver = list(slots)[0]
-            with nogil:
-                for entry in self.entries[:self.entry_count]:
-                    if entry.item == item and entry.receiver == receiver:
-                        with gil:
-                            yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-        elif slot_count:
-            # generic implementation with lookup in set
-            receivers = ap_player_set_new(min(1023, slot_count))  # limit top level struct to 16KB
-            if not receivers:
-                raise MemoryError()
-            try:
-                for receiver in slots:
-                    if not ap_player_set_add(receivers, receiver):
-                        raise MemoryError()
-                with nogil:
-                    for entry in self.entries[:self.entry_count]:
-                        if entry.item == item and ap_player_set_contains(receivers, entry.receiver):
-                            with gil:
-                                yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
-            finally:
-                ap_player_set_free(receivers)
+        cdef LocationEntry* entry
+        cdef size_t i
+        if not slots:
+            return
+        if not self.receiver_index:
+            self._build_receiver_index()
+        # collect matching entry indices, which sorted are the same order as a scan of all entries
+        found: List[int] = []
+        for slot in slots:
+            if slot < 1 or slot > MAX_PLAYER_ID:
+                continue
+            receiver = slot
+            i = self._find_first(receiver, item)
+            if i == INVALID_SIZE:
+                continue
+            while (i < self.entry_count and self.entries[self.receiver_order[i]].receiver == receiver
+                   and self.entries[self.receiver_order[i]].item == item):
+                found.append(self.receiver_order[i])
+                i += 1
+        if len(slots) > 1:
+            found.sort()
+        for i in found:
+            entry = self.entries + i
+            yield entry.sender, entry.location, entry.item, entry.receiver, entry.flags
 
     def get_for_player(self, slot: int) -> Dict[int, Set[int]]:
-        cdef ap_player_t receiver = slot
+        cdef ap_player_t receiver
+        cdef LocationEntry* entry
+        cdef size_t i
         all_locations: Dict[int, Set[int]] = {}
-        with nogil:
-            for entry in self.entries[:self.entry_count]:
-                if entry.receiver == receiver:
-                    with gil:
-                        sender: int = entry.sender
-                        if sender not in all_locations:
-                            all_locations[sender] = set()
-                        all_locations[sender].add(entry.location)
+        if slot < 1 or slot > MAX_PLAYER_ID:
+            return all_locations
+        receiver = slot
+        if not self.receiver_index:
+            self._build_receiver_index()
+        if receiver >= self.receiver_index_size:
+            return all_locations
+        cdef size_t start = self.receiver_index[receiver].start
+        cdef size_t count = self.receiver_index[receiver].count
+        for i in range(start, start + count):
+            entry = self.entries + self.receiver_order[i]
+            sender: int = entry.sender
+            if sender not in all_locations:
+                all_locations[sender] = set()
+            all_locations[sender].add(entry.location)
         return all_locations
 
     def get_checked(self, state: State, team: int, slot: int) -> List[int]:
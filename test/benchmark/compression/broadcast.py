@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Compares compressing broadcasts separately for every connection with compressing them once for all connections,
+# see MultiServer.SharedCompression. Run from the Archipelago directory with
+# `python -m test.benchmark.compression.broadcast`.
+
+import time
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, OP_TEXT
+
+REPEAT = 3
+RECIPIENTS = (1, 10, 100, 300)
+
+
+def generate_release_corpus(locations: int = 1000) -> list[bytes]:
+    """PrintJSON broadcasts of a release, chunked like MultiServer.register_location_checks does."""
+    from random import Random
+    from MultiServer import json_format_send_event
+    from NetUtils import encode, NetworkItem
+
+    r = Random()
+    r.seed(0)
+    events = []
+    for location in range(locations):
+        flags = r.choice((0, 0, 0, 0, 0, 0, 0, 1, 2, 3))
+        network_item = NetworkItem(r.randint(1000, 1999), 1000 + location, 1, flags)
+        events.append(json_format_send_event(network_item, r.randint(1, 300)))
+    return [encode(events[start:start + 140]).encode("utf-8") for start in range(0, len(events), 140)]
+
+
+def benchmark(data: list[bytes], recipients: int, shared: bool) -> tuple[float, float]:
+    """Returns the time to encode data for all recipients and the compressed size per recipient."""
+    from MultiServer import SharedPerMessageDeflate, shared_compression
+
+    duration = 0.
+    size = 0
+    for _ in range(REPEAT):
+        extension_type = SharedPerMessageDeflate if shared else PerMessageDeflate
+        # the same settings as MultiServer.server_per_message_deflate_factory
+        extensions = [extension_type(False, False, 11, 11, {"memLevel": 4}) for _ in range(recipients)]
+        decoder = PerMessageDeflate(False, False, 11, 11)
+        size = 0
+        for item in data:
+            t0 = time.perf_counter()
+            if shared:
+                shared_compression.add(item)
+            frames = [extension.encode(Frame(OP_TEXT, item)) for extension in extensions]
+            duration += time.perf_counter() - t0
+            assert decoder.decode(frames[0]).data == item
+            size += len(frames[0].data)
+    return duration / REPEAT, size
+
+
+def main() -> None:
+    corpus = generate_release_corpus()
+    print(f"{len(corpus)} messages, raw size: {sum(len(item) for item in corpus)}")
+    print("=" * 79)
+    print("\t".join(("recipients", "separate", "shared", "speedup", "size separate", "size shared")))
+    for recipients in RECIPIENTS:
+        separate_time, separate_size = benchmark(corpus, recipients, False)
+        shared_time, shared_size = benchmark(corpus, recipients, True)
+        print("\t".join((
+            str(recipients),
+            f"{1000 * separate_time:.1f}ms",
+            f"{1000 * shared_time:.1f}ms",
+            f"{separate_time / shared_time:.1f}x",
+            str(separate_size),
+            str(shared_size),
+        )))
+    print("=" * 79)
+
+
+if __name__ == "__main__":
+    main()
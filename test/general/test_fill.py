@@ -1,5 +1,6 @@
 from typing import List, Iterable
 import unittest
+from unittest import mock
 
 from Options import Accessibility
 from test.general import generate_items, generate_locations, generate_test_multiworld
@@ -433,6 +434,52 @@ class TestFillRestrictive(unittest.TestCase):
         self.assertTrue(sphere1_loc1.item.name == one_to_two1 or
                         sphere1_loc2.item.name == one_to_two1, "Wrong item in Sphere 1")
 
+    def test_swap_refreshes_exploration_base(self):
+        """Test that placements after a swap match a fill that sweeps every batch from the base state"""
+        def fill(exploration_base_batches: int) -> tuple[list[tuple[str, str]], list[str]]:
+            multiworld = generate_test_multiworld(1)
+            player1 = generate_player_data(multiworld, 1, 25, 25)
+            locations = player1.locations[:]  # copy required
+            required = [item.name for item in player1.prog_items[-5:]]
+            # the same spheres as test_swap_to_earlier_location_with_item_rule2 for the items placed first
+            one_to_two = required[3:]
+            set_rule(locations[0], lambda state: state.has_any(one_to_two, player1.id)
+                     and state.has_all(required[:3], player1.id))
+            set_rule(locations[1], lambda state: state.has_any(one_to_two, player1.id)
+                     and state.has_all(required[:2], player1.id))
+            set_rule(locations[2], lambda state: state.has_any(one_to_two, player1.id))
+            for location in locations[3:5]:
+                add_item_rule(location, lambda item_to_place: item_to_place.name != required[3])
+            # the remaining items are placed in many batches after the swap
+            for location in locations[5:]:
+                set_rule(location, lambda state: state.has_all(required, player1.id))
+
+            filled: list[str] = []
+            with mock.patch("Fill.exploration_base_batches", exploration_base_batches):
+                fill_restrictive(multiworld, multiworld.state, player1.locations, player1.prog_items,
+                                 on_place=lambda location: filled.append(location.name))
+            return [(location.name, location.item.name) for location in locations], filled
+
+        placements, filled = fill(8)
+        self.assertGreater(len(filled), len(set(filled)), "Did not swap, test is flawed")
+        # refreshing the exploration base for every batch is the same as sweeping from the base state
+        self.assertEqual(placements, fill(1)[0])
+
+    def test_always_allow_unreachable_location(self):
+        """Test that an unreachable location found by one item still accepts an always allowed item of the same batch"""
+        multiworld = generate_test_multiworld(2)
+        player1 = generate_player_data(multiworld, 1, 2, 1)
+        player2 = generate_player_data(multiworld, 2, 0, 1)
+        locked_location, free_location = player1.locations
+        set_rule(locked_location, lambda state: False)
+        locked_location.always_allow = lambda state, item: item.player == player2.id
+
+        fill_restrictive(multiworld, multiworld.state, player1.locations.copy(),
+                         player1.prog_items + player2.prog_items)
+
+        self.assertEqual(free_location.item, player1.prog_items[0])
+        self.assertEqual(locked_location.item, player2.prog_items[0])
+
     def test_double_sweep(self):
         """Test that sweep doesn't duplicate Event items when sweeping"""
         # test for PR1114
@@ -856,6 +903,36 @@ class TestBalanceMultiworldProgression(unittest.TestCase):
         self.assertRegionContains(
             self.player1.regions[1], self.player2.prog_items[0])
 
+    def test_balances_many_candidates(self) -> None:
+        """Test that progression balancing tests every candidate item when there are many of them"""
+        multiworld = generate_test_multiworld(2)
+        player1 = generate_player_data(multiworld, 1, prog_item_count=1, basic_item_count=40)
+        player2 = generate_player_data(multiworld, 2, prog_item_count=20, basic_item_count=20)
+        for player in (player1, player2):
+            multiworld.worlds[player.id].options.progression_balancing.value = 50
+            multiworld.completion_condition[player.id] = lambda state, player=player: state.has_all(
+                names(player.prog_items), player.id)
+
+        # Sphere 1
+        region1 = player1.generate_region(player1.menu, 30)
+        items = fill_region(multiworld, region1, [player1.prog_items[0]] + player1.basic_items)
+
+        # Sphere 2
+        region2 = player1.generate_region(
+            region1, 30, lambda state: state.has(player1.prog_items[0].name, player1.id))
+        items = fill_region(multiworld, region2, player2.prog_items + items)
+
+        # Sphere 3
+        region3 = player2.generate_region(
+            player2.menu, 30, lambda state: state.has_all(names(player2.prog_items), player2.id))
+        fill_region(multiworld, region3, items + player2.basic_items)
+
+        balance_multiworld_progression(multiworld)
+
+        for item in player2.prog_items:
+            self.assertRegionContains(region1, item)
+        self.assertTrue(multiworld.can_beat_game())
+
     def test_skips_balancing_progression(self) -> None:
         """Test that progression balancing is skipped when players have it disabled"""
         self.multiworld.worlds[self.player1.id].options.progression_balancing.value = 0
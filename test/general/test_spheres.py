@@ -0,0 +1,70 @@
+import unittest
+from unittest import mock
+
+from BaseClasses import Item, ItemClassification, Location, Region
+from Fill import FillError
+from . import generate_test_multiworld
+
+
+class TestSpheres(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        menu = self.multiworld.get_region("Menu", 1)
+        locked = Region("Locked", 1, self.multiworld)
+        never = Region("Never", 1, self.multiworld)
+        self.multiworld.regions += [locked, never]
+        menu.connect(locked, rule=lambda state: state.has("Key", 1))
+        menu.connect(never, rule=lambda state: False)
+
+        def add_location(region: Region, name: str, address, item: str, code,
+                         classification: ItemClassification = ItemClassification.filler) -> Location:
+            location = Location(1, name, address, region)
+            region.locations.append(location)
+            location.place_locked_item(Item(item, classification, code, 1))
+            return location
+
+        self.key = add_location(menu, "Key Location", 1, "Key", 1, ItemClassification.progression)
+        self.filler = add_location(menu, "Filler Location", 2, "Filler", 2)
+        self.locked = add_location(locked, "Locked Location", 3, "Filler", 2)
+        self.event = add_location(locked, "Event Location", None, "Event", None, ItemClassification.progression)
+        self.never = add_location(never, "Never Location", 4, "Filler", 2)
+
+    def test_get_spheres(self) -> None:
+        """Test that spheres are followed by an empty set and the unreachable locations."""
+        self.assertEqual(list(self.multiworld.get_spheres()),
+                         [{self.key, self.filler}, {self.locked, self.event}, set(), {self.never}])
+        self.assertEqual(list(self.multiworld.get_sendable_spheres()),
+                         [{self.key, self.filler}, {self.locked}, set(), {self.never}])
+
+    def test_cache_spheres(self) -> None:
+        """Test that spheres are only kept once placements are final, and that cached spheres give the same results."""
+        uncached = list(self.multiworld.get_spheres())
+        self.assertIsNot(self.multiworld.get_logical_spheres(), self.multiworld.get_logical_spheres())
+        with self.assertRaises(FillError):
+            self.multiworld.fulfills_accessibility()
+
+        self.multiworld.cache_spheres()
+        self.assertIs(self.multiworld.get_logical_spheres(), self.multiworld.get_logical_spheres())
+        spheres = list(self.multiworld.get_spheres())
+        self.assertEqual(spheres, uncached)
+        # yielded spheres are copies, so modifying them does not affect the cache
+        spheres[0].clear()
+        self.assertEqual(list(self.multiworld.get_spheres()), uncached)
+        with self.assertRaises(FillError):
+            self.multiworld.fulfills_accessibility()
+
+        self.never.item = None
+        self.never.parent_region.entrances[0].access_rule = lambda state: True
+        self.multiworld.cache_spheres()
+        self.assertTrue(self.multiworld.fulfills_accessibility())
+
+    def test_cached_accessibility(self) -> None:
+        """Test that the accessibility check uses the cached spheres instead of sweeping again."""
+        self.never.item = None
+        self.never.parent_region.entrances[0].access_rule = lambda state: True
+        self.multiworld.cache_spheres()
+        spheres = self.multiworld.get_logical_spheres()
+        with mock.patch("BaseClasses.CollectionState") as collection_state:
+            self.assertTrue(self.multiworld.fulfills_accessibility())
+        collection_state.assert_not_called()
+        self.assertIs(self.multiworld.get_logical_spheres(), spheres)
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+
+from BaseClasses import CollectionState, Item, ItemClassification, Location
+from Fill import distribute_items_restrictive
+from worlds.AutoWorld import AutoWorldRegister
+from . import generate_test_multiworld, setup_multiworld
+
+
+class TestPlaythroughCulling(unittest.TestCase):
+    def test_cull_matches_single_checks(self) -> None:
+        """Test that culling spheres removes the same locations as checking each location on its own."""
+        world_types = [AutoWorldRegister.world_types[game] for game in ("Super Mario 64", "Timespinner")]
+        multiworld = setup_multiworld(world_types, seed=1234)
+        distribute_items_restrictive(multiworld)
+
+        candidates = {location for location in multiworld.get_filled_locations() if location.advancement}
+        state = CollectionState(multiworld)
+        state_cache = [state.copy()]
+        spheres = []
+        while candidates:
+            sphere = [location for location in candidates if state.can_reach(location)]
+            self.assertTrue(sphere)
+            for location in sphere:
+                state.collect(location.item, True, location)
+            candidates.difference_update(sphere)
+            spheres.append(sphere)
+            state_cache.append(state.copy())
+
+        required_locations = {location for sphere in spheres for location in sphere}
+        expected_required_locations = set(required_locations)
+        for num, sphere in reversed(tuple(enumerate(spheres))):
+            culled = multiworld.spoiler._cull_sphere(state_cache[num], sphere, required_locations)
+            expected_culled = set()
+            for location in sphere:
+                expected_required_locations.remove(location)
+                if multiworld.can_beat_game(state_cache[num], expected_required_locations):
+                    expected_culled.add(location)
+                else:
+                    expected_required_locations.add(location)
+            with self.subTest(sphere=num):
+                self.assertEqual(culled, expected_culled)
+                self.assertEqual(required_locations, expected_required_locations)
+
+
+class TestPlaythroughSpheres(unittest.TestCase):
+    def test_skips_spheres_without_advancement(self) -> None:
+        """Test that a logical sphere without progression items does not end the playthrough's collection spheres."""
+        multiworld = generate_test_multiworld()
+        menu = multiworld.get_region("Menu", 1)
+        key_location, filler_location, goal_location = (Location(1, name, None, menu)
+                                                        for name in ("Key", "Filler", "Goal"))
+        menu.locations += [key_location, filler_location, goal_location]
+        key_location.place_locked_item(Item("Key", ItemClassification.progression, None, 1))
+        filler_location.place_locked_item(Item("Filler", ItemClassification.filler, None, 1))
+        goal_location.place_locked_item(Item("Victory", ItemClassification.progression, None, 1))
+        goal_location.access_rule = lambda state: state.has("Key", 1)
+        multiworld.completion_condition[1] = lambda state: state.has("Victory", 1)
+
+        spheres = multiworld.get_logical_spheres()
+        self.assertEqual(spheres.spheres, [{key_location, filler_location}, {goal_location}])
+        # put the filler into a sphere of its own, after the key is collected
+        spheres.spheres = [{key_location}, {filler_location}, {goal_location}]
+        spheres.states.insert(1, spheres.states[1].copy())
+        with patch.object(multiworld, "get_logical_spheres", return_value=spheres):
+            multiworld.spoiler.create_playthrough(create_paths=False)
+        self.assertEqual(multiworld.spoiler.playthrough, {
+            "0": [],
+            "1": {str(key_location): str(key_location.item)},
+            "2": {str(goal_location): str(goal_location.item)},
+        })
@@ -1,7 +1,8 @@
 import unittest
 
+from BaseClasses import CollectionState, Item, ItemClassification, Region
 from worlds.AutoWorld import AutoWorldRegister, call_all
-from . import setup_solo_multiworld
+from . import generate_test_multiworld, setup_solo_multiworld
 
 
 class TestBase(unittest.TestCase):
@@ -27,3 +28,97 @@ class TestBase(unittest.TestCase):
                     with self.subTest("Step", step=step):
                         call_all(multiworld, step)
                         self.assertTrue(multiworld.get_all_state(False, allow_partial_entrances=True))
+
+
+class TestIncrementalReachability(unittest.TestCase):
+    def setUp(self) -> None:
+        self.multiworld = generate_test_multiworld()
+        self.menu = self.multiworld.get_region("Menu", 1)
+        self.declared = Region("Declared", 1, self.multiworld)
+        self.undeclared = Region("Undeclared", 1, self.multiworld)
+        self.multiworld.regions += [self.declared, self.undeclared]
+        self.declared_calls = 0
+
+        def declared_rule(state: CollectionState) -> bool:
+            self.declared_calls += 1
+            return state.has("Key", 1)
+
+        self.declared_entrance = self.menu.connect(self.declared, "To Declared", declared_rule)
+        self.declared_entrance.item_dependencies = {"Key"}
+        self.menu.connect(self.undeclared, "To Undeclared", lambda state: state.has("Other", 1))
+
+    def test_declared_entrance_only_retested_on_dependency(self) -> None:
+        """Test that a blocked entrance with declared item dependencies is skipped for unrelated items."""
+        state = CollectionState(self.multiworld)
+        self.assertFalse(self.declared.can_reach(state))
+        calls = self.declared_calls
+
+        state.collect(Item("Other", ItemClassification.progression, None, 1), True)
+        self.assertTrue(self.undeclared.can_reach(state))
+        self.assertFalse(self.declared.can_reach(state))
+        self.assertEqual(calls, self.declared_calls)
+
+        state.collect(Item("Key", ItemClassification.progression, None, 1), True)
+        self.assertTrue(self.declared.can_reach(state))
+        self.assertEqual(calls + 1, self.declared_calls)
+
+    def test_unknown_staleness_retests_everything(self) -> None:
+        """Test that going stale without recorded item changes still retests declared entrances."""
+        state = CollectionState(self.multiworld)
+        self.assertFalse(self.declared.can_reach(state))
+        state.prog_items[1]["Key"] = 1
+        state.stale[1] = True
+        self.assertTrue(self.declared.can_reach(state))
+
+
+class TestCopyOnWrite(unittest.TestCase):
+    def test_copies_are_independent(self) -> None:
+        """Test that mutating a copied state or its source does not leak into the other."""
+        multiworld = generate_test_multiworld(2)
+        state = CollectionState(multiworld)
+        state.collect(Item("Shared", ItemClassification.progression, None, 1), True)
+        copied = state.copy()
+
+        copied.collect(Item("Copy Only", ItemClassification.progression, None, 1), True)
+        state.collect(Item("Source Only", ItemClassification.progression, None, 2), True)
+
+        self.assertTrue(copied.has("Shared", 1))
+        self.assertTrue(copied.has("Copy Only", 1))
+        self.assertFalse(copied.has("Source Only", 2))
+        self.assertTrue(state.has("Source Only", 2))
+        self.assertFalse(state.has("Copy Only", 1))
+        self.assertEqual({1: {"Shared": 1, "Copy Only": 1}, 2: {}},
+                         {player: dict(items) for player, items in copied.prog_items.items()})
+
+    def test_copy_on_write_only(self) -> None:
+        """Test that reading a copied state copies no containers, and that the source keeps its containers."""
+        multiworld = generate_test_multiworld(2)
+        state = CollectionState(multiworld)
+        state.collect(Item("Shared", ItemClassification.progression, None, 1), True)
+        containers = dict(dict.items(state.prog_items))
+        copied = state.copy()
+
+        self.assertTrue(copied.has("Shared", 1))
+        self.assertEqual(copied.count("Shared", 1), 1)
+        self.assertTrue(state.has("Shared", 1))
+        for player, container in containers.items():
+            self.assertIs(state.prog_items.peek(player), container)
+            self.assertIs(copied.prog_items.peek(player), container, "Read copied a shared container")
+
+        copied.collect(Item("Copy Only", ItemClassification.progression, None, 1), True)
+        self.assertIsNot(copied.prog_items.peek(1), containers[1])
+        self.assertIs(copied.prog_items.peek(2), containers[2])
+        self.assertIs(state.prog_items.peek(1), containers[1])
+        self.assertFalse(state.has("Copy Only", 1))
+
+    def test_copy_of_copy(self) -> None:
+        """Test that unmaterialized containers survive being copied again."""
+        multiworld = generate_test_multiworld(2)
+        state = CollectionState(multiworld)
+        state.collect(Item("Shared", ItemClassification.progression, None, 2), True)
+        copied = state.copy().copy()
+        self.assertIn(2, copied.prog_items)
+        self.assertEqual(state.prog_items, copied.prog_items)
+        copied.remove(Item("Shared", ItemClassification.progression, None, 2))
+        self.assertTrue(state.has("Shared", 2))
+        self.assertNotEqual(state.prog_items, copied.prog_items)
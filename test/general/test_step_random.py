@@ -0,0 +1,22 @@
+import unittest
+
+from worlds.AutoWorld import call_all
+from . import generate_test_multiworld
+
+
+class TestStepRandom(unittest.TestCase):
+    def roll(self, early_rolls: int) -> list[float]:
+        multiworld = generate_test_multiworld(2)
+        for world in multiworld.worlds.values():
+            world.random_seed = world.player
+        rolls: list[float] = []
+        world = multiworld.worlds[1]
+        world.generate_early = lambda: [world.random.random() for _ in range(early_rolls)]
+        world.create_items = lambda: rolls.append(world.random.random())
+        call_all(multiworld, "generate_early")
+        call_all(multiworld, "create_items")
+        return rolls
+
+    def test_steps_are_independent(self) -> None:
+        """Test that randomness used in one step doesn't shift the random rolls of later steps."""
+        self.assertEqual(self.roll(0), self.roll(5))
@@ -112,6 +112,12 @@ class Base:
             self.assertEqual(sorted(self.store.find_item(set(range(2048)), 13)),
                              [(1, 13, 13, 1, 0)])
 
+        def test_find_item_order(self) -> None:
+            # results are in the order of finding player and location, independent of the order of slots
+            self.assertEqual(list(self.store.find_item({5, 3, 4}, 99)),
+                             [(3, 9, 99, 4, 0), (4, 9, 99, 3, 0), (5, 9, 99, 5, 0)])
+            self.assertEqual(list(self.store.find_item({1, 2}, 12)), [(2, 22, 12, 1, 0)])
+
         def test_get_for_player(self) -> None:
             self.assertEqual(self.store.get_for_player(3), {4: {9}})
             self.assertEqual(self.store.get_for_player(1), {1: {13}, 2: {22, 23}})
@@ -223,6 +229,17 @@ class Base:
                 self.assertEqual(store.get_remaining(empty_state, 0, 1), [])
                 self.assertEqual(store.get_remaining(full_state, 0, 1), [])
 
+        def test_receiver_without_locations(self) -> None:
+            # item link groups receive items, but have no locations of their own
+            store = self.type({
+                1: {1: (5, 7, 0), 2: (6, 2, 0)},
+                2: {1: (5, 7, 1)},
+            })
+            self.assertEqual(list(store.find_item({7}, 5)), [(1, 1, 5, 7, 0), (2, 1, 5, 7, 1)])
+            self.assertEqual(list(store.find_item({2, 7}, 6)), [(1, 2, 6, 2, 0)])
+            self.assertEqual(store.get_for_player(7), {1: {1}, 2: {1}})
+            self.assertEqual(store.get_for_player(8), {})
+
         def test_no_locations_for_1(self) -> None:
             store = self.type({
                 1: {},
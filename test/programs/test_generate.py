@@ -1,12 +1,15 @@
 # Tests for Generate.py (ArchipelagoGenerate.exe)
 
+import json
 import unittest
 import os
 import os.path
 import sys
+import zipfile
 
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from unittest import mock
 
 import Generate
 import Main
@@ -25,6 +28,9 @@ class TestGenerateMain(unittest.TestCase):
         output_path = Path(output_dir)
         output_files = list(output_path.glob('*.zip'))
         if len(output_files) == 1:
+            with zipfile.ZipFile(output_files[0]) as zf:
+                self.assertIsNone(zf.testzip())
+                self.assertTrue(any(name.endswith(".archipelago") for name in zf.namelist()))
             return True
         self.fail(f"Expected {output_dir} to contain one zip, but has {len(output_files)}: "
                   f"{list(output_path.glob('*'))}")
@@ -72,6 +78,41 @@ class TestGenerateMain(unittest.TestCase):
 
         self.assertOutput(self.output_tempdir.name)
 
+    def test_generate_profile_report(self):
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--profile_report']
+        print(f'Testing Generate.py {sys.argv} in {os.getcwd()}')
+        Main.main(*Generate.main())
+
+        self.assertOutput(self.output_tempdir.name)
+        reports = list(Path(self.output_tempdir.name).glob('*_profile.json'))
+        self.assertEqual(len(reports), 1)
+        with open(reports[0], encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual(list(report["players"]), ["1"])
+        steps = {(step["stage"], step["player"]): step for step in report["steps"]}
+        for stage, player in (("generation", None), ("create_regions", None), ("create_regions", 1), ("fill", None)):
+            with self.subTest(stage=stage, player=player):
+                step = steps[stage, player]
+                self.assertGreaterEqual(step["wall_time"], 0)
+                self.assertGreaterEqual(step["cpu_time"], 0)
+                self.assertIsNotNone(step["peak_memory"])
+        self.assertGreater(steps["fill", None]["sweeps"], 0)
+
+    def test_generate_profile_report_without_seed(self):
+        sys.argv = [sys.argv[0], '--seed', '0',
+                    '--player_files_path', str(self.abs_input_dir),
+                    '--outputpath', self.output_tempdir.name,
+                    '--profile_report']
+        args = Generate.main()
+        with mock.patch("Main.MultiWorld.set_seed", side_effect=RuntimeError("Test error")):
+            with self.assertRaisesRegex(RuntimeError, "Test error"):
+                Main.main(*args)
+
+        self.assertEqual(list(Path(self.output_tempdir.name).glob('*_profile.json')), [])
+
     def test_generate_yaml(self):
         # override host.yaml
         from settings import get_settings
@@ -108,6 +149,8 @@ class TestGenerateWeights(TestGenerateMain):
     # don't need to run these tests
     test_generate_absolute = None
     test_generate_relative = None
+    test_generate_profile_report = None
+    test_generate_profile_report_without_seed = None
 
     def test_generate_yaml(self):
         from settings import get_settings
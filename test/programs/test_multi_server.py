@@ -1,5 +1,20 @@
+import asyncio
+import os
+import pickle
+import tempfile
+import threading
+import time
+import types
+import typing
 import unittest
-from MultiServer import Context, ServerCommandProcessor
+import zlib
+from unittest import mock
+
+from MultiServer import Client, Context, DataPackageFragments, SaveJournal, ServerCommandProcessor, SharedCompression, \
+    SharedPerMessageDeflate, get_checked_checks, get_missing_checks, get_slot_points, process_client_cmd, \
+    register_location_checks, send_items_to, send_new_items, update_aliases
+from NetUtils import ClientStatus, decode, encode, Hint, HintStatus, LocationStore, NetworkItem, NetworkSlot, SlotType
+from Utils import restricted_loads
 
 
 class TestResolvePlayerName(unittest.TestCase):
@@ -38,3 +53,425 @@ class TestResolvePlayerName(unittest.TestCase):
         assert p.resolve_player("ABC") == (1, 2, "abc"), "case insensitive resolves when 1 match"
         assert p.resolve_player("abcd") == (1, 3, "abCD"), "case insensitive resolves when 1 match"
         assert not p.resolve_player("aB"), "partial name shouldn't resolve to player"
+
+
+class TestSaveJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def make_context(self) -> Context:
+        with mock.patch.object(Context, "_load_game_data"):  # savegames don't need the data package
+            ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.connect_names = {"Player1": (0, 1), "Player2": (0, 2)}
+        ctx.save_filename = os.path.join(self.directory.name, "test.apsave")
+        return ctx
+
+    def load(self) -> Context:
+        ctx = self.make_context()
+        with open(ctx.save_filename, "rb") as f:
+            save_data = restricted_loads(zlib.decompress(f.read()))
+        with open(ctx.save_journal_filename, "rb") as f:
+            SaveJournal.replay(save_data, f.read())
+        ctx.set_save(save_data)
+        return ctx
+
+    def test_replay(self) -> None:
+        """Test that a snapshot plus journaled deltas loads the same state as a full save."""
+        ctx = self.make_context()
+        self.assertTrue(ctx._save())
+        snapshot_size = os.path.getsize(ctx.save_filename)
+
+        ctx.location_checks[0, 1] |= {1, 2}
+        ctx.received_items[0, 2, True] = [NetworkItem(10, 1, 1, 0)]
+        ctx.stored_data["key"] = {"a": 1}
+        ctx.save_journal.changed_stored_data.add("key")
+        ctx.client_game_state[0, 1] = ClientStatus.CLIENT_PLAYING
+        self.assertTrue(ctx._save())
+        ctx.location_checks[0, 1].add(3)
+        ctx.received_items[0, 2, True].append(NetworkItem(11, 3, 1, 0))
+        ctx.name_aliases[0, 2] = "Alias"
+        self.assertTrue(ctx._save())
+
+        self.assertEqual(os.path.getsize(ctx.save_filename), snapshot_size)
+        self.assertGreater(os.path.getsize(ctx.save_journal_filename), 0)
+        expected = ctx.get_save()
+        loaded = self.load().get_save()
+        for key in ("received_items", "location_checks", "stored_data", "client_game_state", "name_aliases"):
+            self.assertEqual(expected[key], loaded[key], key)
+
+        # compaction folds the journal into the snapshot
+        self.assertTrue(ctx._save(exit_save=True))
+        self.assertEqual(os.path.getsize(ctx.save_journal_filename), 0)
+        self.assertEqual(self.load().get_save()["received_items"], expected["received_items"])
+
+    def test_stale_generation_ignored(self) -> None:
+        """Test that deltas from before the latest snapshot are not replayed."""
+        ctx = self.make_context()
+        ctx._save()
+        ctx.location_checks[0, 1] |= {1}
+        ctx._save()
+        with open(ctx.save_journal_filename, "rb") as f:
+            old_journal = f.read()
+        ctx.location_checks[0, 1] = set()
+        ctx._save(exit_save=True)
+        save_data = self.load().get_save()
+        self.assertEqual(SaveJournal.replay(save_data, old_journal), 0)
+        self.assertEqual(save_data["location_checks"][0, 1], set())
+
+    def test_snapshot_is_consistent(self) -> None:
+        """Test that changes after taking a save snapshot don't leak into what gets written."""
+        ctx = self.make_context()
+        ctx.location_checks[0, 1] |= {1}
+        ctx.received_items[0, 1, True] = [NetworkItem(10, 1, 1, 0)]
+        snapshot = ctx.take_save_snapshot()
+        ctx.location_checks[0, 1].add(2)
+        ctx.received_items[0, 1, True].append(NetworkItem(11, 2, 1, 0))
+        ctx._write_save(snapshot)
+
+        loaded = self.load().get_save()
+        self.assertEqual(loaded["location_checks"][0, 1], {1})
+        self.assertEqual(loaded["received_items"][0, 1, True], [NetworkItem(10, 1, 1, 0)])
+        self.assertTrue(ctx.save_metrics[-1].snapshot)
+
+    def test_set_after_snapshot(self) -> None:
+        """Test that a datastore key set after a snapshot was taken, but before it was written, is journaled later."""
+        ctx = self.make_context()
+        self.assertTrue(ctx._save())
+        ctx.stored_data["key"] = 1
+        ctx.save_journal.changed_stored_data.add("key")
+        snapshot = ctx.take_save_snapshot()
+        ctx.stored_data["key"] = 2
+        ctx.save_journal.changed_stored_data.add("key")
+        ctx._write_save(snapshot)
+        self.assertEqual(self.load().stored_data["key"], 1)
+        self.assertTrue(ctx._save())
+        self.assertEqual(self.load().stored_data["key"], 2)
+
+    def test_save_command(self) -> None:
+        """Test that /save reports once the saving thread wrote the save, and that the exit save waits for it."""
+        ctx = self.make_context()
+        ctx.saving = True
+        ctx._start_async_saving(atexit_save=False)
+
+        def stop_saving() -> None:
+            ctx.exit_event.set()
+            ctx.save_requested.set()
+            ctx.auto_saver_thread.join()
+
+        self.addCleanup(stop_saving)
+        release = threading.Event()
+        stores: typing.List[bool] = []
+        store_save = ctx._store_save
+
+        def blocked_store_save(data: bytes, snapshot: bool, exit_save: bool, save_data: dict) -> None:
+            stores.append(exit_save)
+            release.wait(5)
+            store_save(data, snapshot, exit_save, save_data)
+
+        processor = ServerCommandProcessor(ctx)
+        with mock.patch.object(ctx, "_store_save", blocked_store_save), mock.patch.object(processor, "output") as output:
+            ctx.location_checks[0, 1] |= {1}
+            self.assertTrue(processor._cmd_save())
+            exit_save = threading.Thread(target=ctx._save, args=(True,))
+            for _ in range(50):
+                if stores:
+                    break
+                time.sleep(0.1)
+            exit_save.start()
+            time.sleep(0.2)
+            self.assertEqual(stores, [False], "Exit save did not wait for the saving thread")
+            output.assert_not_called()
+
+            release.set()
+            exit_save.join(5)
+            self.assertEqual(stores, [False, True])
+            for _ in range(50):
+                if output.called:
+                    break
+                time.sleep(0.1)
+            output.assert_called_once_with("Game saved")
+        self.assertEqual(self.load().get_save()["location_checks"][0, 1], {1})
+
+
+    def test_save_now_merges_waiting_saves(self) -> None:
+        """Test that a save requested while another is waiting for the saving thread reports through the same future
+        and journals the datastore keys of both."""
+        ctx = self.make_context()
+        ctx.saving = True
+        self.assertTrue(ctx._save())
+        ctx.auto_saver_thread = mock.Mock(is_alive=mock.Mock(return_value=True))
+        ctx.stored_data["first"] = 1
+        ctx.save_journal.changed_stored_data.add("first")
+        first = ctx.save_now()
+        ctx.stored_data["second"] = 2
+        ctx.save_journal.changed_stored_data.add("second")
+        self.assertIs(ctx.save_now(), first)
+        self.assertFalse(first.done())
+
+        self.assertTrue(ctx.save(now=True))
+        self.assertTrue(first.result(0))
+        self.assertIsNone(ctx.pending_save)
+        self.assertEqual(self.load().stored_data, {"first": 1, "second": 2})
+
+    def test_save_now_reports_failure(self) -> None:
+        """Test that saving right away reports a failed write, and that the saving thread keeps running after one."""
+        ctx = self.make_context()
+        ctx.saving = True
+        with mock.patch.object(ctx, "_encode_save", side_effect=pickle.PicklingError("Test error")), \
+                mock.patch.object(ctx.logger, "exception"):
+            self.assertFalse(ctx.save(now=True))
+
+            ctx._start_async_saving(atexit_save=False)
+
+            def stop_saving() -> None:
+                ctx.exit_event.set()
+                ctx.save_requested.set()
+                ctx.auto_saver_thread.join()
+
+            self.addCleanup(stop_saving)
+            with self.assertRaises(pickle.PicklingError):
+                ctx.save_now().result(5)
+        self.assertTrue(ctx.save_now().result(5))
+        self.assertTrue(ctx.auto_saver_thread.is_alive())
+
+class TestSendNewItems(unittest.IsolatedAsyncioTestCase):
+    async def test_only_receiving_slots(self) -> None:
+        """Test that items are only sent to clients of slots that received them, and only once."""
+        with mock.patch.object(Context, "_load_game_data"):
+            ctx = Context("", 0, "", "", 0, 0, False)
+        clients = {slot: types.SimpleNamespace(no_items=False, remote_start_inventory=False, remote_items=True,
+                                               send_index=0)
+                   for slot in (1, 2)}
+        ctx.clients = {0: {slot: [client] for slot, client in clients.items()}}
+        ctx.queue_encoded_msgs = mock.Mock()
+
+        send_items_to(ctx, 0, 1, NetworkItem(10, 1, 2, 0))
+        send_new_items(ctx)
+        send_new_items(ctx)
+        await asyncio.sleep(0)
+        ctx.queue_encoded_msgs.assert_called_once()
+        self.assertIs(ctx.queue_encoded_msgs.call_args.args[0], clients[1])
+        self.assertEqual(clients[1].send_index, 1)
+        self.assertEqual(clients[2].send_index, 0)
+
+
+class TestBounce(unittest.IsolatedAsyncioTestCase):
+    async def test_routing(self) -> None:
+        """Test that bounces reach the clients of the same team by game, tag or slot, and follow tag changes."""
+        with mock.patch.object(Context, "_load_game_data"):
+            ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.games = {1: "Game A", 2: "Game B", 3: "Game B"}
+        ctx.clients = {0: {}, 1: {}}
+        clients = {}
+        for team, slot, tags in ((0, 1, ["DeathLink"]), (0, 2, []), (0, 3, ["DeathLink", "Tracker"]), (1, 1, [])):
+            clients[team, slot] = mock.Mock(auth=True, team=team, slot=slot, tags=tags)
+            ctx.clients[team][slot] = [clients[team, slot]]
+            ctx.player_names[team, slot] = f"Player{slot}"
+            ctx.index_client(clients[team, slot])
+
+        self.assertEqual(ctx.get_bounce_targets(0, {"Game B"}, set(), set()), {clients[0, 2], clients[0, 3]})
+        self.assertEqual(ctx.get_bounce_targets(0, set(), {"DeathLink"}, {2}), {clients[0, 1], clients[0, 2],
+                                                                               clients[0, 3]})
+        self.assertEqual(ctx.get_bounce_targets(1, {"Game A"}, {"DeathLink"}, set()), {clients[1, 1]})
+
+        ctx.send_encoded_msgs = mock.AsyncMock()
+        ctx.broadcast_text_all = mock.Mock()
+        await process_client_cmd(ctx, clients[0, 1], {"cmd": "ConnectUpdate", "tags": []})
+        await process_client_cmd(ctx, clients[0, 1], {"cmd": "Bounce", "tags": ["DeathLink"], "data": {}})
+        ctx.send_encoded_msgs.assert_awaited_once()
+        self.assertIs(ctx.send_encoded_msgs.call_args.args[0], clients[0, 3])
+
+        with mock.patch("MultiServer.on_client_disconnected"):
+            await ctx.disconnect(clients[0, 3])
+        self.assertFalse(ctx.get_bounce_targets(0, {"Game B"}, {"DeathLink", "Tracker"}, {3}) - {clients[0, 2]})
+        self.assertNotIn((0, "Tracker"), ctx.tag_clients)
+
+
+class TestConnectedMsg(unittest.TestCase):
+    def expected(self, ctx: Context, team: int, slot: int) -> str:
+        return ctx.dumper({
+            "cmd": "Connected",
+            "team": team, "slot": slot,
+            "players": ctx.get_players_package(),
+            "missing_locations": get_missing_checks(ctx, team, slot),
+            "checked_locations": get_checked_checks(ctx, team, slot),
+            "slot_info": ctx.slot_info,
+            "hint_points": get_slot_points(ctx, team, slot),
+            "slot_data": ctx.slot_data[slot],
+        })
+
+    def test_invalidation(self) -> None:
+        """Test that assembled Connected packets match encoding them whole, also after checks and aliases change."""
+        with mock.patch.object(Context, "_load_game_data"):
+            ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.slot_info = {slot: NetworkSlot(f"Player{slot}", "Game", SlotType.player) for slot in (1, 2)}
+        ctx.player_names = {(0, slot): f"Player{slot}" for slot in (1, 2)}
+        ctx.clients = {0: {1: [], 2: []}}
+        ctx.slot_data = {1: {"option": "välue"}, 2: {}}
+        ctx.locations = LocationStore({1: {10: (100, 2, 0), 11: (101, 1, 0)}, 2: {}})
+        ctx.broadcast = ctx.broadcast_team = mock.Mock()
+
+        self.assertEqual(ctx.get_connected_msg(0, 1, True), self.expected(ctx, 0, 1))
+        register_location_checks(ctx, 0, 1, [10])
+        ctx.name_aliases[0, 2] = "Alias"
+        update_aliases(ctx, 0)
+        self.assertEqual(ctx.get_connected_msg(0, 1, True), self.expected(ctx, 0, 1))
+        self.assertEqual(ctx.get_connected_msg(0, 2, False), self.expected(ctx, 0, 2).replace(',"slot_data":{}', ""))
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        with mock.patch.object(Context, "_load_game_data"):
+            self.ctx = Context("", 0, "", "", 0, 0, False)
+        self.socket = mock.Mock(open=True, send=mock.AsyncMock(), close=mock.AsyncMock())
+        self.client = Client(self.socket, self.ctx)
+
+    def sent(self) -> typing.List[typing.List[dict]]:
+        return [decode(call.args[0]) for call in self.socket.send.call_args_list]
+
+    async def test_merge(self) -> None:
+        """Test that messages queued in the same tick are sent as one frame, with consecutive RoomUpdates merged."""
+        await self.ctx.send_msgs(self.client, [{"cmd": "PrintJSON", "data": []}])
+        self.ctx.queue_room_update([self.client], {"hint_points": 1, "checked_locations": {1}})
+        self.ctx.queue_room_update([self.client], {"hint_points": 2, "checked_locations": [2]})
+        self.ctx.queue_encoded_msgs(self.client, "[]")
+        self.ctx.broadcast([self.client], [{"cmd": "Bounced"}, {"cmd": "Bounced"}])
+        self.ctx.queue_room_update([self.client], {"hint_points": 3})
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertEqual(self.sent(), [[
+            {"cmd": "PrintJSON", "data": []},
+            {"cmd": "RoomUpdate", "hint_points": 2, "checked_locations": [1, 2]},
+            {"cmd": "Bounced"}, {"cmd": "Bounced"},
+            {"cmd": "RoomUpdate", "hint_points": 3},
+        ]])
+        self.assertEqual(self.client.outbox_size, 0)
+        self.assertFalse(self.client.writing)
+
+    async def test_limits(self) -> None:
+        """Test that frames are split at max_frame_size and clients falling too far behind are disconnected."""
+        self.ctx.max_frame_size = 40
+        for n in range(3):
+            self.ctx.queue_encoded_msgs(self.client, self.ctx.dumper([{"cmd": "Bounced", "data": n}]))
+        await asyncio.sleep(0)
+        self.assertEqual(self.sent(), [[{"cmd": "Bounced", "data": 0}], [{"cmd": "Bounced", "data": 1}],
+                                       [{"cmd": "Bounced", "data": 2}]])
+
+        self.ctx.max_outbox_size = 100
+        self.assertTrue(self.ctx.queue_encoded_msgs(self.client, f"[{'0' * 60}]"))
+        self.assertFalse(self.ctx.queue_encoded_msgs(self.client, f"[{'0' * 60}]"))
+        self.assertFalse(self.client.outbox)
+        await asyncio.sleep(0)
+        self.socket.close.assert_awaited_once()
+
+    async def test_shared_broadcast(self) -> None:
+        """Test that long broadcasts are sent as their own frame, so their compression can be shared."""
+        other = Client(mock.Mock(open=True, send=mock.AsyncMock()), self.ctx)
+        shared = self.ctx.dumper([{"cmd": "PrintJSON", "data": [{"text": "x" * 5000}]}])
+        self.ctx.queue_encoded_msgs(self.client, "[1]")
+        self.ctx.queue_broadcast([self.client, other], shared)
+        self.ctx.queue_broadcast([self.client, other], "[2]")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertEqual([call.args[0] for call in self.socket.send.call_args_list], ["[1]", shared, "[2]"])
+        self.assertEqual([call.args[0] for call in other.socket.send.call_args_list], [shared, "[2]"])
+
+
+class TestSharedCompression(unittest.TestCase):
+    def test_decode(self) -> None:
+        """Test that clients decode shared and per connection compressed messages alike, in any order."""
+        import random
+        from websockets.extensions.permessage_deflate import PerMessageDeflate
+        from websockets.frames import Frame, OP_TEXT
+
+        shared_compression = SharedCompression()
+        shared_compression.min_size = 0
+        r = random.Random(0)
+        for no_context_takeover in (False, True):
+            with mock.patch("MultiServer.shared_compression", shared_compression):
+                server = SharedPerMessageDeflate(False, no_context_takeover, 11, 11, {"memLevel": 4})
+                client = PerMessageDeflate(no_context_takeover, False, 11, 11)
+                for n in range(30):
+                    data = "".join(r.choice(("Player", " sent ", "Item", "to", "Location")) for _ in range(n * 50))
+                    data = data.encode()
+                    if n % 3 == 0:
+                        shared_compression.add(data)
+                    frame = server.encode(Frame(OP_TEXT, data))
+                    self.assertTrue(frame.rsv1)
+                    self.assertEqual(client.decode(frame).data, data)
+                    if n % 3 == 0:
+                        self.assertIs(frame.data, shared_compression.get(data, 11, {"memLevel": 4}),
+                                      "Compressed again")
+
+    def test_compress_settings(self) -> None:
+        """Test that a message is compressed separately for different compression settings."""
+        import zlib
+
+        shared_compression = SharedCompression()
+        data = b"Player sent Item to Location. " * 200
+        shared_compression.add(data)
+        stored = shared_compression.get(data, 11, {"level": 0})
+        compressed = shared_compression.get(data, 11, {"level": 9})
+        self.assertIsNot(stored, compressed)
+        self.assertIs(stored, shared_compression.get(data, 11, {"level": 0}))
+        # level 0 stores the data uncompressed
+        self.assertGreater(len(stored), len(data))
+        self.assertEqual(zlib.decompressobj(wbits=-11).decompress(compressed + b"\x00\x00\xff\xff"), data)
+
+
+class TestRecheckHints(unittest.TestCase):
+    def test_only_checked_locations(self) -> None:
+        """Test that a check updates the hints for that location in every slot, and leaves other hints alone."""
+        with mock.patch.object(Context, "_load_game_data"):
+            ctx = Context("", 0, "", "", 0, 0, False)
+        checked = Hint(2, 1, 5, 10, False, status=HintStatus.HINT_PRIORITY)
+        unchecked = Hint(2, 1, 6, 11, False, status=HintStatus.HINT_PRIORITY)
+        for slot in (1, 2):
+            ctx.hints[0, slot] = {checked, unchecked}
+            ctx.index_hints(0, slot, ctx.hints[0, slot])
+
+        ctx.location_checks[0, 1] = {5}
+        changed: set = set()
+        ctx.recheck_location_hints(0, 1, {5}, changed)
+        found = checked._replace(found=True, status=HintStatus.HINT_FOUND)
+        self.assertEqual(changed, {(0, 1), (0, 2)})
+        for slot in (1, 2):
+            self.assertEqual(ctx.hints[0, slot], {found, unchecked})
+        self.assertNotIn((0, 1, 5), ctx.hinted_locations)
+        self.assertEqual(ctx.hinted_locations[0, 1, 6], {1, 2})
+
+
+class TestDataPackageMsg(unittest.TestCase):
+    def test_matches_encoded_package(self) -> None:
+        """Test that DataPackage messages assembled from cached fragments match encoding the whole message."""
+        with mock.patch.object(Context, "_load_game_data"):
+            ctx = Context("", 0, "", "", 0, 0, False)
+        ctx.gamespackage = {
+            "Ünicode Game": {"item_name_to_id": {"Ïtem": 1}, "location_name_to_id": {"Location": 2},
+                             "checksum": "test_data_package_msg_1"},
+            "Other Game": {"item_name_to_id": {}, "location_name_to_id": {}, "checksum": "test_data_package_msg_2"},
+            "Unchecked Game": {"item_name_to_id": {"Item": 3}, "location_name_to_id": {}},
+        }
+        for games in (list(ctx.gamespackage), ["Other Game"], []):
+            expected = ctx.dumper([{"cmd": "DataPackage",
+                                    "data": {"games": {game: ctx.gamespackage[game] for game in games}}}])
+            self.assertEqual(ctx.get_data_package_msg(games), expected)
+
+    def test_least_recently_used_eviction(self) -> None:
+        """Test that fragments are cached by dumper and checksum, and the least recently used ones are evicted."""
+        packages = [{"item_name_to_id": {f"Item {n}": n}, "location_name_to_id": {}, "checksum": str(n)}
+                    for n in range(3)]
+        fragments = DataPackageFragments(0)
+        first = fragments.get(packages[0], encode)
+        fragments.max_size = len(first) * 2
+        fragments.get(packages[1], encode)
+        self.assertIs(fragments.get(dict(packages[0]), encode), first)
+        fragments.get(packages[2], encode)
+        self.assertEqual(len(fragments), 2)
+        self.assertIs(fragments.get(packages[0], encode), first)
+        self.assertEqual(fragments.size, len(first) * 2)
+        fragments.get({"item_name_to_id": {}, "location_name_to_id": {}}, encode)
+        self.assertEqual(len(fragments), 2, "Package without checksum was cached")
+        self.assertEqual(fragments.get(packages[0], lambda package: "fragment"), "fragment",
+                         "Fragment of another dumper was used")
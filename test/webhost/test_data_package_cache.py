@@ -0,0 +1,62 @@
+import pickle
+
+from . import TestBase
+
+
+class TestDataPackageCache(TestBase):
+    def setUp(self) -> None:
+        from pony.orm import db_session
+        from WebHostLib.models import GameDataPackage
+
+        super().setUp()
+        self.checksums = [f"test_data_package_cache_{n}" for n in range(3)]
+        with db_session:
+            for n, checksum in enumerate(self.checksums):
+                if not GameDataPackage.get(checksum=checksum):
+                    GameDataPackage(checksum=checksum, data=pickle.dumps({
+                        "item_name_to_id": {f"Item {n}": n}, "location_name_to_id": {f"Location {n}": n},
+                        "checksum": checksum,
+                    }))
+
+    def test_decoded_packages(self) -> None:
+        """Verify that packages are decoded once with their inverse lookups, and unknown checksums give None."""
+        from pony.orm import db_session
+        from WebHostLib.datapackage import DataPackageCache, NameLookup
+
+        cache = DataPackageCache(1024 * 1024)
+        with db_session:
+            decoded = cache.get(self.checksums[1])
+            self.assertEqual(decoded.package["item_name_to_id"], {"Item 1": 1})
+            self.assertEqual(decoded.item_id_to_name, {1: "Item 1"})
+            self.assertEqual(decoded.location_id_to_name, {1: "Location 1"})
+            self.assertIs(type(decoded.item_id_to_name), dict, "Shared lookup can insert on missing keys")
+
+            item_id_to_name = NameLookup(decoded.item_id_to_name, lambda code: f"Unknown Item (ID: {code})")
+            self.assertEqual(item_id_to_name[1], "Item 1")
+            self.assertEqual(item_id_to_name[5], "Unknown Item (ID: 5)")
+            self.assertNotIn(5, item_id_to_name)
+            self.assertIsNone(item_id_to_name.get(5))
+            self.assertEqual(decoded.item_id_to_name, {1: "Item 1"}, "Unknown id was stored in the shared lookup")
+            self.assertIs(cache.get(self.checksums[1]), decoded)
+            self.assertIsNone(cache.get("unknown"))
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, decoded.size)
+
+    def test_least_recently_used_eviction(self) -> None:
+        """Verify that the least recently used packages are evicted once the cache grows beyond its size."""
+        from pony.orm import db_session
+        from WebHostLib.datapackage import DataPackageCache
+
+        cache = DataPackageCache(0)
+        with db_session:
+            first = cache.get(self.checksums[0])
+            cache.max_size = first.size * 2
+            cache.get(self.checksums[1])
+            self.assertIs(cache.get(self.checksums[0]), first)  # now the most recently used
+            cache.get(self.checksums[2])  # evicts the package of checksum 1
+            self.assertEqual(len(cache), 2)
+            self.assertLessEqual(cache.size, cache.max_size)
+            self.assertIs(cache.get(self.checksums[0]), first)
+            cache.max_size = 0
+            cache.get(self.checksums[1])
+        self.assertEqual(len(cache), 1, "Loaded package was not kept on its own")
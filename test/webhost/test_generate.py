@@ -1,5 +1,8 @@
+import json
 import zipfile
 from io import BytesIO
+from unittest import mock
+from uuid import uuid4
 
 from flask import url_for
 
@@ -71,3 +74,130 @@ class TestGenerate(TestBase):
                           "Response shows unexpected error")
             self.assertIn("generate-game-form", response.text,
                           "Response did not get user back to the form")
+
+    def test_generation_hash(self) -> None:
+        """
+        Verify that rolling the same options again gives the same generation hash, and that the owner, the seed,
+        the rolled options and the world version are part of it.
+        """
+        from WebHostLib.check import roll_options
+        from WebHostLib.generate import get_generation_hash, get_meta
+        from worlds import AutoWorldRegister
+
+        def roll(options: dict) -> dict:
+            _, gen_options = roll_options({"test.yaml": options}, set(meta["plando_options"]))
+            return {name: vars(settings) for name, settings in gen_options.items()}
+
+        owner = uuid4()
+        meta = get_meta({})
+        self.assertNotIn("seed", meta["generator_options"])
+        options = {"name": "Player1", "game": "Archipelago", "Archipelago": {"start_hints": ["Nothing"]}}
+        generation_hash = get_generation_hash(roll(options), meta, owner)
+        self.assertEqual(get_generation_hash(roll(options), get_meta({}), owner), generation_hash)
+        self.assertEqual(get_generation_hash(roll(options), meta, owner.int), generation_hash)
+        self.assertNotEqual(get_generation_hash(roll(options), meta, uuid4()), generation_hash)
+        self.assertNotEqual(get_generation_hash(roll({**options, "name": "Player2"}), meta, owner), generation_hash)
+
+        seeded_meta = get_meta({"seed": "12345"})
+        self.assertEqual(seeded_meta["generator_options"]["seed"], 12345)
+        seeded_hash = get_generation_hash(roll(options), seeded_meta, owner)
+        self.assertNotEqual(seeded_hash, generation_hash)
+        self.assertNotEqual(get_generation_hash(roll(options), get_meta({"seed": "54321"}), owner), seeded_hash)
+        self.assertNotIn("seed", get_meta({"seed": "12345"}, race=True)["generator_options"])
+
+        world_type = AutoWorldRegister.world_types["Archipelago"]
+        with mock.patch.object(world_type, "world_version", (1, 0, 0)):
+            self.assertNotEqual(get_generation_hash(roll(options), meta, owner), generation_hash)
+
+    def test_invalid_seed(self) -> None:
+        """
+        Verify that posting a seed that is not a number will give an error.
+        """
+        from WebHostLib.generate import get_meta
+
+        with self.assertRaises(ValueError):
+            get_meta({"seed": "abc"})
+        with self.app.app_context(), self.app.test_request_context():
+            yaml_data = """
+            name: Player1
+            game: Archipelago
+            Archipelago: {}
+            """
+            response = self.client.post(url_for("generate"),
+                                        data={"file": (BytesIO(yaml_data.encode("utf-8")), "test.yaml"),
+                                              "seed": "abc"},
+                                        follow_redirects=True)
+            self.assertIn("user-message", response.text,
+                          "Request did not call flash()")
+            self.assertIn("has to be a number", response.text,
+                          "Response shows unexpected error")
+            self.assertIn("generate-game-form", response.text,
+                          "Response did not get user back to the form")
+
+    def test_duplicate_generation_result(self) -> None:
+        """
+        Verify that storing a result for a generation hash that a concurrent generation already stored keeps the
+        first result instead of failing.
+        """
+        from pony.orm import db_session
+
+        from WebHostLib.generate import store_generation_result
+        from WebHostLib.models import GenerationResult, Seed
+
+        with db_session:
+            first = Seed(multidata=b"\0", owner=uuid4())
+            second = Seed(multidata=b"\0", owner=uuid4())
+        store_generation_result("duplicate", first.id)
+        with mock.patch.object(GenerationResult, "exists", return_value=False):
+            store_generation_result("duplicate", second.id)
+        with db_session:
+            self.assertEqual(GenerationResult["duplicate"].seed.id, first.id)
+
+    def test_wait_for_cached_seed(self) -> None:
+        """
+        Verify that waiting on a generation that reused a previous result leads to that seed.
+        """
+        from pony.orm import db_session
+
+        from WebHostLib.generate import use_generation_result
+        from WebHostLib.models import Generation, STATE_STARTED
+
+        seed_id = uuid4()
+        with self.app.app_context(), self.app.test_request_context():
+            with db_session:
+                generation = Generation(options=b"", meta=json.dumps({"race": False}), state=STATE_STARTED,
+                                        owner=uuid4())
+            self.assertEqual(use_generation_result(generation.id, seed_id), seed_id)
+            response = self.client.get(url_for("wait_seed", seed=generation.id))
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(url_for("view_seed", seed=seed_id), response.headers["Location"])
+
+    def test_reuse_requires_seed(self) -> None:
+        """
+        Verify that only generations that ask for a specific seed reuse an earlier result, and that a reused
+        generation is marked as finished.
+        """
+        from pony.orm import db_session
+
+        from WebHostLib.check import roll_options
+        from WebHostLib.generate import gen_game, get_generation_hash, get_meta, store_generation_result
+        from WebHostLib.models import Generation, Seed, STATE_FINISHED, STATE_STARTED
+
+        owner = uuid4()
+        _, gen_options = roll_options({"test.yaml": {"name": "Player1", "game": "Archipelago", "Archipelago": {}}})
+        options = {name: vars(settings) for name, settings in gen_options.items()}
+        with mock.patch("WebHostLib.generate.get_generation_hash") as generation_hash:
+            with mock.patch("WebHostLib.generate.ERmain", side_effect=RuntimeError("Generated")):
+                with self.assertRaisesRegex(RuntimeError, "Generated"):
+                    gen_game(options, meta=get_meta({}), owner=owner.int)
+            generation_hash.assert_not_called()
+
+        meta = get_meta({"seed": "12345"})
+        with db_session:
+            seed = Seed(multidata=b"\0", owner=owner)
+            generation = Generation(options=b"", meta=json.dumps(meta), state=STATE_STARTED, owner=owner)
+        store_generation_result(get_generation_hash(options, meta, owner), seed.id)
+        with mock.patch("WebHostLib.generate.ERmain", side_effect=RuntimeError("Generated")):
+            self.assertEqual(gen_game(options, meta=meta, owner=owner, sid=generation.id), seed.id)
+        with db_session:
+            self.assertEqual(Generation[generation.id].state, STATE_FINISHED)
@@ -0,0 +1,56 @@
+import gc
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+
+class TestStaticServerData(unittest.TestCase):
+    data = {
+        "non_hintable_names": {"Test Game": frozenset({"Nothing"})},
+        "gamespackage": {
+            "Archipelago": {"item_name_to_id": {"Nothing": -1}, "location_name_to_id": {}, "checksum": "ap"},
+            "Test Game": {"item_name_to_id": {"Sword": 1}, "location_name_to_id": {"Chest": 1}, "checksum": "test"},
+        },
+        "item_name_groups": {"Test Game": {"Weapons": {"Sword"}}},
+        "location_name_groups": {"Test Game": {"Chests": {"Chest"}}},
+    }
+
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory(ignore_cleanup_errors=True)
+        self.addCleanup(self.directory.cleanup)
+
+    def test_round_trip(self) -> None:
+        """Test that the written file gives back the data it was written from."""
+        from WebHostLib.customserver import StaticServerData, write_static_server_data
+
+        static_server_data = StaticServerData(write_static_server_data(self.data, self.directory.name))
+        self.assertEqual(set(static_server_data.games), {"Archipelago", "Test Game"})
+        self.assertEqual(static_server_data.checksums, {"Archipelago": "ap", "Test Game": "test"})
+        self.assertEqual(static_server_data.non_hintable_names, self.data["non_hintable_names"])
+        game_data = static_server_data.get_game("Test Game")
+        self.assertEqual(game_data.package, self.data["gamespackage"]["Test Game"])
+        self.assertEqual(game_data.item_name_groups, self.data["item_name_groups"]["Test Game"])
+        self.assertEqual(game_data.location_name_groups, self.data["location_name_groups"]["Test Game"])
+        self.assertEqual(static_server_data.get_game("Archipelago").item_name_groups, {})
+        self.assertIsNone(static_server_data.get_game("Unknown Game"))
+
+    def test_game_data_shared_while_used(self) -> None:
+        """Test that a game's data is loaded once while in use and released afterwards."""
+        from WebHostLib.customserver import StaticServerData, write_static_server_data
+
+        static_server_data = StaticServerData(write_static_server_data(self.data, self.directory.name))
+        game_data = static_server_data.get_game("Test Game")
+        self.assertIs(static_server_data.get_game("Test Game"), game_data)
+        del game_data
+        gc.collect()
+        self.assertNotIn("Test Game", static_server_data._loaded)
+
+    def test_stale_files_deleted(self) -> None:
+        """Test that writing changed data deletes the file of the previous data."""
+        from WebHostLib.customserver import write_static_server_data
+
+        old_path = write_static_server_data(self.data, self.directory.name)
+        self.assertEqual(write_static_server_data(self.data, self.directory.name), old_path)
+        new_path = write_static_server_data({**self.data, "non_hintable_names": {}}, self.directory.name)
+        self.assertNotEqual(new_path, old_path)
+        self.assertEqual(os.listdir(self.directory.name), [os.path.basename(new_path)])
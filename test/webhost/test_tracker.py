@@ -103,3 +103,86 @@ class TestTracker(TestBase):
                 self.assertEqual(response.status_code, 200)
             with self.client.open(url_for("api.tracker_slot_data", tracker=self.tracker_uuid)) as response:
                 self.assertEqual(response.status_code, 200)
+
+    def test_tracker_snapshot(self) -> None:
+        """Verify that trackers read the same data from a room's tracker snapshot as from its multidata and save."""
+        import logging
+        import zlib
+        from pony.orm import db_session
+        from MultiServer import Context as MultiServerContext
+        from NetUtils import ClientStatus, NetworkItem
+        from WebHostLib.customserver import WebHostContext
+        from WebHostLib.models import Room, TRACKER_SNAPSHOT_VERSION
+        from WebHostLib.tracker import TrackerData
+
+        multidata = MultiServerContext.decompress(self.data)
+        multidata["locations"][1] = {1: (5, 1, 0), 2: (5, 1, 0), 3: (7, 1, 0)}
+        save_data = {
+            "connect_names": multidata["connect_names"],
+            "location_checks": {(0, 1): {1, 2}},
+            "received_items": {(0, 1, True): [NetworkItem(5, 1, 1, 0), NetworkItem(5, 2, 1, 0)],
+                               (0, 1, False): [NetworkItem(6, 3, 1, 0)]},
+            "hints": {(0, 1): set()},
+            "client_game_state": {(0, 1): ClientStatus.CLIENT_PLAYING},
+            "name_aliases": {(0, 1): "Alias"},
+            "client_activity_timers": (((0, 1), 0.0),),
+            "client_connection_timers": (((0, 1), 0.0),),
+            "video": [],
+        }
+        room_server = WebHostContext.__new__(WebHostContext)
+        room_server.logger = logging.getLogger("TestTracker")
+        room_server.tracker_multidata = WebHostContext.get_tracker_multidata(multidata)
+        room_server.tracker_slots = None
+
+        def get_tracker_results(tracker_data: TrackerData) -> tuple:
+            checksums = {game: package["checksum"] for game, package in tracker_data.get_data_packages().items()}
+            return (tracker_data.get_seed_name(), tracker_data.get_all_slots(), checksums,
+                    tracker_data.get_team_locations_total_count(), tracker_data.get_room_locations_complete(),
+                    tracker_data.get_player_missing_locations_count(0, 1),
+                    tracker_data.get_player_inventory_counts(0, 1), tracker_data.get_room_long_player_names(),
+                    tracker_data.get_player_checked_locations(0, 1), tracker_data.get_player_received_items(0, 1),
+                    tracker_data.get_player_client_status(0, 1), tracker_data.get_room_last_activity().keys(),
+                    tracker_data.item_id_to_name["Archipelago"][1])
+
+        with db_session:
+            room = Room.get(id=self.room_id)
+            room.seed.multidata = self.data[:1] + zlib.compress(pickle.dumps(multidata))
+            room.multisave = pickle.dumps(save_data)
+            expected = get_tracker_results(TrackerData(room))
+
+            room_server.tracker_slots = room_server._store_tracker_snapshot(room, save_data)
+            tracker_data = TrackerData(room)
+            self.assertEqual(get_tracker_results(tracker_data), expected)
+            self.assertNotIn("_multidata", vars(tracker_data), "Snapshot did not replace loading multidata")
+
+            # counts and inventories are read from the snapshot alone
+            tracker_data = TrackerData(room)
+            tracker_data.get_room_locations_complete()
+            tracker_data.get_team_locations_total_count()
+            tracker_data.get_player_missing_locations_count(0, 1)
+            tracker_data.get_player_inventory_counts(0, 1)
+            self.assertNotIn("_multisave", vars(tracker_data), "Snapshot did not replace loading multisave")
+
+            # only slots that changed are written again, and inventories keep counting on top of what they counted
+            self.assertEqual(room_server.get_tracker_slot_updates(save_data, room_server.tracker_slots), {})
+            save_data["received_items"][0, 1, True].append(NetworkItem(7, 3, 1, 0))
+            self.assertEqual(room_server.get_tracker_slot_updates(save_data, room_server.tracker_slots).keys(),
+                             {(0, 1)})
+            room_server.tracker_slots = room_server._store_tracker_snapshot(room, save_data)
+            self.assertEqual(TrackerData(room).get_player_inventory_counts(0, 1), {5: 2, 7: 1})
+
+            room.tracker_snapshot.version = TRACKER_SNAPSHOT_VERSION - 1
+            self.assertEqual(get_tracker_results(TrackerData(room)), expected, "Outdated snapshot was used")
+            # a new room server writes the whole snapshot again
+            room_server.tracker_slots = None
+            room_server._store_tracker_snapshot(room, save_data)
+            self.assertEqual(room.tracker_snapshot.version, TRACKER_SNAPSHOT_VERSION)
+            self.assertEqual(len(room.tracker_snapshot.slots), 1)
+
+        with self.app.test_request_context():
+            for url in (url_for("api.tracker_data", tracker=self.tracker_uuid),
+                        url_for("api.static_tracker_data", tracker=self.tracker_uuid),
+                        url_for("get_multiworld_tracker", tracker=self.tracker_uuid),
+                        url_for("get_player_tracker", tracker=self.tracker_uuid, tracked_team=0, tracked_player=1)):
+                with self.subTest(url=url), self.client.open(url) as response:
+                    self.assertEqual(response.status_code, 200)
@@ -179,7 +179,8 @@ def _timed_call(method: Callable[..., Any], *args: Any,
 def call_single(multiworld: "MultiWorld", method_name: str, player: int, *args: Any) -> Any:
     method = getattr(multiworld.worlds[player], method_name)
     try:
-        ret = _timed_call(method, *args, multiworld=multiworld, player=player)
+        with multiworld.measure(method_name, player):
+            ret = _timed_call(method, *args, multiworld=multiworld, player=player)
     except Exception as e:
         message = f"Exception in {method} for player {player}, named {multiworld.player_name[player]}."
         if sys.version_info >= (3, 11, 0):
@@ -192,20 +193,20 @@ def call_single(multiworld: "MultiWorld", method_name: str, player: int, *args:
 
 
 def call_all(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
-    world_types: Set[AutoWorldRegister] = set()
-    for player in multiworld.player_ids:
-        prev_item_count = len(multiworld.itempool)
-        world_types.add(multiworld.worlds[player].__class__)
-        call_single(multiworld, method_name, player, *args)
-        if __debug__:
-            new_items = multiworld.itempool[prev_item_count:]
-            for i, item in enumerate(new_items):
-                for other in new_items[i+1:]:
-                    assert item is not other, (
-                        f"Duplicate item reference of \"{item.name}\" in \"{multiworld.worlds[player].game}\" "
-                        f"of player \"{multiworld.player_name[player]}\". Please make a copy instead.")
-
-    call_stage(multiworld, method_name, *args)
+    with multiworld.measure(method_name):
+        for player in multiworld.player_ids:
+            prev_item_count = len(multiworld.itempool)
+            multiworld.worlds[player].seed_random(method_name)
+            call_single(multiworld, method_name, player, *args)
+            if __debug__:
+                new_items = multiworld.itempool[prev_item_count:]
+                for i, item in enumerate(new_items):
+                    for other in new_items[i+1:]:
+                        assert item is not other, (
+                            f"Duplicate item reference of \"{item.name}\" in \"{multiworld.worlds[player].game}\" "
+                            f"of player \"{multiworld.player_name[player]}\". Please make a copy instead.")
+
+        call_stage(multiworld, method_name, *args)
 
 
 def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
@@ -213,7 +214,8 @@ def call_stage(multiworld: "MultiWorld", method_name: str, *args: Any) -> None:
     for world_type in sorted(world_types, key=lambda world: world.__name__):
         stage_callable = getattr(world_type, f"stage_{method_name}", None)
         if stage_callable:
-            _timed_call(stage_callable, multiworld, *args)
+            with multiworld.measure(f"stage_{method_name}", game=world_type.game):
+                _timed_call(stage_callable, multiworld, *args)
 
 
 class WebWorld(metaclass=WebWorldRegister):
@@ -335,6 +337,8 @@ class World(metaclass=AutoWorldRegister):
 
     random: Random
     """This world's random object. Should be used for any randomization needed in world for this player slot."""
+    random_seed: int
+    """Seed that random gets reseeded from before each generation step, so every step gets its own stream."""
 
     settings_key: ClassVar[str]
     """name of the section in host.yaml for world-specific settings, will default to {folder}_options"""
@@ -352,7 +356,8 @@ class World(metaclass=AutoWorldRegister):
         assert multiworld is not None
         self.multiworld = multiworld
         self.player = player
-        self.random = Random(multiworld.random.getrandbits(64))
+        self.random_seed = multiworld.random.getrandbits(64)
+        self.random = Random(self.random_seed)
         multiworld.per_slot_randoms[player] = self.random
 
     def __getattr__(self, item: str) -> Any:
@@ -360,6 +365,14 @@ class World(metaclass=AutoWorldRegister):
             return self.__class__.settings
         raise AttributeError
 
+    def seed_random(self, step: str) -> None:
+        """
+        Reseeds random with a stream derived from random_seed and the generation step about to run.
+        This keeps each step's randomness independent of how much randomness earlier steps used, and of the order
+        the steps of different worlds run in.
+        """
+        self.random.seed(f"{self.random_seed}:{step}")
+
     # overridable methods that get called by Main.py, sorted by execution order
     # can also be implemented as a classmethod and called "stage_<original_name>",
     # in that case the MultiWorld object is passed as the first argument, and it gets called once for the entire multiworld.
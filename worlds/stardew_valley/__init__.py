@@ -121,6 +121,7 @@ class StardewValleyWorld(World):
 
         # Taking the seed specified in slot data for UT, otherwise just generating the seed.
         self.seed = getattr(multiworld, "re_gen_passthrough", {}).get(STARDEW_VALLEY, self.random.getrandbits(64))
+        self.random_seed = self.seed
         self.random = Random(self.seed)
 
     def interpret_slot_data(self, slot_data: Dict[str, Any]) -> Optional[int]: